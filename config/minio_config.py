@@ -1,4 +1,5 @@
 import os
+import urllib3
 from minio import Minio
 from .settings import settings
 
@@ -7,7 +8,15 @@ def setup_minio():
         settings.MINIO_ENDPOINT,
         access_key = settings.MINIO_ACCESS_KEY,
         secret_key = settings.MINIO_SECRET_KEY,
-        secure=False 
+        secure=False,
+        # Same pool as the client's default, with timeouts that fit the request deadline instead of 5 minutes
+        http_client = urllib3.PoolManager(
+            timeout=urllib3.Timeout(connect=settings.MINIO_CONNECT_TIMEOUT, read=settings.MINIO_TIMEOUT),
+            maxsize=10,
+            # One reconnect for a stale pooled connection; every other retry is the callers' tenacity
+            # policy, which stops at the request deadline
+            retries=urllib3.Retry(total=1, connect=1, read=0, status=0, other=0),
+        ),
     )
 
 minio_client = setup_minio()
\ No newline at end of file
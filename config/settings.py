@@ -16,12 +16,15 @@ class Settings(BaseSettings):
 
     TINES_WEBHOOK_URL: str = os.getenv("TINES_WEBHOOK_URL", "")
     TINES_SECRET: str = os.getenv("TINES_SECRET", "")
+    TINES_TIMEOUT: float = 5.0 # in seconds, per webhook call
 
     MINIO_ACCESS_KEY: str = os.getenv("MINIO_ACCESS_KEY")
     MINIO_SECRET_KEY: str = os.getenv("MINIO_SECRET_KEY")
     MINIO_ENDPOINT: str = os.getenv("MINIO_ENDPOINT")
     MINIO_BUCKET: str = os.getenv("MINIO_BUCKET", "from_sgc")
     MINIO_QUARANTINE_BUCKET: str = os.getenv("MINIO_QUARANTINE_BUCKET", "praveen-allam-quarantine-files")
+    BUCKET_BOOTSTRAP_RETRY_DELAY: float = 1.0 # in seconds, doubled after every failed attempt
+    BUCKET_BOOTSTRAP_MAX_DELAY: float = 30.0 # in seconds
     
     REDIS_HOST: str = os.getenv("REDIS_HOST")
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
@@ -30,14 +33,135 @@ class Settings(BaseSettings):
     IMAGE_MAX_HEIGHT: int = 5000
     MAX_MEGAPIXELS: int = 25
     BYTES_PER_PIXEL: float = 0.05
+    IMAGE_DERIVATIVES_ENABLED: bool = os.getenv("IMAGE_DERIVATIVES_ENABLED", "True").lower() == "true"
+    IMAGE_DERIVATIVE_SIZES: dict = {"thumbnail": 256, "preview": 1024} # longest side in pixels
+    IMAGE_DERIVATIVE_FORMAT: str = os.getenv("IMAGE_DERIVATIVE_FORMAT", "WEBP") # WEBP or JPEG
+    IMAGE_DERIVATIVE_QUALITY: int = 80
+    IMAGE_DERIVATIVE_REDUCING_GAP: float = 2.0 # larger is slower but closer to a full resample
     
     MAX_UPLOAD_SIZE: int = 15 # in MB
     MAX_FILE_SIZE: int = 10  # in MB
     MAX_FILES_COUNT: int = 10
+    PRESIGNED_URL_EXPIRES: int = 600 # in seconds, lifetime of signed download URLs
+    PRESIGNED_URL_REFRESH_MARGIN: int = 120 # in seconds, cached URLs are re-signed once they have less left
+    PRESIGNED_URL_CACHE_MAX_ENTRIES: int = 10000 # per process, Redis holds the shared copy
+    PRESIGNED_BULK_MAX_OBJECTS: int = 200
+    FILE_INDEX_MAX_PAGE_SIZE: int = 200 # files per /list page, larger limits are rejected
+
+    QUARANTINE_JANITOR_ENABLED: bool = os.getenv("QUARANTINE_JANITOR_ENABLED", "True").lower() == "true"
+    QUARANTINE_TTL: int = int(os.getenv("QUARANTINE_TTL", str(6 * 60 * 60))) # in seconds, unchecked uploads older than this are deleted
+    QUARANTINE_JANITOR_INTERVAL: float = float(os.getenv("QUARANTINE_JANITOR_INTERVAL", "600")) # in seconds
+    QUARANTINE_LIFECYCLE_DAYS: int = int(os.getenv("QUARANTINE_LIFECYCLE_DAYS", "2")) # bucket lifecycle backstop, in days
+    QUARANTINE_DELETE_BATCH_SIZE: int = 1000 # S3 multi-object delete limit
+    QUARANTINE_DELETE_FLUSH_INTERVAL: float = 0.5 # in seconds
+
+    FILE_BUFFER_SPOOL_SIZE: int = int(os.getenv("FILE_BUFFER_SPOOL_SIZE", str(2 * 1024 * 1024))) # in bytes
+    FILE_BUFFER_TEMP_DIR: str | None = os.getenv("FILE_BUFFER_TEMP_DIR") or None
+    DOWNLOAD_CHUNK_SIZE: int = 256 * 1024 # in bytes
+    UPLOAD_SNIFF_SIZE: int = 64 * 1024 # in bytes, header checks run once this much of an upload arrived
+    UPLOAD_PART_SIZE: int = 8 * 1024 * 1024 # in bytes, MinIO multipart part size (minimum 5 MiB)
+    UPLOAD_PIPE_MAX_CHUNKS: int = 32 # received chunks buffered ahead of the MinIO upload
+    REQUEST_DEADLINE: float = float(os.getenv("REQUEST_DEADLINE", "60")) # in seconds, end-to-end budget of a check request
+    MINIO_TIMEOUT: float = 30.0 # in seconds, per MinIO call
+    MINIO_CONNECT_TIMEOUT: float = 5.0 # in seconds
+    MINIO_HEDGED_READS: bool = os.getenv("MINIO_HEDGED_READS", "False").lower() == "true"
+    MINIO_HEDGE_DELAY: float = 0.5 # in seconds, roughly the p95 of a MinIO read
+    VIRUSTOTAL_TIMEOUT: float = 15.0 # in seconds
+    MAGIC_BUFFER_SIZE: int = 1024 * 1024 # libmagic never reads past this many bytes
+
+    MEMORY_BUDGET_MB: int = int(os.getenv("MEMORY_BUDGET_MB", "512")) # process-wide in-flight budget
+    MEMORY_BUDGET_OVERHEAD_FACTOR: float = 3.0 # raw bytes -> decoded images / PDF object graphs
+    MEMORY_BUDGET_MAX_WAIT: float = float(os.getenv("MEMORY_BUDGET_MAX_WAIT", "5")) # in seconds, 0 rejects immediately
+    MEMORY_BUDGET_MAX_QUEUE: int = 100
+    MEMORY_BUDGET_RETRY_AFTER: int = 5 # in seconds
+
+    # Per file type: concurrent checks, priority (lower runs first) and time budget in seconds
+    SCHEDULER_LANES: dict = {
+        "image": {"concurrency": 8, "priority": 0, "time_budget": 15.0},
+        "source_code": {"concurrency": 6, "priority": 1, "time_budget": 20.0},
+        "pdf": {"concurrency": 4, "priority": 2, "time_budget": 45.0},
+        "tabular": {"concurrency": 4, "priority": 2, "time_budget": 45.0},
+    }
+    SCHEDULER_MAX_CONCURRENCY: int = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "16")) # all lanes together
+    SCHEDULER_MAX_WAIT: float = float(os.getenv("SCHEDULER_MAX_WAIT", "10")) # in seconds, 0 rejects immediately
+    SCHEDULER_MAX_QUEUE: int = 100 # per lane
+    SCHEDULER_RETRY_AFTER: int = 5 # in seconds
+    FAIR_QUEUE_DEFAULT_WEIGHT: float = 1.0
+    FAIR_QUEUE_USER_WEIGHTS: dict = {} # userid -> weight, e.g. a lower weight for known batch uploaders
+
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+    # Per-user token buckets per route: `burst` tokens, refilled at `rate` tokens per second
+    RATE_LIMITS: dict = {
+        "check": {"rate": 2.0, "burst": 30},
+        "presign": {"rate": 5.0, "burst": 100},
+    }
+    RATE_LIMIT_MAX_RETRY_AFTER: int = 60 # in seconds
+
+    # AIMD in-flight limits per outbound dependency; calls slower than `latency_target` (seconds) shrink the limit
+    ADAPTIVE_LIMITS: dict = {
+        "minio": {"initial": 32, "min": 4, "max": 128, "latency_target": 1.0},
+        "virustotal": {"initial": 8, "min": 1, "max": 32, "latency_target": 3.0},
+    }
+    ADAPTIVE_LIMIT_BACKOFF: float = 0.9 # multiplicative decrease
+    ADAPTIVE_LIMIT_MAX_WAIT: float = float(os.getenv("ADAPTIVE_LIMIT_MAX_WAIT", "2")) # in seconds a call may queue for a slot
+    ADAPTIVE_LIMIT_RETRY_AFTER: int = 2 # in seconds
+
+    # Per outbound dependency: the breaker opens when `failure_rate` of the last `window` calls (at least `min_calls`)
+    # failed or took longer than `slow_call_threshold` seconds, and probes again after `open_duration` seconds.
+    # `policy` is what the pipeline does while it is open: "fail_fast" (503) or "pending_rescan" (VirusTotal only)
+    CIRCUIT_BREAKERS: dict = {
+        "minio": {"window": 50, "min_calls": 20, "failure_rate": 0.5, "slow_call_threshold": 5.0, "open_duration": 15.0, "half_open_calls": 3, "policy": "fail_fast"},
+        "virustotal": {"window": 20, "min_calls": 10, "failure_rate": 0.5, "slow_call_threshold": 10.0, "open_duration": 30.0, "half_open_calls": 2, "policy": "pending_rescan"},
+    }
+    VIRUSTOTAL_RESCAN_KEY: str = "rescan:virustotal" # sorted set of `<userid>/<hashed filename>` scored by when they are due
+    VIRUSTOTAL_RESCAN_ENABLED: bool = os.getenv("VIRUSTOTAL_RESCAN_ENABLED", "True").lower() == "true"
+    VIRUSTOTAL_RESCAN_INTERVAL: float = float(os.getenv("VIRUSTOTAL_RESCAN_INTERVAL", "60")) # in seconds
+    VIRUSTOTAL_RESCAN_BATCH_SIZE: int = 50 # lookups per round
+    VIRUSTOTAL_RESCAN_RETRY_DELAY: float = 300.0 # in seconds, after a lookup that failed
+
+    FUZZY_HASH_ENABLED: bool = os.getenv("FUZZY_HASH_ENABLED", "True").lower() == "true"
+    FUZZY_HASH_MAX_DISTANCE: int = 30 # TLSH distance, lower is more similar
+    FUZZY_HASH_MAX_INDEX_SIZE: int = 1000 # per user and file type, the oldest entries are evicted
+    # Near-duplicates of files recorded clean skip the type-specific scan. Off by default: a small edit
+    # (e.g. a JavaScript action added to a clean PDF) stays within the distance
+    FUZZY_HASH_SKIP_DEEP_SCAN: bool = os.getenv("FUZZY_HASH_SKIP_DEEP_SCAN", "False").lower() == "true"
+    FUZZY_HASH_VERDICT_TTL: int = 30 * 24 * 60 * 60 # in seconds
+
+    PROCESS_POOL_WORKERS: int = int(os.getenv("PROCESS_POOL_WORKERS", str(os.cpu_count() or 1)))
+    PROCESS_POOL_START_METHOD: str = "forkserver" # forking a threaded server process is unsafe
+
+    PII_DETECTION_ENABLED: bool = os.getenv("PII_DETECTION_ENABLED", "True").lower() == "true"
+    PII_PAGE_BATCH_SIZE: int = 16 # pages per worker task
+    PII_PARALLEL_MIN_PAGES: int = 32 # smaller PDFs are scanned inline
+    PII_MAX_ANONYMIZED_CHARS: int = 1_000_000
+    PII_TIMEOUT: float = 30.0 # in seconds, bounded by the request deadline
+
+    PDF_INVISIBLE_TEXT_MAX_PAGES: int = 500
+    PDF_INVISIBLE_TEXT_TIMEOUT: float = 5.0 # in seconds
+    PDF_INVISIBLE_TEXT_PAGE_BATCH_SIZE: int = 8 # pages per worker task
+    PDF_INVISIBLE_TEXT_PARALLEL_MIN_PAGES: int = 24 # smaller PDFs are scanned inline
+    PDF_INVISIBLE_TEXT_MIN_FONT_SIZE: float = 1.0
+    PDF_INVISIBLE_TEXT_COLOR_TOLERANCE: float = 0.02 # per RGB channel, 0-1 scale
+    PDF_INVISIBLE_TEXT_REJECT_ON_BUDGET: bool = False # reject PDFs that could not be fully checked
+    DECOMPRESSION_MAX_RATIO: int = 100 # per stream or zip member
+    DECOMPRESSION_RATIO_MIN_OUTPUT: int = 1024 * 1024 # in bytes, small streams are not judged by ratio
+    DECOMPRESSION_MAX_OUTPUT_MB: int = 200 # total inflated size across a file
+    DECOMPRESSION_CPU_BUDGET: float = 2.0 # in CPU seconds
+    DECOMPRESSION_CHUNK_SIZE: int = 64 * 1024 # in bytes, per inflate call
     IMAGE_EXTENSIONS: List[str] = ["jpg", "jpeg", "png"]
     PDF_EXTENSIONS: List[str] = ["pdf"]
     SOURCE_CODE_EXTENSIONS: List[str] = ['cpp', 'cc', 'cxx', 'h', 'go', 'java', 'kt', 'kts', 'js', 'mjs', 'cjs', 'ts', 'tsx', 'php', 'phtml', 'php3', 'php4', 'php5', 'phps', 'proto', 'py', 'pyw', 'rst', 'rb', 'rhtml', 'rs', 'scala', 'swift', 'md', 'markdown', 'tex', 'ltx', 'cls', 'sty', 'html', 'htm', 'xhtml', 'sol', 'cs', 'cob', 'cbl', 'cpy', 'c', 'h', 'lua', 'pl', 'pm', 't', 'hs', 'lhs', 'ex', 'exs', 'ps1', 'psm1', 'psd1', 'txt']
     TABULAR_EXTENSIONS: List[str] = ["csv", "xlsx", "xls", "parquet"]
+    TEXT_READ_CHUNK_SIZE: int = 256 * 1024 # in bytes
+    TEXT_MAX_LINE_LENGTH: int = 20_000 # in characters
+    TEXT_MAX_LINES: int = 500_000
+    TEXT_MAX_CONTROL_CHAR_RATIO: float = 0.05 # above this the "text" is treated as binary
+    TEXT_REJECT_SECRETS: bool = os.getenv("TEXT_REJECT_SECRETS", "False").lower() == "true"
+    TABULAR_BLOCK_SIZE: int = 1024 * 1024 # in bytes, per CSV parse block
+    TABULAR_BATCH_ROWS: int = 10_000
+    TABULAR_MAX_ROWS: int = 1_000_000
+    TABULAR_MAX_COLUMNS: int = 1_000
+    TABULAR_FORMULA_INJECTION_ACTION: str = os.getenv("TABULAR_FORMULA_INJECTION_ACTION", "neutralize") # or "reject"
     
     ALLOWED_MIME_TYPES: dict = {
         'jpg': 'image/jpeg',
@@ -105,10 +229,34 @@ class Settings(BaseSettings):
         'parquet': 'application/vnd.apache.parquet'
     }
 
+    PUBLIC_BASE_URL: str = os.getenv("PUBLIC_BASE_URL", "") # prefix of links to this service's own endpoints, relative if empty
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "True").lower() == "true"
+    COMPRESSION_LEVEL: int = int(os.getenv("COMPRESSION_LEVEL", "3")) # zstd level
+    COMPRESSION_PART_SIZE: int = 5 * 1024 * 1024 # in bytes, multipart part size of compressed uploads (S3 minimum)
+    # Released objects stored zstd-compressed: text formats; images, PDFs, xlsx and Parquet are compressed already
+    COMPRESSED_MIME_TYPES: List[str] = sorted({
+        mime for mime in ALLOWED_MIME_TYPES.values()
+        if mime.startswith("text/") or mime in ("application/x-php", "application/x-tex", "application/xhtml+xml", "application/x-powershell")
+    })
+
     VIRUSTOTAL_API_KEY: str = os.getenv("VIRUSTOTAL_API_KEY", "")
+    VIRUSTOTAL_HEALTH_URL: str = "https://www.virustotal.com/api/v3/"
+
+    HEALTH_CHECK_INTERVAL: float = float(os.getenv("HEALTH_CHECK_INTERVAL", "10")) # in seconds
+    HEALTH_CHECK_TIMEOUT: float = 2.0 # in seconds, per probe
+    HEALTH_REQUIRED_DEPENDENCIES: List[str] = ["minio", "redis"] # the others only mark the service degraded
 
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
+    ENGINE_WARM_UP: bool = os.getenv("ENGINE_WARM_UP", "True").lower() == "true" # load the check engines in the background at startup
+    SERVER_WORKERS: int = int(os.getenv("SERVER_WORKERS", "0")) # 0 means one per available CPU
+    SERVER_MAX_REQUESTS: int = int(os.getenv("SERVER_MAX_REQUESTS", "2000")) # per worker before it is recycled, 0 disables
+    SERVER_MAX_REQUESTS_JITTER: int = 200
+    SERVER_MAX_RSS_MB: int = int(os.getenv("SERVER_MAX_RSS_MB", "1536")) # per worker before it is recycled, 0 disables
+    SERVER_RSS_CHECK_INTERVAL: float = 10.0 # in seconds
+    SERVER_GRACEFUL_TIMEOUT: int = 30 # in seconds
+    SERVER_BACKLOG: int = 2048
+    SERVER_MIN_WORKER_LIFETIME: float = 1.0 # in seconds, workers dying faster are respawned with a delay
 
     class Config:
         env_file = ".env"
@@ -2,10 +2,12 @@ import traceback
 
 
 class BaseCustomException(Exception):
-    def __init__(self, message: str, original_exception: Exception = None):
+    def __init__(self, message: str, original_exception: Exception = None, malicious: bool = False):
         super().__init__(message)
         self.message = message
         self.original_exception = original_exception
+        # A detection of malicious content, as opposed to a file that could not be parsed or is over a limit
+        self.malicious = malicious or getattr(original_exception, "malicious", False)
         self.error_type = (
             type(original_exception).__name__ if original_exception else None
         )
@@ -41,5 +43,28 @@ class ImageFileCheckException(BaseCustomException):
 class PDFFileCHeckException(BaseCustomException):
     pass
 
+class TabularFileCheckException(BaseCustomException):
+    pass
+
+class TextFileCheckException(BaseCustomException):
+    pass
+
 class QuarantineFileStoreException(BaseCustomException):
-    pass
\ No newline at end of file
+    pass
+
+
+class DeadlineExceededException(BaseCustomException):
+    pass
+
+
+class AdmissionControlException(BaseCustomException):
+    def __init__(self, message: str, retry_after: int, original_exception: Exception = None):
+        super().__init__(message, original_exception)
+        self.retry_after = retry_after
+
+
+class DependencyUnavailableException(BaseCustomException):
+    def __init__(self, message: str, dependency: str, retry_after: int, original_exception: Exception = None):
+        super().__init__(message, original_exception)
+        self.dependency = dependency
+        self.retry_after = retry_after
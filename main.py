@@ -6,8 +6,14 @@ from contextlib import asynccontextmanager
 from config.settings import settings
 from config.minio_config import minio_client
 from config.redis_config import pool
+from services.minio_service import ensure_buckets
+from services.service_factory import ServiceFactory
+from services.health_monitor import health_monitor
+from services.quarantine_janitor import quarantine_deletes, quarantine_janitor
+from services.virustotal_rescanner import virustotal_rescanner
 
 import time
+import asyncio
 from routers import router_modules
 
 from logs import setup_logging
@@ -17,14 +23,28 @@ setup_logging()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     
-    if not minio_client.bucket_exists(settings.MINIO_BUCKET.lower().replace("_", "-")):
-        minio_client.make_bucket(settings.MINIO_BUCKET.lower().replace("_", "-"))
-        
-    if not minio_client.bucket_exists(settings.MINIO_QUARANTINE_BUCKET.lower().replace("_", "-")):
-        minio_client.make_bucket(settings.MINIO_QUARANTINE_BUCKET.lower().replace("_", "-"))
+    # Neither blocks startup: buckets are created once MinIO answers, engines load in a thread
+    background = [asyncio.create_task(ensure_buckets())]
+    if settings.ENGINE_WARM_UP:
+        background.append(asyncio.create_task(asyncio.to_thread(ServiceFactory.warm_up)))
+    health_monitor.start()
+    quarantine_deletes.start()
+    if settings.QUARANTINE_JANITOR_ENABLED:
+        quarantine_janitor.start()
+    if settings.VIRUSTOTAL_RESCAN_ENABLED:
+        virustotal_rescanner.start()
         
     yield
     
+    await health_monitor.stop()
+    await quarantine_janitor.stop()
+    await virustotal_rescanner.stop()
+    # Last flush of the deletes queued by released files
+    await quarantine_deletes.stop()
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    
     
 app = FastAPI(
     title= settings.PROJECT_NAME,
@@ -48,19 +68,6 @@ app.add_middleware(
     allow_headers = ["*"],
 )
 
-@app.get("/health", tags=["Health Check"])
-def health_check() -> dict:
-    
-    health_data = {"status" : "healthy", "minio_status": "unkown"}
-    
-    try:
-        buckets = minio_client.list_buckets()
-        health_data["minio_status"] = "healthy" if buckets else "unhealthy"
-    except Exception as e:
-        health_data["minio_status"] = "unhealthy"
-    
-    return health_data
-
 for router_module in router_modules:
     app.include_router(router_module.router)
 
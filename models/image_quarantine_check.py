@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
 from .quarantine_file_check import QuarantineFileCheck
 from PIL import Image
+from services.file_buffer import FileBuffer
 
 class ImageQuarantineCheck(QuarantineFileCheck, ABC):
     
@@ -19,5 +20,5 @@ class ImageQuarantineCheck(QuarantineFileCheck, ABC):
         pass
     
     @abstractmethod
-    def run_image_check_pipeline(self, file_content: bytes, filename: str): 
+    def run_image_check_pipeline(self, file_buffer: FileBuffer, filename: str): 
         pass
\ No newline at end of file
@@ -1,39 +1,40 @@
 from abc import ABC, abstractmethod
 from .quarantine_file_check import QuarantineFileCheck
+from services.file_buffer import FileBuffer
 
 
 class PDFQuarantineCheck(QuarantineFileCheck, ABC):
     
     @abstractmethod
-    def is_valid_signature(self, file_content: bytes) -> bool:
+    def is_valid_signature(self, file_buffer: FileBuffer) -> bool:
         """Validates the file signature"""
         pass
     
     @abstractmethod
-    def is_pdf_encrypted(self, file_content: bytes) -> bool:
+    def is_pdf_encrypted(self, file_buffer: FileBuffer) -> bool:
         """Checks for password protected files"""
         pass
     
     @abstractmethod
-    def has_javascript(self, file_content: bytes) -> bool:
+    def has_javascript(self, file_buffer: FileBuffer) -> bool:
         """Checks for embedded JavaScript"""
         pass
     
     @abstractmethod
-    def list_embedded_files(self, file_content: bytes) -> list:
+    def list_embedded_files(self, file_buffer: FileBuffer) -> list:
         """Lists embedded files"""
         pass
     
     @abstractmethod
-    def detect_zip_bomb(self, file_content: bytes) -> bool:
+    def detect_zip_bomb(self, file_buffer: FileBuffer) -> bool:
         """Detects zip bomb"""
         pass
             
     @abstractmethod
-    def has_invisible_text(self, file_content: bytes) -> bool:
+    def has_invisible_text(self, file_buffer: FileBuffer) -> bool:
         """Checks for invisible texts"""
         pass
     
     @abstractmethod
-    async def run_pdf_check_pipeline(self, file_content: bytes) -> dict:
+    async def run_pdf_check_pipeline(self, file_buffer: FileBuffer) -> dict:
         pass
\ No newline at end of file
@@ -1,20 +1,21 @@
 from abc import ABC, abstractmethod
+from services.file_buffer import FileBuffer
 
 class QuarantineFileCheck(ABC):
     
     @abstractmethod
-    async def download_file(self) -> bytes:
+    async def download_file(self) -> FileBuffer:
         """Downloads file from the given URL"""
         pass
     
     @abstractmethod
-    def get_file_size(self, file_content: bytes) -> float:
+    def get_file_size(self, file_buffer: FileBuffer) -> float:
         """Gets the size of the file"""
         pass
     
     
     @abstractmethod
-    def generate_unique_filename(self, file_content: bytes, filename: str) -> str:
+    def generate_unique_filename(self, file_buffer: FileBuffer, filename: str) -> str:
         """Generates the hashname for the file"""
         pass
     
@@ -24,7 +25,7 @@ class QuarantineFileCheck(ABC):
         pass
     
     @abstractmethod
-    def verify_magic_number(self, file_content: bytes, filename: str) -> bool:
+    def verify_magic_number(self, file_buffer: FileBuffer, filename: str) -> bool:
         """Verify the filetype using magic numbers"""
         pass
     
@@ -37,10 +38,10 @@ class QuarantineFileCheck(ABC):
     def scan_multiple_files(self):
         pass
     
-    # @abstractmethod
-    # def sanitize_metadata(self):
-    #     """Sanitizes metadata"""
-    #     pass
+    @abstractmethod
+    def sanitize_metadata(self, file_buffer: FileBuffer, filename: str):
+        """Sanitizes metadata"""
+        pass
     
     @abstractmethod
     def delete_file_from_quarantine(self, filename: str) -> bool:
@@ -8,6 +8,11 @@ class QuarantineFileStore(ABC):
         pass
     
     @abstractmethod
-    def generate_presigned_download_url_minio(self) -> str:
+    def generate_presigned_download_url_minio(self, filename: str) -> str:
         """Gets the presigned URL from MinIO"""
+        pass
+    
+    @abstractmethod
+    async def get_download_urls(self, size: str = None) -> dict:
+        """Gets presigned URLs for many released objects"""
         pass
\ No newline at end of file
@@ -0,0 +1,22 @@
+from abc import ABC, abstractmethod
+from typing import Iterator
+from .quarantine_file_check import QuarantineFileCheck
+from services.file_buffer import FileBuffer
+
+
+class TabularQuarantineCheck(QuarantineFileCheck, ABC):
+    
+    @abstractmethod
+    def iter_record_batches(self, file_buffer: FileBuffer, filename: str) -> Iterator:
+        """Parses the file into bounded-size record batches"""
+        pass
+    
+    @abstractmethod
+    def detect_formula_injection(self, record_batch):
+        """Finds cells starting with formula/CSV-injection triggers"""
+        pass
+    
+    @abstractmethod
+    def run_tabular_check_pipeline(self, file_buffer: FileBuffer, filename: str):
+        """Scans the file and normalizes it into Parquet"""
+        pass
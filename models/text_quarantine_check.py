@@ -0,0 +1,16 @@
+from abc import ABC, abstractmethod
+from .quarantine_file_check import QuarantineFileCheck
+from services.file_buffer import FileBuffer
+
+
+class TextQuarantineCheck(QuarantineFileCheck, ABC):
+    
+    @abstractmethod
+    def detect_encoding(self, file_buffer: FileBuffer) -> str:
+        """Detects the text encoding from the BOM / leading bytes"""
+        pass
+    
+    @abstractmethod
+    def run_text_check_pipeline(self, file_buffer: FileBuffer, filename: str):
+        """Single pass over the file for binary content, line limits and secrets"""
+        pass
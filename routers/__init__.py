@@ -2,5 +2,7 @@ from importlib import import_module
 
 router_modules = [
     import_module(".endpoint", package=__name__),
-    import_module(".quarantine_file_check", package=__name__)
+    import_module(".quarantine_file_check", package=__name__),
+    import_module(".metrics", package=__name__),
+    import_module(".health", package=__name__)
 ]
\ No newline at end of file
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, UploadFile, File, Form, Request, HTTPException
-import httpx
+from fastapi import APIRouter, UploadFile, File, Form, Query, Request, HTTPException
+import asyncio
+import redis
+import aiohttp
+from fastapi.responses import StreamingResponse
 from services.quarantine_file_store_service import QuarantineFileStoreService
-from exceptions import MinIOException, QuarantineFileStoreException
+from services.minio_service import generate_presigned_derivative_url_minio
+from services.rate_limiter import rate_limiter
+from services.file_index import IndexedFile, list_released_files
+from exceptions import MinIOException, QuarantineFileStoreException, AdmissionControlException, DependencyUnavailableException
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Optional
 from config.settings import settings
 from logs import get_app_logger, get_error_logger
 
@@ -22,6 +28,18 @@ class PresignedURLResponse(BaseModel):
     urls: List[str]
     object_paths: List[str]
 
+class PresignedDownloadRequest(BaseModel):
+    userid: str
+    filenames: List[str] # hashed filenames of released objects
+    size: Optional[str] = None # derivative size, e.g. "thumbnail"
+
+class PresignedDownloadResponse(BaseModel):
+    urls: Dict[str, Optional[str]]
+
+class FileListResponse(BaseModel):
+    files: List[IndexedFile]
+    next_cursor: Optional[str]
+
 class FileIngestMeta(BaseModel):
     filename: str
     content_type: str
@@ -41,8 +59,11 @@ async def put_presigned_url(req: PresignedURLRequest):
     filenames = [file.filename for file in req.files]
     file_service = QuarantineFileStoreService(filenames, req.userid, expires=10)    
     try:
+        await rate_limiter.check("presign", req.userid, cost=len(filenames))
         urls, object_paths = await file_service.get_put_url()
         return PresignedURLResponse(urls=urls, object_paths=object_paths)
+    except AdmissionControlException as e:
+        raise HTTPException(status_code=429, detail=e.to_dict(), headers={"Retry-After": str(e.retry_after)})
     except (MinIOException, QuarantineFileStoreException) as e:
         raise  HTTPException(status_code=500, detail=e.to_dict())
     except Exception as e:
@@ -53,12 +74,12 @@ async def ingest_event(
     payload: FilesRequest
 ):
     try:
-        async with httpx.AsyncClient() as client:
-            res = await client.post(
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=settings.TINES_TIMEOUT)) as session:
+            async with session.post(
                 f"{settings.TINES_WEBHOOK_URL}/{settings.TINES_SECRET}",
                 json=payload.model_dump()
-            )
-            res.raise_for_status()
+            ) as res:
+                res.raise_for_status()
         return {"status": "success"}
     except Exception as e:
         error_logger.error(f"Failed to ingest event to Tines: {str(e)}")
@@ -67,15 +88,80 @@ async def ingest_event(
 @router.get("/get_presigned_url")
 async def get_presigned_url(
     filename: str = Form(...),
-    userid: str = Form(...)
+    userid: str = Form(...),
+    size: Optional[str] = Form(None)
 ):
-    file_service = QuarantineFileStoreService(filename, userid)
+    if size is not None:
+        # Derivatives belong to released objects, `filename` is then the hashed filename
+        if size not in settings.IMAGE_DERIVATIVE_SIZES:
+            raise HTTPException(status_code=400, detail=f"Unknown size '{size}', expected one of {list(settings.IMAGE_DERIVATIVE_SIZES)}")
+        try:
+            url = await asyncio.to_thread(generate_presigned_derivative_url_minio, filename, userid, size)
+        except MinIOException as e:
+            raise HTTPException(status_code=500, detail=e.to_dict())
+        if url is None:
+            raise HTTPException(status_code=404, detail=f"No {size} derivative for {filename}")
+        return {"presigned_url" : url}
+
+    file_service = QuarantineFileStoreService([filename], userid)
     
     try:
-        url = file_service.generate_presigned_download_url_minio()
+        url = await asyncio.to_thread(file_service.generate_presigned_download_url_minio, filename)
         return {"presigned_url" : url} 
     except MinIOException as e:
         raise  HTTPException(status_code=500, detail=e.to_dict())
     except Exception as e:
         raise  HTTPException(status_code=500, detail=str(e))
-    
\ No newline at end of file
+
+@router.post("/get_presigned_urls")
+async def get_presigned_urls(req: PresignedDownloadRequest):
+    """Signs many released objects (or their derivatives) in one call, e.g. for a gallery."""
+    if req.size is not None and req.size not in settings.IMAGE_DERIVATIVE_SIZES:
+        raise HTTPException(status_code=400, detail=f"Unknown size '{req.size}', expected one of {list(settings.IMAGE_DERIVATIVE_SIZES)}")
+    file_service = QuarantineFileStoreService(req.filenames, req.userid)
+    try:
+        urls = await file_service.get_download_urls(req.size)
+        return PresignedDownloadResponse(urls=urls)
+    except DependencyUnavailableException as e:
+        raise HTTPException(status_code=503, detail=e.to_dict(), headers={"Retry-After": str(e.retry_after)})
+    except (MinIOException, QuarantineFileStoreException) as e:
+        raise  HTTPException(status_code=500, detail=e.to_dict())
+    except Exception as e:
+        raise  HTTPException(status_code=500, detail=str(e))
+
+@router.get("/download")
+async def download_file(
+    request: Request,
+    userid: str = Query(...),
+    filename: str = Query(...),
+):
+    """Streams a released object (`filename` is its hashed filename), decompressed unless the client accepts its stored encoding."""
+    file_service = QuarantineFileStoreService([filename], userid)
+    try:
+        opened = await file_service.open_download(filename, request.headers.get("accept-encoding"))
+    except DependencyUnavailableException as e:
+        raise HTTPException(status_code=503, detail=e.to_dict(), headers={"Retry-After": str(e.retry_after)})
+    except MinIOException as e:
+        raise HTTPException(status_code=500, detail=e.to_dict())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if opened is None:
+        raise HTTPException(status_code=404, detail=f"No file {filename} for user {userid}")
+    chunks, headers = opened
+    return StreamingResponse(chunks, headers=headers)
+
+@router.get("/list")
+async def list_files(
+    userid: str = Query(...),
+    limit: int = Query(50, ge=1, le=settings.FILE_INDEX_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+):
+    """Released files of a user, newest first. Pass `next_cursor` back as `cursor` for the next page."""
+    try:
+        files, next_cursor = await asyncio.to_thread(list_released_files, userid, limit, cursor)
+        return FileListResponse(files=files, next_cursor=next_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except redis.RedisError as e:
+        error_logger.error(f"Failed to list files of user: {userid} => {str(e)}")
+        raise HTTPException(status_code=503, detail="File index unavailable")
@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
+from services.health_monitor import health_monitor
+
+
+router = APIRouter(
+    tags=["Health Check"]
+)
+
+# All three answer from the monitor's cache and never touch a dependency themselves
+
+@router.get("/health")
+async def health_check():
+    return ORJSONResponse(health_monitor.snapshot())
+
+@router.get("/health/live")
+async def liveness():
+    if not health_monitor.alive:
+        return ORJSONResponse({"status": "dead"}, status_code=503)
+    return ORJSONResponse({"status": "alive"})
+
+@router.get("/health/ready")
+async def readiness():
+    snapshot = health_monitor.snapshot()
+    return ORJSONResponse(snapshot, status_code=200 if health_monitor.ready else 503)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services.metrics import registry
+
+
+router = APIRouter(
+    tags=["metrics"]
+)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return registry.render()
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, UploadFile, File, Form, Request, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Query, Request, HTTPException
 # from services.file_pipeline import FilePipeline
 from services.orchestrators.quarantine_file_check_pipeline import QuarantineFileCheckPipeline
-from exceptions import QuarantineFileCheckException
+from exceptions import QuarantineFileCheckException, AdmissionControlException, DeadlineExceededException, DependencyUnavailableException
+from services.deadline import Deadline
+from services.rate_limiter import rate_limiter
+from typing import Optional
+from config.settings import settings
 # from services.service_factory import ServiceFactory
 
 
@@ -10,17 +14,66 @@ router = APIRouter(
     tags=["quarantine"]
 )
 
+def _deadline_exceeded(e: Exception) -> HTTPException:
+    detail = e.to_dict() if isinstance(e, DeadlineExceededException) else f"Request deadline exceeded: {e}"
+    return HTTPException(status_code=504, detail=detail)
+
+
 @router.post("/check")
 async def check_quarantine_file(
+    request: Request,
     url: str = Form(...),
     filename: str = Form(...),
     userid: str = Form(...),
-    
+    file_size: Optional[int] = Form(None),
+):
+    deadline = Deadline.for_request(request.headers.get("x-request-timeout"))
+    try:
+        await rate_limiter.check("check", userid)
+        return await deadline.run(QuarantineFileCheckPipeline.process("",url, filename, userid, file_size))
+    except AdmissionControlException as e:
+        raise HTTPException(status_code=429, detail=e.to_dict(), headers={"Retry-After": str(e.retry_after)})
+    except DependencyUnavailableException as e:
+        raise HTTPException(status_code=503, detail=e.to_dict(), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceededException as e:
+        raise _deadline_exceeded(e)
+    except QuarantineFileCheckException as e:
+        # A stage that hit the deadline may surface as its own error type
+        if deadline.expired:
+            raise _deadline_exceeded(e)
+        raise HTTPException(status_code=500, detail=e.to_dict())
+    except Exception as e:
+        if deadline.expired:
+            raise _deadline_exceeded(e)
+        raise  HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/upload")
+async def upload_quarantine_file(
+    request: Request,
+    filename: str = Query(...),
+    userid: str = Query(...),
 ):
+    """Checks a file sent as the raw request body, streamed to quarantine while it is received."""
+    content_length = request.headers.get("content-length")
+    file_size = int(content_length) if content_length and content_length.isdigit() else None
+    if file_size and file_size > settings.MAX_FILE_SIZE * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"File exceeds {settings.MAX_FILE_SIZE} MB")
+    deadline = Deadline.for_request(request.headers.get("x-request-timeout"))
     try:
-        return await QuarantineFileCheckPipeline.process("",url, filename, userid)
+        await rate_limiter.check("check", userid)
+        return await deadline.run(QuarantineFileCheckPipeline.process_upload("", request.stream(), filename, userid, file_size))
+    except AdmissionControlException as e:
+        raise HTTPException(status_code=429, detail=e.to_dict(), headers={"Retry-After": str(e.retry_after)})
+    except DependencyUnavailableException as e:
+        raise HTTPException(status_code=503, detail=e.to_dict(), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceededException as e:
+        raise _deadline_exceeded(e)
     except QuarantineFileCheckException as e:
+        if deadline.expired:
+            raise _deadline_exceeded(e)
         raise HTTPException(status_code=500, detail=e.to_dict())
     except Exception as e:
+        if deadline.expired:
+            raise _deadline_exceeded(e)
         raise  HTTPException(status_code=500, detail=str(e))
-    
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+Measures cold start of the app.
+
+    python scripts/benchmark_startup.py [--runs 5] [--top 15]
+
+Reports, each in fresh interpreters:
+  - import time of `main`, broken down by the slowest top-level imports
+  - the time each check engine takes to load on first use
+  - time to first request: from spawning uvicorn until GET /metrics answers
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENGINE_TIMINGS = """
+import json, time
+import main
+from services.service_factory import ENGINES, ServiceFactory
+timings = {}
+for kind in ENGINES:
+    started_at = time.perf_counter()
+    ServiceFactory.load_engine(kind)
+    timings[ENGINES[kind].split(":")[1]] = time.perf_counter() - started_at
+started_at = time.perf_counter()
+ServiceFactory.warm_up()
+timings["warm_up (rest)"] = time.perf_counter() - started_at
+print(json.dumps(timings))
+"""
+
+
+def _python(*args: str, **kwargs) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True, **kwargs)
+
+
+def import_breakdown() -> Dict[str, float]:
+    """Cumulative microseconds of `import main` and of the modules near the top of its import tree."""
+    stderr = _python("-X", "importtime", "-c", "import main").stderr
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Only modules imported at the top of the tree, deeper ones are included in their parents
+        if len(name) - len(name.lstrip()) <= 3:
+            timings[name.strip()] = max(timings.get(name.strip(), 0), int(cumulative))
+    return timings
+
+
+def engine_load_times() -> Dict[str, float]:
+    return json.loads(_python("-c", ENGINE_TIMINGS).stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_first_request(timeout: float = 60.0) -> float:
+    port = _free_port()
+    started_at = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started_at < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1):
+                    return time.perf_counter() - started_at
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"No response within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _summary(samples: List[float]) -> str:
+    return f"median {statistics.median(samples) * 1000:8.1f} ms   min {min(samples) * 1000:8.1f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="number of imports listed in the breakdown")
+    args = parser.parse_args()
+
+    imports = defaultdict(list)
+    engines = defaultdict(list)
+    first_request = []
+    for _ in range(args.runs):
+        for name, microseconds in import_breakdown().items():
+            imports[name].append(microseconds / 1_000_000)
+        for name, seconds in engine_load_times().items():
+            engines[name].append(seconds)
+        first_request.append(time_to_first_request())
+
+    print(f"import main ({args.runs} runs): {_summary(imports.pop('main'))}")
+    slowest = sorted(imports.items(), key=lambda item: statistics.median(item[1]), reverse=True)[:args.top]
+    for name, samples in slowest:
+        print(f"  {name:<50} {_summary(samples)}")
+
+    print("\nengine load on first use:")
+    for name, samples in engines.items():
+        print(f"  {name:<50} {_summary(samples)}")
+
+    print(f"\ntime to first request: {_summary(first_request)}")
+
+
+if __name__ == "__main__":
+    main()
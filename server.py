@@ -0,0 +1,156 @@
+"""
+Production entry point: `python server.py`.
+
+The master preloads the native parsers and the app, then forks the workers,
+so their pages are shared copy-on-write. Every worker serves the same
+listening socket with its own uvicorn server and is replaced once it has
+handled SERVER_MAX_REQUESTS requests or grown past SERVER_MAX_RSS_MB.
+"""
+import gc
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+import uvicorn
+
+from config.settings import settings
+from logs import get_app_logger, get_error_logger
+
+app_logger = get_app_logger()
+error_logger = get_error_logger()
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def preload():
+    """Imports the app and every check engine once, before forking."""
+    from main import app
+    from services.service_factory import ServiceFactory
+
+    ServiceFactory.warm_up()
+    # Objects created so far are never collected; keeps GC passes in the workers from writing to (and copying) shared pages
+    gc.freeze()
+    return app
+
+
+def default_workers() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resident_memory_mb() -> Optional[float]:
+    """Current RSS from /proc, None where it is not available."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE / (1024 * 1024)
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _watch_memory(server: uvicorn.Server) -> None:
+    while not server.should_exit:
+        time.sleep(settings.SERVER_RSS_CHECK_INTERVAL)
+        rss_mb = resident_memory_mb()
+        if rss_mb is not None and rss_mb > settings.SERVER_MAX_RSS_MB:
+            app_logger.info(f"Worker {os.getpid()} uses {rss_mb:.0f} MB RSS, recycling")
+            server.should_exit = True
+
+
+class PreforkServer:
+
+    def __init__(self, app, host: str, port: int, workers: int):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self._children: Dict[int, float] = {}
+        self._stopping = False
+        self._socket: Optional[socket.socket] = None
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(settings.SERVER_BACKLOG)
+        sock.set_inheritable(True)
+        return sock
+
+    def _serve(self) -> None:
+        max_requests = settings.SERVER_MAX_REQUESTS
+        if max_requests:
+            # Jitter keeps the workers from all recycling at the same moment
+            max_requests += random.randint(0, settings.SERVER_MAX_REQUESTS_JITTER)
+        config = uvicorn.Config(
+            self.app,
+            limit_max_requests=max_requests or None,
+            timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
+            backlog=settings.SERVER_BACKLOG,
+        )
+        server = uvicorn.Server(config)
+        if settings.SERVER_MAX_RSS_MB:
+            threading.Thread(target=_watch_memory, args=(server,), daemon=True).start()
+        server.run(sockets=[self._socket])
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                self._serve()
+            except BaseException as e:
+                error_logger.error(f"Worker {os.getpid()} crashed => {e}")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self._children[pid] = time.monotonic()
+        app_logger.info(f"Started worker {pid}")
+
+    def _stop(self, signum, frame) -> None:
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        self._socket = self._bind()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        app_logger.info(f"Listening on {self.host}:{self.port} with {self.workers} workers")
+
+        for _ in range(self.workers):
+            self._spawn()
+
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            started_at = self._children.pop(pid, None)
+            if started_at is None or self._stopping:
+                continue
+            app_logger.info(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, replacing it")
+            if time.monotonic() - started_at < settings.SERVER_MIN_WORKER_LIFETIME:
+                # Crashing on startup, do not fork in a tight loop
+                time.sleep(settings.SERVER_MIN_WORKER_LIFETIME)
+            self._spawn()
+
+        self._socket.close()
+
+
+if __name__ == "__main__":
+    PreforkServer(
+        preload(),
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=settings.SERVER_WORKERS or default_workers(),
+    ).run()
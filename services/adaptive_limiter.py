@@ -0,0 +1,169 @@
+import time
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, TypeVar
+
+import aiohttp
+from minio.error import S3Error
+
+from config.settings import settings
+from exceptions import AdmissionControlException
+from services.metrics import registry
+
+T = TypeVar("T")
+
+concurrency_limit = registry.gauge("files_backend_dependency_concurrency_limit", "Current adaptive in-flight limit, per dependency")
+concurrency_in_flight = registry.gauge("files_backend_dependency_in_flight", "Calls in flight, per dependency")
+concurrency_queued = registry.gauge("files_backend_dependency_queued", "Calls waiting for an in-flight slot, per dependency")
+concurrency_rejected_total = registry.gauge("files_backend_dependency_rejected_total", "Calls shed after waiting too long for a slot, per dependency")
+
+
+def _root_cause(exception: BaseException) -> BaseException:
+    """The service layer wraps client errors in BaseCustomException, the limiter judges the original one."""
+    while getattr(exception, "original_exception", None) is not None:
+        exception = exception.original_exception
+    return exception
+
+
+def minio_overloaded(exception: BaseException) -> bool:
+    exception = _root_cause(exception)
+    if isinstance(exception, S3Error):
+        # MinIO answered; only its throttling and server errors say it is struggling
+        return exception.code in ("SlowDown", "ServiceUnavailable", "InternalError", "RequestTimeout")
+    return isinstance(exception, (OSError, asyncio.TimeoutError))
+
+
+def virustotal_overloaded(exception: BaseException) -> bool:
+    exception = _root_cause(exception)
+    # By class name: importing vt here would load it for every process that only talks to MinIO
+    if type(exception).__name__ == "APIError" and type(exception).__module__.startswith("vt"):
+        return exception.args[0] in ("QuotaExceededError", "TransientError")
+    return isinstance(exception, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on the calls in flight to one dependency.
+
+    A call that finishes within `latency_target` without an overload error
+    grows the limit by 1/limit (about one slot per full window); a slow or
+    overloaded call shrinks it by `backoff`, at most once per
+    `latency_target` so one burst of timeouts does not collapse it to the
+    minimum. Calls over the limit queue in FIFO order for up to `max_wait`
+    seconds and are then shed with an AdmissionControlException, so the
+    caller backs off instead of piling retries onto a struggling service.
+    """
+
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int, latency_target: float,
+                 is_overload: Callable[[BaseException], bool], backoff: float, max_wait: float, retry_after: int):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.is_overload = is_overload
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        concurrency_limit.set(self.limit, dependency=name)
+
+    def _has_room(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def _acquire(self) -> None:
+        if not self._waiters and self._has_room():
+            self.in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            concurrency_queued.set(len(self._waiters), dependency=self.name)
+            try:
+                # The slot is taken on our behalf by whoever completes the waiter
+                await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+            except BaseException as e:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                else:
+                    waiter.cancel()
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                concurrency_queued.set(len(self._waiters), dependency=self.name)
+                if isinstance(e, asyncio.TimeoutError):
+                    concurrency_rejected_total.inc(dependency=self.name)
+                    raise AdmissionControlException(
+                        f"{self.name} is at its concurrency limit of {int(self.limit)}, retry later", self.retry_after
+                    )
+                raise
+        concurrency_in_flight.set(self.in_flight, dependency=self.name)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self._has_room():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+        concurrency_queued.set(len(self._waiters), dependency=self.name)
+        concurrency_in_flight.set(self.in_flight, dependency=self.name)
+
+    def _on_sample(self, latency: float, overloaded: bool) -> None:
+        now = time.monotonic()
+        if overloaded or latency > self.latency_target:
+            if now - self._last_decrease >= self.latency_target:
+                self._last_decrease = now
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+        elif self.in_flight >= int(self.limit) - 1:
+            # Only grow while the limit is what holds calls back
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+        concurrency_limit.set(self.limit, dependency=self.name)
+
+    async def run(self, call: Callable[[], Awaitable[T]], judge_latency: bool = True) -> T:
+        """
+        Awaits `call()` in an in-flight slot and feeds its latency and outcome
+        back into the limit. Bulk transfers pass `judge_latency=False`: their
+        duration follows the payload size, so only overload errors shrink the
+        limit and successes leave it as it is.
+        """
+        await self._acquire()
+        started_at = time.monotonic()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            # A hedge loser or deadline: only a signal if it had already been slow
+            latency = time.monotonic() - started_at
+            if judge_latency and latency > self.latency_target:
+                self._on_sample(latency, False)
+            raise
+        except Exception as e:
+            overloaded = self.is_overload(e)
+            if judge_latency or overloaded:
+                self._on_sample(time.monotonic() - started_at if judge_latency else 0.0, overloaded)
+            raise
+        else:
+            if judge_latency:
+                self._on_sample(time.monotonic() - started_at, False)
+            return result
+        finally:
+            self._release()
+
+
+def _limiter(name: str, is_overload: Callable[[BaseException], bool]) -> AdaptiveLimiter:
+    config = settings.ADAPTIVE_LIMITS[name]
+    return AdaptiveLimiter(
+        name,
+        initial=config["initial"],
+        min_limit=config["min"],
+        max_limit=config["max"],
+        latency_target=config["latency_target"],
+        is_overload=is_overload,
+        backoff=settings.ADAPTIVE_LIMIT_BACKOFF,
+        max_wait=settings.ADAPTIVE_LIMIT_MAX_WAIT,
+        retry_after=settings.ADAPTIVE_LIMIT_RETRY_AFTER,
+    )
+
+
+minio_limiter = _limiter("minio", minio_overloaded)
+virustotal_limiter = _limiter("virustotal", virustotal_overloaded)
@@ -0,0 +1,146 @@
+import math
+import time
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, TypeVar
+
+from config.settings import settings
+from exceptions import DependencyUnavailableException
+from services.adaptive_limiter import minio_overloaded, virustotal_overloaded
+from services.metrics import registry
+from logs import get_app_logger
+
+app_logger = get_app_logger()
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# What the pipeline does when a dependency's breaker is open
+POLICY_FAIL_FAST = "fail_fast" # the request fails with 503 and Retry-After
+POLICY_PENDING_RESCAN = "pending_rescan" # the check is skipped and the file queued to be checked again
+
+breaker_state = registry.gauge("files_backend_circuit_state", "Circuit breaker state per dependency (0 closed, 1 half open, 2 open)")
+breaker_rejected_total = registry.gauge("files_backend_circuit_rejected_total", "Calls failed fast by an open circuit, per dependency")
+
+
+class CircuitBreaker:
+    """
+    Fails calls to a dependency fast once it is failing.
+
+    The outcomes of the last `window` calls are kept; a call fails when it
+    raises an error `is_failure` accepts or takes longer than
+    `slow_call_threshold`. With at least `min_calls` outcomes and a failure
+    rate of `failure_rate` or more the circuit opens and every call raises
+    DependencyUnavailableException for `open_duration` seconds. It then
+    lets `half_open_calls` probes through: if all succeed it closes, the
+    first failure opens it again.
+    """
+
+    def __init__(self, name: str, window: int, min_calls: int, failure_rate: float, slow_call_threshold: float,
+                 open_duration: float, half_open_calls: int, is_failure: Callable[[BaseException], bool]):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_threshold = slow_call_threshold
+        self.open_duration = open_duration
+        self.half_open_calls = half_open_calls
+        self.is_failure = is_failure
+        self.state = CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=window) # True for a failed call
+        self._opened_at = 0.0
+        self._probes = 0 # admitted while half open
+        self._probe_successes = 0
+        breaker_state.set(STATE_VALUES[CLOSED], dependency=name)
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        app_logger.warning(f"Circuit breaker for {self.name}: {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state != CLOSED:
+            self._probes = self._probe_successes = 0
+        else:
+            self._outcomes.clear()
+        breaker_state.set(STATE_VALUES[state], dependency=self.name)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._opened_at + self.open_duration - time.monotonic()))
+
+    def _admit(self) -> None:
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+            self._transition(HALF_OPEN)
+        if self.state == CLOSED:
+            return
+        if self.state == HALF_OPEN and self._probes < self.half_open_calls:
+            self._probes += 1
+            return
+        breaker_rejected_total.inc(dependency=self.name)
+        raise DependencyUnavailableException(f"{self.name} is unavailable, circuit {self.state}", self.name, self.retry_after())
+
+    def _record(self, failed: bool) -> None:
+        if self.state == HALF_OPEN:
+            if failed:
+                self._transition(OPEN)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_calls:
+                self._transition(CLOSED)
+            return
+        if self.state == OPEN:
+            # Admitted before the circuit opened
+            return
+        self._outcomes.append(failed)
+        if len(self._outcomes) >= self.min_calls and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+            self._transition(OPEN)
+
+    async def call(self, call: Callable[[], Awaitable[T]], judge_latency: bool = True) -> T:
+        """
+        Awaits `call()` unless the circuit is open, recording its outcome.
+        Bulk transfers pass `judge_latency=False`: their duration follows the
+        payload size, so only their errors count.
+        """
+        self._admit()
+        state = self.state
+        started_at = time.monotonic()
+        too_slow = lambda: judge_latency and time.monotonic() - started_at > self.slow_call_threshold
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            # The caller gave up; only count it if the call was already too slow
+            if too_slow():
+                self._record(True)
+            elif state == HALF_OPEN and self.state == HALF_OPEN:
+                self._probes -= 1
+            raise
+        except Exception as e:
+            self._record(self.is_failure(e) or too_slow())
+            raise
+        self._record(too_slow())
+        return result
+
+
+def _breaker(name: str, is_failure: Callable[[BaseException], bool]) -> CircuitBreaker:
+    config = settings.CIRCUIT_BREAKERS[name]
+    return CircuitBreaker(
+        name,
+        window=config["window"],
+        min_calls=config["min_calls"],
+        failure_rate=config["failure_rate"],
+        slow_call_threshold=config["slow_call_threshold"],
+        open_duration=config["open_duration"],
+        half_open_calls=config["half_open_calls"],
+        is_failure=is_failure,
+    )
+
+
+def breaker_policy(dependency: str) -> str:
+    return settings.CIRCUIT_BREAKERS.get(dependency, {}).get("policy", POLICY_FAIL_FAST)
+
+
+minio_breaker = _breaker("minio", minio_overloaded)
+virustotal_breaker = _breaker("virustotal", virustotal_overloaded)
@@ -0,0 +1,136 @@
+import time
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Optional, TypeVar
+
+from tenacity.stop import stop_base
+
+from config.settings import settings
+from exceptions import DeadlineExceededException
+
+T = TypeVar("T")
+
+_current_deadline: ContextVar[Optional["Deadline"]] = ContextVar("deadline", default=None)
+
+
+class Deadline:
+    """
+    Time budget of one request.
+
+    Created by the router and activated for the request; it reaches every
+    stage through a context variable, which asyncio tasks and `to_thread`
+    copy. Each call takes its timeout from what is left of the budget.
+    """
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    @classmethod
+    def for_request(cls, requested: Optional[str] = None) -> "Deadline":
+        """The configured budget, shortened to the client's own timeout (seconds) when it sent one."""
+        budget = settings.REQUEST_DEADLINE
+        try:
+            if requested is not None and float(requested) > 0:
+                budget = min(budget, float(requested))
+        except ValueError:
+            pass
+        return cls(budget)
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceededException(f"Request deadline of {self.budget}s exceeded")
+        return min(remaining, cap) if cap is not None else remaining
+
+    @contextmanager
+    def activate(self) -> Iterator["Deadline"]:
+        token = _current_deadline.set(self)
+        try:
+            yield self
+        finally:
+            _current_deadline.reset(token)
+
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """Awaits the whole request, failing fast once the budget is spent."""
+        with self.activate():
+            try:
+                return await asyncio.wait_for(awaitable, self.timeout())
+            except asyncio.TimeoutError:
+                if self.expired:
+                    raise DeadlineExceededException(f"Request deadline of {self.budget}s exceeded")
+                raise
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def remaining_timeout(cap: Optional[float] = None) -> Optional[float]:
+    """Timeout for one call: `cap` bounded by the rest of the request deadline, just `cap` outside a request."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return cap
+    return deadline.timeout(cap)
+
+
+async def with_deadline(awaitable: Awaitable[T], cap: Optional[float] = None) -> T:
+    try:
+        return await asyncio.wait_for(awaitable, remaining_timeout(cap))
+    except asyncio.TimeoutError:
+        deadline = _current_deadline.get()
+        if deadline is not None and deadline.expired:
+            raise DeadlineExceededException(f"Request deadline of {deadline.budget}s exceeded")
+        raise
+
+
+class stop_at_deadline(stop_base):
+    """tenacity stop condition: no further attempt once the request deadline is (nearly) spent."""
+
+    def __init__(self, min_remaining: float = 1.0):
+        self.min_remaining = min_remaining
+
+    def __call__(self, retry_state) -> bool:
+        deadline = _current_deadline.get()
+        return deadline is not None and deadline.remaining() < self.min_remaining
+
+
+async def hedged(call: Callable[[], Awaitable[T]], delay: float, discard: Optional[Callable[[T], Any]] = None) -> T:
+    """
+    Runs `call` and, if it has not finished after `delay` seconds, a second
+    identical attempt; the first success wins. Only for idempotent reads.
+    `discard` releases the result of an attempt that lost the race.
+    """
+    attempts = {asyncio.ensure_future(call())}
+    pending = set(attempts)
+    winner: Optional[asyncio.Future] = None
+    error: Optional[BaseException] = None
+    try:
+        done, _ = await asyncio.wait(attempts, timeout=delay)
+        if not done:
+            hedge = asyncio.ensure_future(call())
+            attempts.add(hedge)
+            pending.add(hedge)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    winner = attempt
+                    return attempt.result()
+                error = attempt.exception()
+        raise error
+    finally:
+        for attempt in pending:
+            attempt.cancel()
+        if discard is not None:
+            for attempt in attempts:
+                if attempt is not winner and attempt.done() and not attempt.cancelled() and attempt.exception() is None:
+                    discard(attempt.result())
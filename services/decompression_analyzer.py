@@ -0,0 +1,160 @@
+import bz2
+import time
+import zlib
+import struct
+import zipfile
+import pikepdf
+from dataclasses import dataclass
+from typing import Optional
+
+from config.settings import settings
+from services.file_buffer import FileBuffer
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+FLATE_FILTERS = ("/FlateDecode", "/Fl")
+ZIP_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+ZIP_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+
+@dataclass
+class DecompressionReport:
+    compressed_bytes: int = 0
+    decompressed_bytes: int = 0
+    streams: int = 0
+    exceeded: Optional[str] = None
+
+    @property
+    def ratio(self) -> float:
+        return self.decompressed_bytes / self.compressed_bytes if self.compressed_bytes else 0.0
+
+
+class _DecompressionBudget:
+    """Tracks output and CPU time across every stream of one file."""
+
+    def __init__(self, report: DecompressionReport):
+        self.report = report
+        self.max_output = settings.DECOMPRESSION_MAX_OUTPUT_MB * 1024 * 1024
+        self.cpu_deadline = time.thread_time() + settings.DECOMPRESSION_CPU_BUDGET
+
+    def check(self, stream_in: int, stream_out: int, name: str) -> bool:
+        """Records the reason and returns False once any limit is crossed."""
+        if self.report.decompressed_bytes > self.max_output:
+            self.report.exceeded = f"decompressed output exceeds {settings.DECOMPRESSION_MAX_OUTPUT_MB} MB"
+        elif stream_out >= settings.DECOMPRESSION_RATIO_MIN_OUTPUT and stream_in and stream_out / stream_in > settings.DECOMPRESSION_MAX_RATIO:
+            self.report.exceeded = f"{name} expands more than {settings.DECOMPRESSION_MAX_RATIO}x"
+        elif time.thread_time() > self.cpu_deadline:
+            self.report.exceeded = f"decompression exceeded the {settings.DECOMPRESSION_CPU_BUDGET}s CPU budget"
+        return self.report.exceeded is None
+
+
+def _inflate(compressed: memoryview, decompressor, budget: _DecompressionBudget, name: str) -> bool:
+    """
+    Feeds `compressed` through `decompressor` with bounded output per call and
+    discards the output, so the expanded payload is never held in memory.
+    """
+    chunk_size = settings.DECOMPRESSION_CHUNK_SIZE
+    report = budget.report
+    stream_in = stream_out = 0
+
+    for offset in range(0, len(compressed), chunk_size):
+        data = compressed[offset:offset + chunk_size]
+        stream_in += len(data)
+        report.compressed_bytes += len(data)
+        while True:
+            output = decompressor.decompress(data, chunk_size)
+            stream_out += len(output)
+            report.decompressed_bytes += len(output)
+            if not budget.check(stream_in, stream_out, name):
+                return False
+            if decompressor.eof:
+                break
+            # zlib keeps unread input in unconsumed_tail, bz2 buffers it and clears needs_input
+            data = getattr(decompressor, "unconsumed_tail", b"")
+            if not data and len(output) < chunk_size and getattr(decompressor, "needs_input", True):
+                break
+        if decompressor.eof:
+            break
+    return True
+
+
+def analyze_pdf(file_buffer: FileBuffer) -> DecompressionReport:
+    """Inflates every FlateDecode stream of a PDF within the configured byte, ratio and CPU limits."""
+    report = DecompressionReport()
+    budget = _DecompressionBudget(report)
+    source = file_buffer.name or file_buffer.open()
+
+    with pikepdf.open(source) as pdf:
+        for obj in pdf.objects:
+            if not isinstance(obj, pikepdf.Stream):
+                continue
+            filters = obj.get("/Filter")
+            first_filter = filters[0] if isinstance(filters, pikepdf.Array) and len(filters) else filters
+            if first_filter is None or str(first_filter) not in FLATE_FILTERS:
+                continue
+
+            report.streams += 1
+            raw = memoryview(obj.read_raw_bytes())
+            try:
+                # wbits 47 accepts zlib and gzip headers
+                if not _inflate(raw, zlib.decompressobj(47), budget, f"stream {obj.objgen}"):
+                    break
+            except zlib.error:
+                try:
+                    # Some writers emit raw deflate data without the zlib header
+                    if not _inflate(raw, zlib.decompressobj(-zlib.MAX_WBITS), budget, f"stream {obj.objgen}"):
+                        break
+                except zlib.error:
+                    logger.info(f"Skipping corrupt FlateDecode stream {obj.objgen}")
+    return report
+
+
+def analyze_zip(file_buffer: FileBuffer) -> DecompressionReport:
+    """
+    Inflates every member of a zip container (xlsx and other OOXML files) from its
+    local header. Declared sizes in the central directory are not trusted.
+    """
+    report = DecompressionReport()
+    budget = _DecompressionBudget(report)
+    view = file_buffer.view()
+
+    with zipfile.ZipFile(file_buffer.open()) as archive:
+        members = archive.infolist()
+
+    for info in members:
+        header = view[info.header_offset:info.header_offset + ZIP_LOCAL_HEADER.size]
+        if len(header) < ZIP_LOCAL_HEADER.size:
+            report.exceeded = f"truncated local header for {info.filename}"
+            break
+        signature, *_, name_length, extra_length = ZIP_LOCAL_HEADER.unpack(header)
+        if signature != ZIP_LOCAL_HEADER_SIGNATURE:
+            report.exceeded = f"invalid local header for {info.filename}"
+            break
+
+        data_start = info.header_offset + ZIP_LOCAL_HEADER.size + name_length + extra_length
+        compressed = view[data_start:data_start + info.compress_size]
+        report.streams += 1
+
+        if info.compress_type == zipfile.ZIP_STORED:
+            report.compressed_bytes += len(compressed)
+            report.decompressed_bytes += len(compressed)
+            if not budget.check(len(compressed), len(compressed), info.filename):
+                break
+            continue
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        elif info.compress_type == zipfile.ZIP_BZIP2:
+            decompressor = bz2.BZ2Decompressor()
+        else:
+            report.exceeded = f"unsupported compression method {info.compress_type} for {info.filename}"
+            break
+
+        try:
+            if not _inflate(compressed, decompressor, budget, info.filename):
+                break
+        except (zlib.error, OSError) as e:
+            report.exceeded = f"corrupt member {info.filename}: {e}"
+            break
+    return report
@@ -0,0 +1,201 @@
+import io
+import os
+import mmap
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from config.settings import settings
+
+
+class MemoryViewReader(io.RawIOBase):
+    """Read-only, seekable file object over a memoryview (no copy of the backing buffer)."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._position:self._position + len(buffer)]
+        size = len(chunk)
+        buffer[:size] = chunk
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+class FileBufferWriter(io.RawIOBase):
+    """Write-only file object appending to an unsealed FileBuffer; closing it leaves the buffer open."""
+
+    def __init__(self, file_buffer: "FileBuffer"):
+        self._file_buffer = file_buffer
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        return self._file_buffer.write(data)
+
+    def tell(self) -> int:
+        return len(self._file_buffer)
+
+
+class FileBuffer:
+    """
+    Write-once buffer for a single file's content.
+
+    Small files stay in memory; once the content grows past `spool_size` it is
+    spilled to a temp file which is mmap'ed after `seal()`. Validators read it
+    through `view()` (memoryview), `open()` (file object) or `as_path()` so the
+    payload is never copied between pipeline stages.
+    """
+
+    def __init__(self, spool_size: Optional[int] = None):
+        self.spool_size = spool_size if spool_size is not None else settings.FILE_BUFFER_SPOOL_SIZE
+        self._memory = bytearray()
+        self._file = None
+        self._path = None
+        self._mmap = None
+        self._size = 0
+        self._sealed = False
+        self._closed = False
+
+    @classmethod
+    def from_bytes(cls, data: bytes, spool_size: Optional[int] = None) -> "FileBuffer":
+        buffer = cls(spool_size)
+        buffer.write(data)
+        return buffer.seal()
+
+    def write(self, chunk: bytes) -> int:
+        if self._sealed:
+            raise ValueError("Cannot write to a sealed FileBuffer")
+        if self._file is None and self._size + len(chunk) > self.spool_size:
+            self._spill()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._memory += chunk
+        self._size += len(chunk)
+        return len(chunk)
+
+    def writer(self) -> FileBufferWriter:
+        return FileBufferWriter(self)
+
+    def _spill(self) -> None:
+        fd, self._path = tempfile.mkstemp(prefix="quarantine-", dir=settings.FILE_BUFFER_TEMP_DIR)
+        self._file = os.fdopen(fd, "w+b")
+        self._file.write(self._memory)
+        self._memory = bytearray()
+
+    def seal(self) -> "FileBuffer":
+        """Finish writing; a spilled buffer is mapped read-only into memory."""
+        if self._sealed:
+            return self
+        if self._file is not None:
+            self._file.flush()
+            if self._size:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._sealed = True
+        return self
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def name(self) -> Optional[str]:
+        """Path of the backing temp file, or None while the content lives in memory."""
+        return self._path
+
+    @property
+    def is_spilled(self) -> bool:
+        return self._path is not None
+
+    def view(self) -> memoryview:
+        if not self._sealed:
+            raise ValueError("FileBuffer must be sealed before it can be read")
+        if self._mmap is not None:
+            return memoryview(self._mmap)
+        if self._file is not None:
+            return memoryview(b"")
+        return memoryview(self._memory)
+
+    def find(self, sub: bytes, start: int = 0) -> int:
+        """Searches the content in place (bytearray/mmap `find`), returning -1 if absent."""
+        return self.view().obj.find(sub, start) if self._size else -1
+
+    def head(self, size: int) -> bytes:
+        """Copies at most `size` leading bytes, for APIs that only accept `bytes`."""
+        return bytes(self.view()[:size])
+
+    def open(self) -> io.BufferedReader:
+        return io.BufferedReader(MemoryViewReader(self.view()))
+
+    def iter_chunks(self, chunk_size: int = 1024 * 1024) -> Iterator[memoryview]:
+        view = self.view()
+        for offset in range(0, len(view), chunk_size):
+            yield view[offset:offset + chunk_size]
+
+    @contextmanager
+    def as_path(self) -> Iterator[str]:
+        """Yields a filesystem path for the content, writing a temp file only if not spilled."""
+        if self._path is not None:
+            yield self._path
+            return
+        with tempfile.NamedTemporaryFile(prefix="quarantine-", dir=settings.FILE_BUFFER_TEMP_DIR) as tmp_file:
+            tmp_file.write(self.view())
+            tmp_file.flush()
+            yield tmp_file.name
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A memoryview is still exported; the mapping is released with it.
+                pass
+        if self._file is not None:
+            self._file.close()
+        if self._path is not None and os.path.exists(self._path):
+            os.remove(self._path)
+        self._memory = bytearray()
+
+    def __enter__(self) -> "FileBuffer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,117 @@
+import json
+import time
+import redis
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Tuple
+
+from config.settings import settings
+from config.redis_config import pool, get_redis_pool
+from logs import get_app_logger, get_error_logger
+
+app_logger = get_app_logger()
+error_logger = get_error_logger()
+
+
+@dataclass
+class IndexedFile:
+    hashed_filename: str
+    filename: str
+    size: int # in bytes
+    content_type: str
+    file_type: str
+    collection: Optional[str]
+    released_at: float # unix time
+
+
+def new_index_entry(hashed_filename: str, filename: str, size: int, collection: Optional[str] = None, content_type: Optional[str] = None) -> IndexedFile:
+    """`size` and `content_type` describe the released object, which may be a converted copy of `filename`."""
+    file_type = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    return IndexedFile(
+        hashed_filename=hashed_filename,
+        filename=filename,
+        size=size,
+        content_type=content_type or settings.ALLOWED_MIME_TYPES.get(file_type, "application/octet-stream"),
+        file_type=file_type,
+        collection=collection,
+        released_at=time.time(),
+    )
+
+
+def _order_key(userid: str) -> str:
+    return f"file-index:{userid}"
+
+
+def _entries_key(userid: str) -> str:
+    return f"file-index:{userid}:entries"
+
+
+def index_released_file(userid: str, entry: IndexedFile) -> bool:
+    """
+    Adds a released file to the user's index: a sorted set of hashed
+    filenames scored by release time (ms) plus a hash with the details,
+    written together in one MULTI. Releasing the same content again moves
+    it to the front.
+    """
+    try:
+        pipeline = get_redis_pool(pool).pipeline(transaction=True)
+        pipeline.zadd(_order_key(userid), {entry.hashed_filename: int(entry.released_at * 1000)})
+        pipeline.hset(_entries_key(userid), entry.hashed_filename, json.dumps(asdict(entry)))
+        pipeline.execute()
+        return True
+    except redis.RedisError as e:
+        error_logger.error(f"Failed to index released file '{entry.hashed_filename}' of user '{userid}' => {str(e)}")
+        return False
+
+
+def remove_indexed_file(userid: str, hashed_filename: str) -> bool:
+    """Drops a file from the user's index, e.g. once it was withdrawn."""
+    try:
+        pipeline = get_redis_pool(pool).pipeline(transaction=True)
+        pipeline.zrem(_order_key(userid), hashed_filename)
+        pipeline.hdel(_entries_key(userid), hashed_filename)
+        pipeline.execute()
+        return True
+    except redis.RedisError as e:
+        error_logger.error(f"Failed to remove '{hashed_filename}' of user '{userid}' from the index => {str(e)}")
+        return False
+
+
+def _parse_cursor(cursor: Optional[str]) -> Tuple[str, int]:
+    """`<score>:<skip>`: continue at release time `score`, skipping that many files already returned with exactly that score."""
+    if not cursor:
+        return "+inf", 0
+    try:
+        score, skip = cursor.split(":")
+        return str(int(score)), int(skip)
+    except ValueError:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+
+
+def list_released_files(userid: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[IndexedFile], Optional[str]]:
+    """
+    One page of the user's released files, newest first, and the cursor of
+    the next page (None on the last one). Served from the index only.
+    """
+    limit = max(1, min(limit, settings.FILE_INDEX_MAX_PAGE_SIZE))
+    max_score, skip = _parse_cursor(cursor)
+    redis_client = get_redis_pool(pool)
+
+    # One extra member tells whether another page follows
+    members = redis_client.zrevrangebyscore(_order_key(userid), max_score, "-inf", start=skip, num=limit + 1, withscores=True)
+    has_more = len(members) > limit
+    members = members[:limit]
+    if not members:
+        return [], None
+
+    values = redis_client.hmget(_entries_key(userid), [member for member, _ in members])
+    files = [IndexedFile(**json.loads(value)) for value in values if value is not None]
+
+    next_cursor = None
+    if has_more:
+        last_score = int(members[-1][1])
+        same_score = sum(1 for _, score in members if int(score) == last_score)
+        # Still on the score the page started at: the earlier skip adds up
+        if str(last_score) == max_score:
+            same_score += skip
+        next_cursor = f"{last_score}:{same_score}"
+    return files, next_cursor
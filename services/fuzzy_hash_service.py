@@ -0,0 +1,150 @@
+import json
+import time
+import redis
+from dataclasses import dataclass
+from typing import Optional
+
+from config.settings import settings
+from config.redis_config import pool, get_redis_pool
+from services.file_buffer import FileBuffer
+from logs import get_app_logger, get_error_logger
+
+try:
+    import tlsh
+except ImportError:  # optional dependency, near-duplicate lookups are skipped without it
+    tlsh = None
+
+app_logger = get_app_logger()
+error_logger = get_error_logger()
+
+VERDICT_CLEAN = "clean"
+VERDICT_MALICIOUS = "malicious"
+
+# TLSH adds 12 points of distance per step of L-value (log length) difference
+# beyond the first, so matches within the threshold sit in a narrow L-value band.
+TLSH_LENGTH_DISTANCE_STEP = 12
+TLSH_MIN_INPUT_SIZE = 50
+
+
+@dataclass
+class FuzzyMatch:
+    sha256: str
+    fuzzy_hash: str
+    verdict: str
+    distance: int
+    reason: Optional[str] = None
+
+
+def fuzzy_hash_enabled() -> bool:
+    return settings.FUZZY_HASH_ENABLED and tlsh is not None
+
+
+def _index_key(userid: str, file_type: str) -> str:
+    return f"fuzzy-hash-index:{userid}:{file_type}"
+
+
+def _recency_key(userid: str, file_type: str) -> str:
+    return f"fuzzy-hash-index:{userid}:{file_type}:recorded"
+
+
+def _verdict_key(userid: str, sha256: str) -> str:
+    return f"fuzzy-hash-verdict:{userid}:{sha256}"
+
+
+def compute_fuzzy_hash(file_buffer: FileBuffer) -> Optional[str]:
+    """TLSH digest of the content, or None when TLSH is unavailable or the file is too small/uniform."""
+    if not fuzzy_hash_enabled() or len(file_buffer) < TLSH_MIN_INPUT_SIZE:
+        return None
+    hasher = tlsh.Tlsh()
+    for chunk in file_buffer.iter_chunks():
+        hasher.update(bytes(chunk))
+    try:
+        hasher.final()
+    except ValueError:
+        return None
+    if not hasher.is_valid:
+        return None
+    return hasher.hexdigest()
+
+
+def _lvalue_window(fuzzy_hash: str) -> tuple:
+    hasher = tlsh.Tlsh()
+    hasher.fromTlshStr(fuzzy_hash)
+    width = 1 + settings.FUZZY_HASH_MAX_DISTANCE // TLSH_LENGTH_DISTANCE_STEP
+    return hasher.lvalue - width, hasher.lvalue + width, hasher.lvalue
+
+
+def find_nearest(fuzzy_hash: str, userid: str, file_type: str) -> Optional[FuzzyMatch]:
+    """
+    Nearest file of the same type the user uploaded before, within
+    `FUZZY_HASH_MAX_DISTANCE`. Verdicts are per user, so one tenant's
+    files never vouch for (or poison) another tenant's.
+
+    The index is a sorted set scored by TLSH L-value, so a single range query
+    returns the only candidates that can be within the distance threshold.
+    It holds at most `FUZZY_HASH_MAX_INDEX_SIZE` entries, so the whole band
+    is always compared.
+    """
+    if not fuzzy_hash or not fuzzy_hash_enabled():
+        return None
+    try:
+        redis_client = get_redis_pool(pool)
+        low, high, _ = _lvalue_window(fuzzy_hash)
+        candidates = [
+            member.decode("utf-8").split(":", 1)
+            for member in redis_client.zrangebyscore(_index_key(userid, file_type), low, high)
+        ]
+        if not candidates:
+            return None
+
+        verdicts = redis_client.mget([_verdict_key(userid, sha256) for _, sha256 in candidates])
+        expired = [f"{candidate_hash}:{sha256}" for (candidate_hash, sha256), verdict in zip(candidates, verdicts) if verdict is None]
+        if expired:
+            # Drop the entries whose verdict expired
+            with redis_client.pipeline() as pipe:
+                pipe.zrem(_index_key(userid, file_type), *expired)
+                pipe.zrem(_recency_key(userid, file_type), *expired)
+                pipe.execute()
+
+        best, best_distance = None, None
+        for (candidate_hash, sha256), verdict in zip(candidates, verdicts):
+            if verdict is None:
+                continue
+            distance = tlsh.diff(fuzzy_hash, candidate_hash)
+            if distance <= settings.FUZZY_HASH_MAX_DISTANCE and (best_distance is None or distance < best_distance):
+                best, best_distance = (candidate_hash, sha256, json.loads(verdict.decode("utf-8"))), distance
+
+        if best is None:
+            return None
+        candidate_hash, sha256, verdict = best
+        return FuzzyMatch(sha256, candidate_hash, verdict["verdict"], best_distance, verdict.get("reason"))
+    except redis.RedisError as e:
+        error_logger.error(f"Failed to look up fuzzy hash for user '{userid}' in Redis => {str(e)}")
+        return None
+
+
+def record_verdict(fuzzy_hash: str, userid: str, file_type: str, sha256: str, verdict: str, reason: Optional[str] = None) -> bool:
+    if not fuzzy_hash or not fuzzy_hash_enabled():
+        return False
+    try:
+        redis_client = get_redis_pool(pool)
+        _, _, lvalue = _lvalue_window(fuzzy_hash)
+        member = f"{fuzzy_hash}:{sha256}"
+        payload = json.dumps({"verdict": verdict, "reason": reason, "recorded_at": int(time.time())})
+        with redis_client.pipeline() as pipe:
+            pipe.set(_verdict_key(userid, sha256), payload, ex=settings.FUZZY_HASH_VERDICT_TTL)
+            pipe.zadd(_index_key(userid, file_type), {member: lvalue})
+            pipe.zadd(_recency_key(userid, file_type), {member: time.time()})
+            # Cap the index, evicting the oldest entries
+            pipe.zrange(_recency_key(userid, file_type), 0, -(settings.FUZZY_HASH_MAX_INDEX_SIZE + 1))
+            evicted = pipe.execute()[-1]
+        if evicted:
+            with redis_client.pipeline() as pipe:
+                pipe.zrem(_index_key(userid, file_type), *evicted)
+                pipe.zrem(_recency_key(userid, file_type), *evicted)
+                pipe.execute()
+        app_logger.info(f"Recorded '{verdict}' verdict for {sha256} in fuzzy hash index '{userid}:{file_type}'")
+        return True
+    except redis.RedisError as e:
+        error_logger.error(f"Failed to record fuzzy hash verdict for {sha256} => {str(e)}")
+        return False
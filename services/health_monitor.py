@@ -0,0 +1,138 @@
+import time
+import asyncio
+import aiohttp
+import redis
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Dict, Optional
+
+from config.settings import settings
+from config.minio_config import minio_client
+from services.metrics import registry
+from services.minio_service import buckets_ready
+from logs import get_app_logger, get_error_logger
+
+app_logger = get_app_logger()
+error_logger = get_error_logger()
+
+dependency_up = registry.gauge("files_backend_dependency_up", "1 if the last probe of the dependency succeeded")
+dependency_latency = registry.gauge("files_backend_dependency_latency_seconds", "Duration of the last probe of the dependency")
+
+
+@dataclass
+class DependencyHealth:
+    healthy: Optional[bool] = None # None until the first probe finished
+    latency_ms: Optional[float] = None
+    checked_at: Optional[float] = None # unix time
+    error: Optional[str] = None
+
+
+def _probe_minio() -> None:
+    minio_client.bucket_exists(settings.MINIO_QUARANTINE_BUCKET.lower().replace("_", "-"))
+
+
+# Own client with socket timeouts, a hung probe must not keep its thread forever
+_redis_probe_client = redis.Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    socket_timeout=settings.HEALTH_CHECK_TIMEOUT,
+    socket_connect_timeout=settings.HEALTH_CHECK_TIMEOUT,
+)
+
+
+def _probe_redis() -> None:
+    _redis_probe_client.ping()
+
+
+async def _probe_virustotal() -> None:
+    # Unauthenticated, any HTTP answer proves reachability without spending API quota
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=settings.HEALTH_CHECK_TIMEOUT)) as session:
+        async with session.get(settings.VIRUSTOTAL_HEALTH_URL):
+            pass
+
+
+class HealthMonitor:
+    """
+    Probes the dependencies in the background and caches the results, so
+    health endpoints answer from memory no matter how slow a dependency is.
+    Only HEALTH_REQUIRED_DEPENDENCIES decide readiness, the others are
+    reported as degraded.
+    """
+
+    def __init__(self, probes: Dict[str, Callable[[], Awaitable[None]]]):
+        self.probes = probes
+        self.results = {name: DependencyHealth() for name in probes}
+        self.last_round_at: Optional[float] = None # monotonic
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def _probe(self, name: str) -> None:
+        started_at = time.perf_counter()
+        probe = self._in_flight.get(name)
+        try:
+            # A timed out probe keeps running in its thread; it is awaited again instead of stacking up new ones
+            if probe is None or probe.done():
+                probe = self._in_flight[name] = asyncio.ensure_future(self.probes[name]())
+            await asyncio.wait_for(asyncio.shield(probe), settings.HEALTH_CHECK_TIMEOUT)
+            healthy, error = True, None
+        except asyncio.TimeoutError:
+            healthy, error = False, f"Timed out after {settings.HEALTH_CHECK_TIMEOUT}s"
+        except Exception as e:
+            healthy, error = False, str(e) or type(e).__name__
+        latency = time.perf_counter() - started_at
+
+        if healthy is False and self.results[name].healthy is not False:
+            error_logger.error(f"Dependency {name} became unhealthy => {error}")
+        elif healthy and self.results[name].healthy is False:
+            app_logger.info(f"Dependency {name} recovered")
+        self.results[name] = DependencyHealth(healthy, round(latency * 1000, 2), time.time(), error)
+        dependency_up.set(1 if healthy else 0, dependency=name)
+        dependency_latency.set(latency, dependency=name)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.gather(*(self._probe(name) for name in self.probes))
+            self.last_round_at = time.monotonic()
+            await asyncio.sleep(settings.HEALTH_CHECK_INTERVAL)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for probe in self._in_flight.values():
+            probe.cancel()
+
+    @property
+    def alive(self) -> bool:
+        """False once the probe loop died or stopped making progress."""
+        if self._task is None or self._task.done():
+            return False
+        if self.last_round_at is None:
+            return True
+        stalled_after = settings.HEALTH_CHECK_INTERVAL + 3 * settings.HEALTH_CHECK_TIMEOUT
+        return time.monotonic() - self.last_round_at < stalled_after
+
+    @property
+    def ready(self) -> bool:
+        return buckets_ready.is_set() and all(
+            self.results[name].healthy for name in settings.HEALTH_REQUIRED_DEPENDENCIES if name in self.results
+        )
+
+    def snapshot(self) -> dict:
+        degraded = any(health.healthy is False for health in self.results.values())
+        return {
+            "status": "unhealthy" if not self.ready else "degraded" if degraded else "healthy",
+            "buckets_ready": buckets_ready.is_set(),
+            "dependencies": {name: asdict(health) for name, health in self.results.items()},
+        }
+
+
+health_monitor = HealthMonitor({
+    "minio": lambda: asyncio.to_thread(_probe_minio),
+    "redis": lambda: asyncio.to_thread(_probe_redis),
+    "virustotal": _probe_virustotal,
+})
@@ -0,0 +1,63 @@
+import os
+from typing import TYPE_CHECKING, Dict
+
+from config.settings import settings
+from services.file_buffer import FileBuffer
+
+if TYPE_CHECKING:
+    # Naming helpers are used by routers at startup, Pillow is only loaded by the image check
+    from PIL import Image
+
+DERIVATIVE_CONTENT_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+DERIVATIVE_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+
+def derivative_format() -> str:
+    return settings.IMAGE_DERIVATIVE_FORMAT.upper()
+
+
+def derivative_object_name(hashed_filename: str, size_name: str) -> str:
+    """Derivatives live next to the original, e.g. `<sha256>_thumbnail.webp`."""
+    stem = os.path.splitext(hashed_filename)[0]
+    return f"{stem}_{size_name}.{DERIVATIVE_EXTENSIONS[derivative_format()]}"
+
+
+def _encode(img: "Image.Image") -> FileBuffer:
+    image_format = derivative_format()
+    if image_format == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    elif image_format == "WEBP" and img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if img.has_transparency_data else "RGB")
+
+    file_buffer = FileBuffer()
+    try:
+        img.save(file_buffer.writer(), image_format, quality=settings.IMAGE_DERIVATIVE_QUALITY)
+    except BaseException:
+        file_buffer.close()
+        raise
+    return file_buffer.seal()
+
+
+def build_derivatives(img: "Image.Image") -> Dict[str, FileBuffer]:
+    """
+    Renders every configured size from an opened, not yet loaded image,
+    largest first. `thumbnail` lets JPEGs decode at a reduced DCT scale
+    (draft) and reduces other formats by whole factors before resampling;
+    each smaller size is then derived from the previous one. Never upscales.
+    """
+    from PIL import ImageOps
+
+    sizes = sorted(settings.IMAGE_DERIVATIVE_SIZES.items(), key=lambda item: item[1], reverse=True)
+    derivatives: Dict[str, FileBuffer] = {}
+    try:
+        for index, (size_name, max_side) in enumerate(sizes):
+            img.thumbnail((max_side, max_side), reducing_gap=settings.IMAGE_DERIVATIVE_REDUCING_GAP)
+            if index == 0:
+                # Derivatives carry no EXIF, so the orientation is applied to the pixels
+                img = ImageOps.exif_transpose(img)
+            derivatives[size_name] = _encode(img)
+    except BaseException:
+        for file_buffer in derivatives.values():
+            file_buffer.close()
+        raise
+    return derivatives
@@ -1,14 +1,17 @@
 from models.image_quarantine_check import ImageQuarantineCheck
-from typing import List, Iterator, Optional
+from typing import Dict, List, Iterator, Optional
 from dataclasses import dataclass
-from io import BytesIO
 from PIL import Image
 
 from exceptions import ImageFileCheckException
 from services.quarantine_file_check_service import QuarantineFileCheckService
+from services.file_buffer import FileBuffer
+from services.deadline import remaining_timeout
+from services.image_derivatives import build_derivatives, derivative_object_name, derivative_format, DERIVATIVE_CONTENT_TYPES
 from config.settings import settings
-from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from contextlib import contextmanager
+import io
 import logging
 
 logger = logging.getLogger(__name__)
@@ -35,6 +38,7 @@ class ImageQuarantineCheckService(ImageQuarantineCheck, QuarantineFileCheckServi
         
         super().__init__(query, urls, filenames, userid, timeout)
         self.max_workers = max_workers
+        self._derivative_buffers: Dict[str, Dict[str, FileBuffer]] = {}
 
         
     def _validate_image_dimensions(self, width: int, height: int):
@@ -72,16 +76,32 @@ class ImageQuarantineCheckService(ImageQuarantineCheck, QuarantineFileCheckServi
         except Exception as e:
             raise ImageFileCheckException(f"Image file check failed", e)
         
-    def run_image_check_pipeline(self, file_content: bytes, filename: str):
-        file_size = len(file_content)
+    def verify_stream_header(self, head: bytes, filename: str) -> bool:
+        """Rejects oversized images from their header, before the rest of the upload arrives."""
+        super().verify_stream_header(head, filename)
+        try:
+            with Image.open(io.BytesIO(head)) as img:
+                width, height = img.size
+        except Exception:
+            # Dimensions are not within the first bytes, the full check decides
+            return True
+        self._validate_image_dimensions(width, height)
+        self._validate_megapixel_limit(width, height)
+        return True
+
+    def run_image_check_pipeline(self, file_buffer: FileBuffer, filename: str):
+        file_size = len(file_buffer)
         file_size_mb = round(file_size / (1024 * 1024), 2)
         logger.info(f"Checking image {filename} for pixel flooding attack...")
         try:        
-            with Image.open(BytesIO(file_content)) as img:
+            with Image.open(file_buffer.open()) as img:
                 width, height = img.size
                 self._validate_image_dimensions(width, height)
                 self._validate_megapixel_limit(width, height)
                 self._validate_file_density(width, height, file_size)
+                if settings.IMAGE_DERIVATIVES_ENABLED:
+                    # Still only the header has been parsed, thumbnail() can decode at reduced scale
+                    self._derivative_buffers[filename] = build_derivatives(img)
             
             logger.info(
                 f"Image validation passed for {filename}: "
@@ -110,7 +130,8 @@ class ImageQuarantineCheckService(ImageQuarantineCheck, QuarantineFileCheckServi
         try:
             yield executor
         finally:
-            executor.shutdown(wait=True)  # Graceful shutdown with timeout  
+            # Files not yet started are dropped when a check fails or the pipeline is cancelled
+            executor.shutdown(wait=False, cancel_futures=True)
         
     def scan_multiple_files(self):
         """
@@ -123,12 +144,12 @@ class ImageQuarantineCheckService(ImageQuarantineCheck, QuarantineFileCheckServi
             List of ImageCheckResult objects
         """
         
-        if not self._file_contents:
+        if not self._file_buffers:
             logger.warning(f"No file contents to process for user {self.userid}")
             raise ImageFileCheckException(f"No file contents to process for user {self.userid}")
         
         logger.info(
-            f"Starting pixel flooding check for {len(self._file_contents)} files "
+            f"Starting pixel flooding check for {len(self._file_buffers)} files "
             f"for user {self.userid}"
         )
         
@@ -137,16 +158,16 @@ class ImageQuarantineCheckService(ImageQuarantineCheck, QuarantineFileCheckServi
         with self._managed_thread_pool() as executor:
             future_to_filename = {}
             
-            for content, filename, seen in zip(self._file_contents, self.filenames, self._seen_status):
+            for file_buffer, filename, seen in zip(self._file_buffers, self.filenames, self._seen_status):
                 if not seen:
-                    future = executor.submit(self.run_image_check_pipeline, content, filename)
+                    future = self._track(executor.submit(self.run_image_check_pipeline, file_buffer, filename))
                     future_to_filename[future] = filename
                     
-            for future in as_completed(future_to_filename, timeout= self.timeout):
+            for future in self._as_completed(future_to_filename, timeout= self.timeout):
                 filename = future_to_filename[future]
                 
                 try:
-                    result = future.result(timeout=10)
+                    result = future.result(timeout=remaining_timeout(10))
                     results.append(result)
                 
                 except TimeoutError:
@@ -169,6 +190,23 @@ class ImageQuarantineCheckService(ImageQuarantineCheck, QuarantineFileCheckServi
         return results
         
 
+    def move_file_from_quarantine(self, filename: str, hashed_filename: str) -> str:
+        """Releases the original, then uploads its derivatives next to it."""
+        url = super().move_file_from_quarantine(filename, hashed_filename)
+        content_type = DERIVATIVE_CONTENT_TYPES[derivative_format()]
+        self._derivative_urls[hashed_filename] = {
+            size_name: self._put_object_from_buffer(derivative_object_name(hashed_filename, size_name), derivative_buffer, content_type)
+            for size_name, derivative_buffer in self._derivative_buffers.get(filename, {}).items()
+        }
+        return url
+
+    def release_file_buffers(self) -> None:
+        super().release_file_buffers()
+        for derivative_buffers in self._derivative_buffers.values():
+            for derivative_buffer in derivative_buffers.values():
+                derivative_buffer.close()
+        self._derivative_buffers = {}
+
     def get_validation_summary(self, results: List[ImageCheckResult]) -> dict:
         """Get summary statistics from validation results."""
         if not results:
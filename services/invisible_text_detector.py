@@ -0,0 +1,153 @@
+import time
+import fitz
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Optional, Sequence, Tuple
+
+from config.settings import settings
+from services.file_buffer import FileBuffer
+from services.process_pool import submit
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+WHITE = (1.0, 1.0, 1.0)
+INVISIBLE_RENDER_MODE = 3
+
+
+def _to_rgb(color: Sequence[float]) -> Tuple[float, float, float]:
+    if not color:
+        return WHITE
+    if len(color) == 1:
+        return (color[0], color[0], color[0])
+    if len(color) == 4:
+        c, m, y, k = color
+        return ((1 - c) * (1 - k), (1 - m) * (1 - k), (1 - y) * (1 - k))
+    return tuple(color[:3])
+
+
+def _contains(outer: Sequence[float], inner: Sequence[float]) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+def _intersects(a: Sequence[float], b: Sequence[float]) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class _PageBackground:
+    """Lazily collects what is painted behind text; only pages with suspicious spans pay for it."""
+
+    def __init__(self, page: fitz.Page):
+        self.page = page
+        self._fills = None
+        self._image_rects = None
+
+    def color_behind(self, bbox: Sequence[float], seqno: int) -> Tuple[float, float, float]:
+        if self._fills is None:
+            self._fills = [
+                (drawing["seqno"], drawing["rect"], _to_rgb(drawing["fill"]))
+                for drawing in self.page.get_cdrawings()
+                if drawing.get("fill") is not None and "f" in drawing.get("type", "") and drawing.get("fill_opacity", 1) > 0
+            ]
+        background = WHITE
+        for fill_seqno, rect, fill in self._fills:
+            if fill_seqno < seqno and _contains(rect, bbox):
+                background = fill
+        return background
+
+    def overlaps_image(self, bbox: Sequence[float]) -> bool:
+        if self._image_rects is None:
+            self._image_rects = [image["bbox"] for image in self.page.get_image_info()]
+        return any(_intersects(rect, bbox) for rect in self._image_rects)
+
+
+def _invisible_reason(span: dict, background: _PageBackground) -> Optional[str]:
+    if span.get("type") == INVISIBLE_RENDER_MODE:
+        # The text layer OCR puts over a scanned page image is invisible by design
+        if background.overlaps_image(span["bbox"]):
+            return None
+        return "invisible render mode"
+    if span.get("opacity", 1) <= 0:
+        return "fully transparent text"
+    if span.get("size", 0) < settings.PDF_INVISIBLE_TEXT_MIN_FONT_SIZE:
+        return f"font size {span.get('size', 0):.2f}"
+
+    text_color = _to_rgb(span.get("color") or (0.0,))
+    bbox = span["bbox"]
+    background_color = background.color_behind(bbox, span.get("seqno", 0))
+    if max(abs(a - b) for a, b in zip(text_color, background_color)) <= settings.PDF_INVISIBLE_TEXT_COLOR_TOLERANCE:
+        # Images are not tracked as fills, text over them cannot be judged by colour
+        if not background.overlaps_image(bbox):
+            return f"text colour {text_color} matches background"
+    return None
+
+
+def scan_page_range(source, first_page: int, last_page: int, deadline: float) -> Tuple[Optional[str], int]:
+    """
+    Worker entry point: returns the first invisible-text finding in the page range
+    and the number of pages scanned. `source` is a path or the PDF bytes.
+    """
+    document = fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")
+    pages_scanned = 0
+    with document:
+        for page_number in range(first_page, min(last_page, document.page_count)):
+            if time.time() > deadline:
+                break
+            page = document[page_number]
+            # texttrace skips layout analysis, much cheaper than get_text("dict")
+            spans = page.get_texttrace()
+            pages_scanned += 1
+            if not spans:
+                continue
+            background = _PageBackground(page)
+            for span in spans:
+                if not span.get("chars"):
+                    continue
+                reason = _invisible_reason(span, background)
+                if reason:
+                    return f"page {page_number + 1}: {reason}", pages_scanned
+    return None, pages_scanned
+
+
+def find_invisible_text(file_buffer: FileBuffer) -> Optional[str]:
+    """
+    Shards pages across the process pool and returns on the first finding,
+    cancelling shards that have not started. Scanning stops at the page or
+    time budget.
+    """
+    source = file_buffer.name if file_buffer.is_spilled else file_buffer.view().tobytes()
+    with (fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")) as document:
+        total_pages = document.page_count
+    page_count = min(total_pages, settings.PDF_INVISIBLE_TEXT_MAX_PAGES)
+    deadline = time.time() + settings.PDF_INVISIBLE_TEXT_TIMEOUT
+    batch_size = settings.PDF_INVISIBLE_TEXT_PAGE_BATCH_SIZE
+    shards = [(first_page, first_page + batch_size) for first_page in range(0, page_count, batch_size)]
+    pages_scanned = 0
+
+    if page_count < settings.PDF_INVISIBLE_TEXT_PARALLEL_MIN_PAGES:
+        for first_page, last_page in shards:
+            reason, scanned = scan_page_range(source, first_page, last_page, deadline)
+            pages_scanned += scanned
+            if reason:
+                return reason
+    else:
+        pending = {submit(scan_page_range, source, first_page, last_page, deadline) for first_page, last_page in shards}
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=max(deadline - time.time(), 0) + 1, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    reason, scanned = future.result()
+                    pages_scanned += scanned
+                    if reason:
+                        return reason
+        finally:
+            for future in pending:
+                future.cancel()
+
+    if pages_scanned < total_pages:
+        logger.warning(f"Invisible text check covered {pages_scanned}/{total_pages} pages within its budget")
+        if settings.PDF_INVISIBLE_TEXT_REJECT_ON_BUDGET:
+            return f"only {pages_scanned}/{total_pages} pages could be checked within the budget"
+    return None
@@ -0,0 +1,102 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from config.settings import settings
+from exceptions import AdmissionControlException
+from services.metrics import registry
+from logs import get_app_logger
+
+app_logger = get_app_logger()
+
+
+class MemoryBudget:
+    """
+    Process-wide budget of bytes that in-flight checks may hold.
+
+    Checks reserve their expected footprint before downloading. When the budget
+    is exhausted, callers queue for at most `max_wait` seconds ahead of new
+    arrivals and are rejected with an `AdmissionControlException` once the wait or the
+    queue length is exceeded.
+    """
+
+    def __init__(self, capacity: int, max_wait: float, max_queue: int, retry_after: int):
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.reserved = 0
+        self._waiters = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+        registry.gauge("files_backend_memory_budget_capacity_bytes", "Configured in-flight byte budget", lambda: self.capacity)
+        registry.gauge("files_backend_memory_budget_reserved_bytes", "Bytes currently reserved by in-flight checks", lambda: self.reserved)
+        registry.gauge("files_backend_memory_budget_waiting", "Checks queued for a memory reservation", lambda: self._waiters)
+
+    def _get_condition(self) -> asyncio.Condition:
+        # Created lazily so it binds to the running event loop, not the import-time one
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _reject(self, nbytes: int, reason: str) -> AdmissionControlException:
+        app_logger.warning(f"Memory budget rejected reservation of {nbytes} bytes: {reason}")
+        return AdmissionControlException(
+            f"Server is at capacity ({reason}), retry after {self.retry_after}s",
+            retry_after=self.retry_after,
+        )
+
+    async def acquire(self, nbytes: int) -> int:
+        # A single file larger than the whole budget still runs, just alone
+        nbytes = min(nbytes, self.capacity)
+        condition = self._get_condition()
+        async with condition:
+            if self._waiters == 0 and self.reserved + nbytes <= self.capacity:
+                self.reserved += nbytes
+                return nbytes
+
+            if self.max_wait <= 0 or self._waiters >= self.max_queue:
+                raise self._reject(nbytes, "queue full" if self.max_wait > 0 else "budget exhausted")
+
+            self._waiters += 1
+            try:
+                await asyncio.wait_for(
+                    condition.wait_for(lambda: self.reserved + nbytes <= self.capacity),
+                    timeout=self.max_wait,
+                )
+            except asyncio.TimeoutError:
+                raise self._reject(nbytes, f"waited {self.max_wait}s")
+            finally:
+                self._waiters -= 1
+
+            self.reserved += nbytes
+            return nbytes
+
+    async def release(self, nbytes: int) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.reserved -= nbytes
+            condition.notify_all()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int) -> AsyncIterator[int]:
+        reserved = await self.acquire(nbytes)
+        try:
+            yield reserved
+        finally:
+            await self.release(reserved)
+
+
+def estimate_reservation(file_size: Optional[int]) -> int:
+    """Bytes to reserve for a file, capped at the maximum file size we will download."""
+    max_file_bytes = settings.MAX_FILE_SIZE * 1024 * 1024
+    raw_bytes = min(file_size, max_file_bytes) if file_size else max_file_bytes
+    return int(raw_bytes * settings.MEMORY_BUDGET_OVERHEAD_FACTOR)
+
+
+memory_budget = MemoryBudget(
+    capacity=settings.MEMORY_BUDGET_MB * 1024 * 1024,
+    max_wait=settings.MEMORY_BUDGET_MAX_WAIT,
+    max_queue=settings.MEMORY_BUDGET_MAX_QUEUE,
+    retry_after=settings.MEMORY_BUDGET_RETRY_AFTER,
+)
@@ -0,0 +1,198 @@
+import os
+import struct
+import pikepdf
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from config.settings import settings
+from services.file_buffer import FileBuffer
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+JPEG_SOI = b"\xff\xd8"
+JPEG_SOS = 0xDA
+JPEG_EOI = 0xD9
+# Markers that stand alone, without a length field
+JPEG_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+JPEG_COM = 0xFE
+JPEG_APP0, JPEG_APP1, JPEG_APP2, JPEG_APP14 = 0xE0, 0xE1, 0xE2, 0xEE
+JPEG_APPN = range(0xE0, 0xF0)
+EXIF_HEADER = b"Exif\x00\x00"
+EXIF_ORIENTATION_TAG = 0x0112
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_METADATA_CHUNKS = {b"tEXt", b"iTXt", b"zTXt", b"eXIf", b"tIME"}
+
+
+@dataclass
+class SanitizeResult:
+    filename: str
+    removed: List[str] = field(default_factory=list)
+    file_buffer: Optional[FileBuffer] = None
+
+
+def _keep_jpeg_segment(marker: int, payload: memoryview) -> bool:
+    """JFIF, ICC profiles and the Adobe colour transform affect rendering, every other APPn and COM is metadata."""
+    if marker == JPEG_APP0:
+        return True
+    if marker == JPEG_APP2:
+        return bytes(payload[:12]) == b"ICC_PROFILE\x00"
+    if marker == JPEG_APP14:
+        return bytes(payload[:5]) == b"Adobe"
+    return marker not in JPEG_APPN and marker != JPEG_COM
+
+
+def _exif_orientation(payload: memoryview) -> Optional[int]:
+    if bytes(payload[:6]) != EXIF_HEADER:
+        return None
+    tiff = payload[6:]
+    try:
+        byte_order = {b"II": "<", b"MM": ">"}[bytes(tiff[:2])]
+        (ifd_offset,) = struct.unpack_from(f"{byte_order}I", tiff, 4)
+        (entries,) = struct.unpack_from(f"{byte_order}H", tiff, ifd_offset)
+        for index in range(entries):
+            tag, _, _, value = struct.unpack_from(f"{byte_order}HHIH", tiff, ifd_offset + 2 + index * 12)
+            if tag == EXIF_ORIENTATION_TAG:
+                return value
+    except (KeyError, struct.error):
+        pass
+    return None
+
+
+def _orientation_segment(orientation: int) -> bytes:
+    """Minimal APP1 holding only the orientation tag, so stripping EXIF does not rotate the image."""
+    ifd = struct.pack(">H", 1) + struct.pack(">HHIHH", EXIF_ORIENTATION_TAG, 3, 1, orientation, 0) + struct.pack(">I", 0)
+    payload = EXIF_HEADER + b"MM\x00\x2a" + struct.pack(">I", 8) + ifd
+    return struct.pack(">BBH", 0xFF, JPEG_APP1, len(payload) + 2) + payload
+
+
+def sanitize_jpeg(view: memoryview, output: FileBuffer) -> List[str]:
+    """
+    Copies the segments before the first scan, skipping metadata, then the
+    entropy-coded data verbatim. Pixels are never decoded.
+    """
+    if bytes(view[:2]) != JPEG_SOI:
+        raise ValueError("Not a JPEG file")
+    removed = []
+    output.write(JPEG_SOI)
+    position = 2
+
+    while position < len(view):
+        if view[position] != 0xFF or position + 1 == len(view):
+            raise ValueError(f"Invalid JPEG marker at offset {position}")
+        marker = view[position + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            position += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            output.write(view[position:position + 2])
+            position += 2
+            continue
+        if marker in (JPEG_SOS, JPEG_EOI):
+            break
+
+        if position + 4 > len(view):
+            raise ValueError(f"Truncated JPEG segment at offset {position}")
+        (length,) = struct.unpack_from(">H", view, position + 2)
+        segment_end = position + 2 + length
+        if length < 2 or segment_end > len(view):
+            raise ValueError(f"Invalid JPEG segment length {length} at offset {position}")
+        payload = view[position + 4:segment_end]
+        if _keep_jpeg_segment(marker, payload):
+            output.write(view[position:segment_end])
+        else:
+            removed.append(f"APP{marker - JPEG_APP0}" if marker in JPEG_APPN else "COM")
+            orientation = _exif_orientation(payload) if marker == JPEG_APP1 else None
+            if orientation in range(2, 9):
+                output.write(_orientation_segment(orientation))
+        position = segment_end
+
+    output.write(view[position:])
+    return removed
+
+
+def sanitize_png(view: memoryview, output: FileBuffer) -> List[str]:
+    """Copies every chunk except the textual and EXIF ones; IDAT data is copied as-is."""
+    if bytes(view[:8]) != PNG_SIGNATURE:
+        raise ValueError("Not a PNG file")
+    removed = []
+    output.write(view[:8])
+    position = 8
+
+    while position + 8 <= len(view):
+        (length,) = struct.unpack_from(">I", view, position)
+        chunk_type = bytes(view[position + 4:position + 8])
+        chunk_end = position + 12 + length
+        if chunk_end > len(view):
+            raise ValueError(f"Truncated PNG chunk {chunk_type!r} at offset {position}")
+        if chunk_type in PNG_METADATA_CHUNKS:
+            removed.append(chunk_type.decode("latin-1"))
+        else:
+            output.write(view[position:chunk_end])
+        position = chunk_end
+        if chunk_type == b"IEND":
+            break
+    return removed
+
+
+def sanitize_pdf(file_buffer: FileBuffer, output: FileBuffer) -> List[str]:
+    """
+    Drops the document Info dictionary and the XMP stream. The file is fully
+    rewritten with streams passed through undecoded: an incremental update
+    would leave the original metadata recoverable in the earlier revision.
+    """
+    removed = []
+    with pikepdf.open(file_buffer.name or file_buffer.open()) as pdf:
+        acro_form = pdf.Root.get("/AcroForm")
+        if acro_form is not None and int(acro_form.get("/SigFlags", 0)) & 1:
+            # Rewriting a signed PDF invalidates its signatures
+            logger.info("Skipping metadata sanitization of a digitally signed PDF")
+            return removed
+        if "/Info" in pdf.trailer:
+            del pdf.trailer.Info
+            removed.append("Info")
+        if "/Metadata" in pdf.Root:
+            del pdf.Root.Metadata
+            removed.append("XMP")
+        if removed:
+            pdf.save(
+                output.writer(),
+                stream_decode_level=pikepdf.StreamDecodeLevel.none,
+                compress_streams=False,
+                object_stream_mode=pikepdf.ObjectStreamMode.preserve,
+                fix_metadata_version=False,
+            )
+    return removed
+
+
+def sanitize_metadata(file_buffer: FileBuffer, filename: str) -> SanitizeResult:
+    """
+    Strips metadata from JPEG, PNG and PDF files without re-encoding. The
+    sanitized content is returned in `file_buffer` only when something was removed.
+    """
+    file_extension = os.path.splitext(filename)[-1].lower().lstrip('.')
+    result = SanitizeResult(filename)
+    if file_extension in ("jpg", "jpeg"):
+        sanitizer = lambda output: sanitize_jpeg(file_buffer.view(), output)
+    elif file_extension == "png":
+        sanitizer = lambda output: sanitize_png(file_buffer.view(), output)
+    elif file_extension in settings.PDF_EXTENSIONS:
+        sanitizer = lambda output: sanitize_pdf(file_buffer, output)
+    else:
+        return result
+
+    output = FileBuffer()
+    try:
+        result.removed = sanitizer(output)
+    except BaseException:
+        output.close()
+        raise
+    if result.removed:
+        result.file_buffer = output.seal()
+        logger.info(f"Removed metadata from {filename}: {result.removed}")
+    else:
+        output.close()
+    return result
@@ -0,0 +1,59 @@
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+
+class Gauge:
+    """Point-in-time value, optionally split by labels, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, callback: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> Dict[Tuple[Tuple[str, str], ...], float]:
+        if self.callback is not None:
+            return {(): self.callback()}
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in self.samples().items():
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+            lines.append(f"{self.name}{{{label_text}}} {value}" if label_text else f"{self.name} {value}")
+        return "\n".join(lines)
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._gauges: Dict[str, Gauge] = {}
+        self._lock = threading.Lock()
+
+    def gauge(self, name: str, documentation: str, callback: Optional[Callable[[], float]] = None) -> Gauge:
+        with self._lock:
+            if name not in self._gauges:
+                self._gauges[name] = Gauge(name, documentation, callback)
+            return self._gauges[name]
+
+    def render(self) -> str:
+        with self._lock:
+            gauges = list(self._gauges.values())
+        return "\n".join(gauge.render() for gauge in gauges) + "\n"
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,90 @@
+import queue
+import magic
+from typing import Optional, Tuple
+
+from config.settings import settings
+from services.file_buffer import FileBuffer
+from services.decompression_analyzer import ZIP_LOCAL_HEADER, ZIP_LOCAL_HEADER_SIGNATURE
+from services.metrics import registry
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Prefixes libmagic would match at offset 0 anyway; only types the service accepts are kept
+SIGNATURES: Tuple[Tuple[bytes, str], ...] = tuple(
+    (prefix, mime) for prefix, mime in (
+        (b"\xff\xd8\xff", "image/jpeg"),
+        (b"\x89PNG\r\n\x1a\n", "image/png"),
+        (b"%PDF-", "application/pdf"),
+    )
+    if mime in settings.ALLOWED_MIME_TYPES.values()
+)
+# Members Office, LibreOffice and openpyxl write first
+OOXML_FIRST_MEMBERS = ("[Content_Types].xml", "_rels/.rels", "docProps/", "customXml/")
+OOXML_MAX_MEMBERS = 32 # local headers walked looking for the xl/ part
+
+mime_detections = registry.gauge("files_backend_mime_detections", "MIME detections by method (signature or libmagic)")
+
+# python-magic serializes calls on one handle behind a lock; idle handles are kept here instead
+_handles: "queue.SimpleQueue[magic.Magic]" = queue.SimpleQueue()
+
+
+def _is_xlsx(head: memoryview) -> Optional[bool]:
+    """
+    Walks the leading zip local headers. True once an `xl/` member follows an
+    OOXML manifest, None when the headers do not settle it (streamed members
+    without sizes, too many members) and libmagic has to decide.
+    """
+    offset = 0
+    for index in range(OOXML_MAX_MEMBERS):
+        header = head[offset:offset + ZIP_LOCAL_HEADER.size]
+        if len(header) < ZIP_LOCAL_HEADER.size:
+            return None
+        signature, _, flags, _, _, _, _, compressed_size, _, name_length, extra_length = ZIP_LOCAL_HEADER.unpack(header)
+        if signature != ZIP_LOCAL_HEADER_SIGNATURE:
+            return None
+        name_start = offset + ZIP_LOCAL_HEADER.size
+        name = bytes(head[name_start:name_start + name_length]).decode("utf-8", "replace")
+        if index == 0 and not name.startswith(OOXML_FIRST_MEMBERS):
+            return None
+        if name.startswith("xl/"):
+            return True
+        # Bit 3: sizes follow the data, the next header cannot be located
+        if flags & 0x08:
+            return None
+        offset = name_start + name_length + extra_length + compressed_size
+    return None
+
+
+def match_signature(head: memoryview) -> Optional[str]:
+    for prefix, mime in SIGNATURES:
+        if head[:len(prefix)] == prefix:
+            return mime
+    if head[:4] == ZIP_LOCAL_HEADER_SIGNATURE and XLSX_MIME in settings.ALLOWED_MIME_TYPES.values() and _is_xlsx(head):
+        return XLSX_MIME
+    return None
+
+
+def _from_libmagic(head: bytes) -> str:
+    try:
+        handle = _handles.get_nowait()
+    except queue.Empty:
+        handle = magic.Magic(mime=True)
+    try:
+        return handle.from_buffer(head)
+    finally:
+        _handles.put(handle)
+
+
+def detect_mime(file_buffer: FileBuffer) -> str:
+    """
+    MIME type of the content, from the signature table for the high-volume
+    types and from libmagic for the rest. libmagic only ever sees the first
+    MAGIC_BUFFER_SIZE bytes.
+    """
+    head = file_buffer.view()[:settings.MAGIC_BUFFER_SIZE]
+    mime = match_signature(head)
+    if mime is not None:
+        mime_detections.inc(method="signature")
+        return mime
+    mime_detections.inc(method="libmagic")
+    return _from_libmagic(bytes(head))
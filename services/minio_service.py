@@ -1,12 +1,73 @@
 from config.settings import settings
+import asyncio
 from config.minio_config import minio_client
+from minio.error import S3Error
+from datetime import timedelta
+from typing import Dict, List
 
 from exceptions import MinIOException
+from services.image_derivatives import derivative_object_name
+from services.deadline import hedged, with_deadline
+from services.adaptive_limiter import minio_limiter
+from services.circuit_breaker import minio_breaker
 from logs import get_app_logger, get_error_logger
 
 app_logger = get_app_logger()
 error_logger = get_error_logger()
 
+buckets_ready = asyncio.Event()
+
+
+async def call_minio(fn, *args, hedge: bool = False, bulk: bool = False, **kwargs):
+    """
+    Runs a blocking MinIO call in a thread, bounded by MINIO_TIMEOUT and the
+    request deadline. Idempotent reads may pass `hedge=True` to send a second
+    request when the first is slower than MINIO_HEDGE_DELAY. Calls that move
+    a whole object pass `bulk=True` so their size-dependent duration is not
+    taken for slowness by the limiter and breaker. Fails fast with
+    DependencyUnavailableException while the MinIO circuit is open.
+    """
+    # Each attempt, hedges included, takes a slot of the adaptive MinIO limit
+    call = lambda: minio_limiter.run(lambda: asyncio.to_thread(fn, *args, **kwargs), judge_latency=not bulk)
+    if hedge and settings.MINIO_HEDGED_READS:
+        return await minio_breaker.call(lambda: with_deadline(hedged(call, settings.MINIO_HEDGE_DELAY), settings.MINIO_TIMEOUT))
+    return await minio_breaker.call(lambda: with_deadline(call(), settings.MINIO_TIMEOUT), judge_latency=not bulk)
+
+
+def _ensure_bucket(bucket_name: str) -> None:
+    if minio_client.bucket_exists(bucket_name):
+        return
+    try:
+        minio_client.make_bucket(bucket_name)
+        app_logger.info(f"Created bucket {bucket_name}")
+    except S3Error as e:
+        # Another instance created it first
+        if e.code not in ("BucketAlreadyOwnedByYou", "BucketAlreadyExists"):
+            raise
+
+
+async def ensure_buckets() -> None:
+    """
+    Creates the shared buckets in the background, retrying with exponential
+    backoff until MinIO answers, so the app serves traffic without waiting.
+    `buckets_ready` is set once they exist.
+    """
+    buckets = [
+        settings.MINIO_BUCKET.lower().replace("_", "-"),
+        settings.MINIO_QUARANTINE_BUCKET.lower().replace("_", "-"),
+    ]
+    delay = settings.BUCKET_BOOTSTRAP_RETRY_DELAY
+    while True:
+        try:
+            for bucket_name in buckets:
+                await asyncio.to_thread(_ensure_bucket, bucket_name)
+            buckets_ready.set()
+            return
+        except Exception as e:
+            error_logger.error(f"Bucket bootstrap failed, retrying in {delay:.1f}s => {str(e)}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.BUCKET_BOOTSTRAP_MAX_DELAY)
+
 
 def generate_presigned_upload_url_minio(filename: str, userid: str, expires: int = 600) -> str:
     try:
@@ -20,4 +81,52 @@ def generate_presigned_upload_url_minio(filename: str, userid: str, expires: int
     except Exception as e:
         error_logger.error(f"Failed to generate presigned upload URL for user: {userid}, filename: {filename} => {str(e)}")
         raise MinIOException("Failed to generate presigned **UPLOAD URL** for MinIO", e)
-    
\ No newline at end of file
+
+
+def get_quarantine_object_size(filename: str, userid: str) -> int | None:
+    try:
+        stat = minio_client.stat_object(
+            bucket_name= settings.MINIO_QUARANTINE_BUCKET.lower().replace("_", "-"),
+            object_name=f"{userid}/{filename}",
+        )
+        return stat.size
+    except Exception as e:
+        error_logger.error(f"Failed to stat quarantine object for user: {userid}, filename: {filename} => {str(e)}")
+        return None
+
+
+def object_exists(bucket_name: str, object_name: str) -> bool:
+    try:
+        minio_client.stat_object(bucket_name=bucket_name, object_name=object_name)
+        return True
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchBucket"):
+            return False
+        raise
+
+
+def presign_get_objects(bucket_name: str, object_names: List[str], expires: timedelta) -> Dict[str, str]:
+    """Signs GET URLs for several objects of one bucket; signing is local once the bucket region is known."""
+    try:
+        return {
+            object_name: minio_client.presigned_get_object(bucket_name=bucket_name, object_name=object_name, expires=expires)
+            for object_name in object_names
+        }
+    except Exception as e:
+        error_logger.error(f"Failed to generate presigned download URLs for bucket: {bucket_name} => {str(e)}")
+        raise MinIOException("Failed to generate presigned **DOWNLOAD URL** for MinIO", e)
+
+
+def generate_presigned_derivative_url_minio(hashed_filename: str, userid: str, size: str, expires: timedelta = timedelta(minutes=10)) -> str | None:
+    """Signs a released image's derivative, None if the object has none of that size."""
+    object_name = derivative_object_name(hashed_filename, size)
+    try:
+        minio_client.stat_object(bucket_name=userid, object_name=object_name)
+        return minio_client.presigned_get_object(bucket_name=userid, object_name=object_name, expires=expires)
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchBucket"):
+            return None
+        raise MinIOException("Failed to generate presigned **DOWNLOAD URL** for MinIO", e)
+    except Exception as e:
+        error_logger.error(f"Failed to generate derivative URL for user: {userid}, filename: {hashed_filename}, size: {size} => {str(e)}")
+        raise MinIOException("Failed to generate presigned **DOWNLOAD URL** for MinIO", e)
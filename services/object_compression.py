@@ -0,0 +1,75 @@
+import os
+import zstandard
+from urllib.parse import urlencode
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from config.settings import settings
+from services.metrics import registry
+
+ZSTD_ENCODING = "zstd"
+ORIGINAL_SIZE_METADATA = "original-size" # stored by MinIO as x-amz-meta-original-size
+
+compressed_bytes_total = registry.gauge("files_backend_compressed_bytes_total", "Bytes of released objects before (original) and after (stored) compression")
+
+
+def should_compress(content_type: str) -> bool:
+    return settings.COMPRESSION_ENABLED and content_type in settings.COMPRESSED_MIME_TYPES
+
+
+def is_compressed_object(object_name: str) -> bool:
+    """
+    Whether a released object may be stored compressed, from the extension
+    its hashed filename keeps. Independent of COMPRESSION_ENABLED, objects
+    compressed before it was turned off stay compressed.
+    """
+    file_type = os.path.splitext(object_name)[-1].lower().lstrip(".")
+    return settings.ALLOWED_MIME_TYPES.get(file_type) in settings.COMPRESSED_MIME_TYPES
+
+
+def download_url(userid: str, object_name: str) -> str:
+    """
+    URL of a compressed object on /file/download, which negotiates the
+    encoding. A presigned URL would hand zstd bytes to every client.
+    """
+    return f"{settings.PUBLIC_BASE_URL}/file/download?{urlencode({'userid': userid, 'filename': object_name})}"
+
+
+def compressing_reader(source: BinaryIO, size: int) -> BinaryIO:
+    """
+    Reads `source` zstd-compressed, for put_object with an unknown length;
+    the frame records `size` so readers can allocate the output up front.
+    """
+    compressor = zstandard.ZstdCompressor(level=settings.COMPRESSION_LEVEL)
+    return compressor.stream_reader(source, size=size, read_size=settings.DOWNLOAD_CHUNK_SIZE)
+
+
+def compression_metadata(original_size: int) -> dict:
+    return {"Content-Encoding": ZSTD_ENCODING, ORIGINAL_SIZE_METADATA: str(original_size)}
+
+
+def object_encoding(headers) -> Optional[str]:
+    """Content encoding a stored object was written with, from its stat or GET headers."""
+    encoding = headers.get("Content-Encoding")
+    return encoding.lower() if encoding else None
+
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows `encoding` (not refused with q=0)."""
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() == encoding:
+            q = params.strip().lower()
+            try:
+                return not (q.startswith("q=") and float(q[2:]) == 0)
+            except ValueError:
+                return False
+    return False
+
+
+def decompressed_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Turns the raw chunks of a zstd-encoded object body back into its original bytes."""
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
@@ -1,9 +1,13 @@
 from services.service_factory import ServiceFactory
-from services.image_quarantine_check_service import ImageQuarantineCheckService
-from services.pdf_quarantine_check_service import PDFQuarantineCheckService
+from services.memory_budget import memory_budget, estimate_reservation
+from services.minio_service import call_minio, get_quarantine_object_size
+from services.fuzzy_hash_service import VERDICT_CLEAN, VERDICT_MALICIOUS
+from services.orchestrators.stage_graph import Stage, StageGraph
+from services.circuit_breaker import POLICY_PENDING_RESCAN, breaker_policy
 from config.settings import settings
-from exceptions import QuarantineFileCheckException
-from typing import List
+from exceptions import DependencyUnavailableException, QuarantineFileCheckException, ImageFileCheckException, PDFFileCHeckException, TabularFileCheckException, TextFileCheckException
+from typing import AsyncIterator, List, Optional
+import asyncio
 
 from logs import get_app_logger, get_error_logger
 
@@ -12,14 +16,9 @@ error_logger = get_error_logger()
 
 class QuarantineFileCheckPipeline:
     
-    @classmethod
-    async def process(cls,
-                query: str,
-                urls: str, 
-                filenames: str,
-                userid: str):
-        
-        result = {
+    @staticmethod
+    def _initial_result() -> dict:
+        return {
             "success": False,
             "query": None,
             "userid": "",
@@ -28,56 +27,186 @@ class QuarantineFileCheckPipeline:
             "magic_numbers": None,
             "malware": None,
             "sensitive_info": None,
+            "sensitive_info_types": {},
             "seen_files_collections": {},
+            "near_duplicates": {},
+            "metadata_removed": {},
             "unseen_filenames": [],
             "presigned_urls": {},
             "collection": None,
             "anonymized_content": None,
         }
+    
+    @classmethod
+    async def process(cls,
+                query: str,
+                urls: str, 
+                filenames: str,
+                userid: str,
+                file_size: Optional[int] = None):
+        
+        result = cls._initial_result()
         
+        kind = ServiceFactory.route([filenames])
         file_service = ServiceFactory.create_service(
-            query, [urls], [filenames], userid
+            query, [urls], [filenames], userid, kind=kind
         )
         
-        result.update(query= query, userid= userid, filenames= [filenames], sensitive_info = False)
-        await file_service.process_download_file()
-        if not file_service._file_contents:
-            raise QuarantineFileCheckException("Failed to download file content")
-            
-        file_service.process_get_file_size()
-        if any(size > settings.MAX_FILE_SIZE for size in file_service._file_sizes) or sum(file_service._file_sizes) > settings.MAX_UPLOAD_SIZE:
-            result.update(success=True, file_size_exceeds=True)
-            return result
+        if file_size is None:
+            file_size = await call_minio(get_quarantine_object_size, filenames, userid, hedge=True)
         
-        file_service.process_file_hashing()
-        # file_service.process_check_file_in_redis()
-        file_service._seen_status = [None] * len(file_service._file_sizes)
+        async def check():
+            async with memory_budget.reserve(estimate_reservation(file_size)):
+                return await cls._run(file_service, result, query, filenames, userid)
+        return await ServiceFactory.schedule(kind, userid, check)
+    
+    @classmethod
+    async def process_upload(cls,
+                query: str,
+                stream: AsyncIterator[bytes],
+                filenames: str,
+                userid: str,
+                file_size: Optional[int] = None):
+        """Same checks as `process`, on a request body streamed into quarantine instead of a presigned upload."""
+        result = cls._initial_result()
+        kind = ServiceFactory.route([filenames])
+        file_service = ServiceFactory.create_service(
+            query, [None], [filenames], userid, kind=kind
+        )
         
-        seen_files_collections = {hashed_filename: collection for hashed_filename, collection in zip(file_service._hashed_filenames, file_service._seen_status) if collection}
-        unseen_filenames = [filename for filename, seen in zip([filenames], file_service._seen_status) if not seen]
+        async def check():
+            async with memory_budget.reserve(estimate_reservation(file_size)):
+                return await cls._run(file_service, result, query, filenames, userid, stream)
+        return await ServiceFactory.schedule(kind, userid, check)
+    
+    @classmethod
+    async def _run(cls, file_service, result: dict, query: str, filenames: str, userid: str, stream: Optional[AsyncIterator[bytes]] = None) -> dict:
+        try:
+            result.update(query= query, userid= userid, filenames= [filenames], sensitive_info = False)
+            if stream is None:
+                await file_service.process_download_file()
+            else:
+                await file_service.process_receive_file(stream)
+            if not file_service._file_buffers:
+                raise QuarantineFileCheckException("Failed to download file content")
+            
+            file_service.process_get_file_size()
+            if any(size > settings.MAX_FILE_SIZE for size in file_service._file_sizes) or sum(file_service._file_sizes) > settings.MAX_UPLOAD_SIZE:
+                result.update(success=True, file_size_exceeds=True)
+                return result
         
-        result.update(seen_files_collections = seen_files_collections, unseen_filenames= unseen_filenames)
-
-        if unseen_filenames:
-            file_service.process_verify_magic_number()
-            await file_service.process_scan_for_malware()
-            result.update(magic_numbers = False, malware = False)
+            file_service.process_file_hashing()
+            fuzzy_matches = await file_service.process_fuzzy_hash_lookup()
+            near_duplicates = {
+                hashed_filename: {"sha256": match.sha256, "distance": match.distance, "verdict": match.verdict}
+                for hashed_filename, match in zip(file_service._hashed_filenames, fuzzy_matches) if match
+            }
+            result.update(near_duplicates = near_duplicates)
             
-            if isinstance(file_service, ImageQuarantineCheckService):
-                file_type_check_response = file_service.scan_multiple_files()
-            file_type_check_response = await file_service.scan_multiple_files()
-            result.update(file_type_check_response)
+            malicious_match = next((match for match in fuzzy_matches if match and match.verdict == VERDICT_MALICIOUS), None)
+            if malicious_match:
+                raise QuarantineFileCheckException(
+                    f"File is a near-duplicate (TLSH distance {malicious_match.distance}) of known malicious file "
+                    f"{malicious_match.sha256}: {malicious_match.reason}"
+                )
+            # file_service.process_check_file_in_redis()
+            file_service._seen_status = [None] * len(file_service._file_sizes)
+        
+            seen_files_collections = {hashed_filename: collection for hashed_filename, collection in zip(file_service._hashed_filenames, file_service._seen_status) if collection}
+            unseen_filenames = [filename for filename, seen in zip([filenames], file_service._seen_status) if not seen]
+        
+            result.update(seen_files_collections = seen_files_collections, unseen_filenames= unseen_filenames)
 
-            url = file_service.copy_object(userid, file_service.filenames[0], file_service._hashed_filenames[0])
-            file_service.delete_object(userid, filenames)
-            presigned_urls = {
-                file_service._hashed_filenames[0] : {
-                    "url" : url,
-                    "seen" : False,
-                    "filename" : filenames
+            if unseen_filenames:
+                skip_deep_scan = settings.FUZZY_HASH_SKIP_DEEP_SCAN and not file_service.release_requires_scan and all(
+                    match and match.verdict == VERDICT_CLEAN for match in fuzzy_matches
+                )
+                stage_results = await StageGraph(
+                    cls._check_stages(file_service, filenames, skip_deep_scan, near_duplicates),
+                    on_cancel=file_service.cancel_checks,
+                ).run()
+                
+                sensitive_info_results = stage_results["sensitive_info"]
+                result.update(stage_results["file_type"])
+                result.update(
+                    magic_numbers = False,
+                    malware = POLICY_PENDING_RESCAN if stage_results["malware"] == POLICY_PENDING_RESCAN else False,
+                    sensitive_info = any(r.has_sensitive_info for r in sensitive_info_results),
+                    sensitive_info_types = {r.filename: r.counts for r in sensitive_info_results if r.counts},
+                    anonymized_content = {r.filename: r.anonymized_content for r in sensitive_info_results} or None,
+                    metadata_removed = stage_results["sanitize_metadata"],
+                )
+                presigned_urls = {
+                    file_service._hashed_filenames[0] : {
+                        "url" : stage_results["release"],
+                        "derivatives" : file_service._derivative_urls.get(file_service._hashed_filenames[0], {}),
+                        "seen" : False,
+                        "filename" : filenames
+                    }
                 }
-            }
-            result.update(presigned_urls = presigned_urls)
+                result.update(presigned_urls = presigned_urls)
             
-        result.update(success = True)
-        return result
\ No newline at end of file
+            result.update(success = True)
+            return result
+        finally:
+            file_service.release_file_buffers()
+    
+    @staticmethod
+    def _check_stages(file_service, filenames: str, skip_deep_scan: bool, near_duplicates: dict) -> List[Stage]:
+        """
+        Checks of unseen files. They only need the downloaded bytes and their
+        hash, so they run concurrently; the release waits for all of them.
+        """
+        async def verify_magic_number():
+            return await file_service.run_check(file_service.process_verify_magic_number)
+        
+        async def scan_file_type():
+            if skip_deep_scan:
+                app_logger.info(f"Skipping type-specific scan for near-duplicates of clean files: {near_duplicates}")
+                return {}
+            try:
+                if asyncio.iscoroutinefunction(file_service.scan_multiple_files):
+                    return await file_service.scan_multiple_files()
+                return await file_service.run_check(file_service.scan_multiple_files)
+            except (ImageFileCheckException, PDFFileCHeckException, TabularFileCheckException, TextFileCheckException) as e:
+                # Only detections: a parse error or a size limit says nothing about near-duplicates
+                if e.malicious:
+                    await file_service.process_record_verdicts(VERDICT_MALICIOUS, e.message)
+                raise
+        
+        malware_skipped = False
+        
+        async def scan_for_malware():
+            nonlocal malware_skipped
+            try:
+                return await file_service.process_scan_for_malware()
+            except DependencyUnavailableException as e:
+                if breaker_policy(e.dependency) != POLICY_PENDING_RESCAN:
+                    raise
+                # VirusTotal is down: the local checks decide, the file is looked up again later
+                app_logger.warning(f"Skipping {e.dependency} lookup for {file_service._hashed_filenames}, queued for rescan: {e.message}")
+                await file_service.process_queue_rescan()
+                malware_skipped = True
+                return POLICY_PENDING_RESCAN
+        
+        async def record_clean_verdict():
+            # Without the VirusTotal lookup the file is not known clean yet
+            if not skip_deep_scan and not malware_skipped:
+                await file_service.process_record_verdicts(VERDICT_CLEAN)
+        
+        async def release():
+            url = await call_minio(file_service.move_file_from_quarantine, file_service.filenames[0], file_service._hashed_filenames[0], bulk=True)
+            file_service.delete_file_from_quarantine(filenames)
+            await asyncio.to_thread(file_service.index_released_file, file_service.filenames[0], file_service._hashed_filenames[0])
+            return url
+        
+        checks = ("magic_numbers", "malware", "file_type")
+        return [
+            Stage("magic_numbers", verify_magic_number),
+            Stage("malware", scan_for_malware),
+            Stage("file_type", scan_file_type),
+            Stage("sensitive_info", file_service.process_detect_sensitive_info),
+            Stage("sanitize_metadata", file_service.process_sanitize_metadata),
+            Stage("record_verdict", record_clean_verdict, depends_on=checks),
+            Stage("release", release, depends_on=(*checks, "sensitive_info", "sanitize_metadata")),
+        ]
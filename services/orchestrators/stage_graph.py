@@ -0,0 +1,101 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+from logs import get_app_logger, get_error_logger
+
+app_logger = get_app_logger()
+error_logger = get_error_logger()
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[[], Awaitable[Any]]
+    depends_on: Tuple[str, ...] = ()
+    # A failing blocking stage cancels every other running stage and fails the graph
+    blocking: bool = True
+
+
+class StageGraph:
+    """
+    Runs pipeline stages as a dependency graph.
+
+    A stage starts as soon as all of its dependencies finished, so independent
+    stages run concurrently and the latency is that of the slowest path. The
+    first blocking failure cancels the running stages and is re-raised; work
+    already handed to threads cannot be interrupted and may outlive the
+    graph, `on_cancel` lets the stages stop early instead. A failed non-blocking stage only skips the
+    stages that depend on it.
+    """
+
+    def __init__(self, stages: Sequence[Stage], on_cancel: Optional[Callable[[], None]] = None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.on_cancel = on_cancel
+        for stage in stages:
+            unknown = [name for name in stage.depends_on if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages {unknown}")
+        self._check_acyclic()
+
+    def _check_acyclic(self) -> None:
+        visiting, visited = set(), set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage graph has a cycle through '{name}'")
+            visiting.add(name)
+            for dependency in self.stages[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    async def run(self) -> Dict[str, Any]:
+        results: Dict[str, Any] = {}
+        failed, skipped = set(), set()
+        running: Dict[asyncio.Task, str] = {}
+
+        def start_ready_stages() -> None:
+            # Repeats until no stage is newly skipped, skips propagate down chains of dependents
+            changed = True
+            while changed:
+                changed = False
+                started = set(running.values())
+                for name, stage in self.stages.items():
+                    if name in results or name in started or name in failed or name in skipped:
+                        continue
+                    if any(dependency in failed or dependency in skipped for dependency in stage.depends_on):
+                        skipped.add(name)
+                        changed = True
+                        app_logger.info(f"Skipping stage '{name}', a dependency did not complete")
+                    elif all(dependency in results for dependency in stage.depends_on):
+                        running[asyncio.create_task(stage.run(), name=name)] = name
+
+        try:
+            start_ready_stages()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        results[name] = task.result()
+                    elif self.stages[name].blocking:
+                        raise error
+                    else:
+                        error_logger.error(f"Non-blocking stage '{name}' failed => {error}")
+                        failed.add(name)
+                start_ready_stages()
+            return results
+        finally:
+            if running:
+                if self.on_cancel is not None:
+                    self.on_cancel()
+                for task in running:
+                    task.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
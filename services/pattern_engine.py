@@ -0,0 +1,85 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional
+
+
+@dataclass
+class PatternMatch:
+    name: str
+    start: int
+    end: int
+    value: str
+
+
+class PatternEngine:
+    """
+    Runs many named patterns over text in a single regex pass.
+
+    All patterns are compiled into one alternation of named groups, so the
+    text is scanned once no matter how many patterns are registered.
+    `validators` optionally confirm a candidate match (e.g. a checksum) before
+    it is reported.
+    """
+
+    def __init__(self, patterns: Dict[str, str], validators: Optional[Dict[str, Callable[[str], bool]]] = None, flags: int = 0):
+        self.patterns = patterns
+        self.validators = validators or {}
+        self.regex = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in patterns.items()), flags)
+        # Only used to retry the other patterns where a validator rejected a match
+        self._single = {name: re.compile(pattern, flags) for name, pattern in patterns.items()}
+
+    def _valid(self, name: str, value: str) -> bool:
+        validator = self.validators.get(name)
+        return validator is None or validator(value)
+
+    def _retry_at(self, text: str, position: int, rejected: str) -> Optional[PatternMatch]:
+        """The first other pattern that matches and validates at `position`, in registration order."""
+        for name, regex in self._single.items():
+            if name == rejected:
+                continue
+            match = regex.match(text, position)
+            if match and self._valid(name, match.group()):
+                return PatternMatch(name, match.start(), match.end(), match.group())
+        return None
+
+    def finditer(self, text: str) -> Iterator[PatternMatch]:
+        position = 0
+        while True:
+            match = self.regex.search(text, position)
+            if match is None:
+                return
+            name = match.lastgroup
+            if self._valid(name, match.group(name)):
+                found = PatternMatch(name, match.start(), match.end(), match.group(name))
+            else:
+                # A rejected candidate must not hide what the other patterns match at the same place
+                found = self._retry_at(text, match.start(), name)
+            if found is None:
+                position = match.start() + 1
+                continue
+            yield found
+            position = max(found.end, found.start + 1)
+
+    def count(self, text: str) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for match in self.finditer(text):
+            counts[match.name] = counts.get(match.name, 0) + 1
+        return counts
+
+
+SECRET_PATTERNS = {
+    "private_key": r"-----BEGIN (?:RSA |EC |DSA |OPENSSH |PGP |ENCRYPTED )?PRIVATE KEY(?: BLOCK)?-----",
+    "aws_access_key_id": r"\b(?:AKIA|ASIA|ABIA|ACCA)[0-9A-Z]{16}\b",
+    "aws_secret_access_key": r"(?i:aws_?secret_?access_?key)\s*[:=]\s*['\"]?[A-Za-z0-9/+=]{40}\b",
+    "github_token": r"\b(?:gh[pousr]_[A-Za-z0-9]{36,255}|github_pat_[A-Za-z0-9_]{22,255})\b",
+    "gitlab_token": r"\bglpat-[A-Za-z0-9_\-]{20}\b",
+    "slack_token": r"\bxox[abposr]-[A-Za-z0-9\-]{10,}\b",
+    "google_api_key": r"\bAIza[0-9A-Za-z_\-]{35}\b",
+    "stripe_key": r"\b(?:sk|rk)_live_[0-9A-Za-z]{24,}\b",
+    "openai_api_key": r"\bsk-(?:proj-|svcacct-)?[A-Za-z0-9_\-]{40,}\b",
+    "jwt": r"\beyJ[A-Za-z0-9_\-]{10,}\.eyJ[A-Za-z0-9_\-]{10,}\.[A-Za-z0-9_\-]{10,}",
+    "credentials_in_url": r"\b[a-z][a-z0-9+.\-]*://[^:/\s@]+:[^@/\s]+@[^\s/]+",
+    "hardcoded_secret": r"(?i:password|passwd|pwd|secret|api_?key|access_?token|auth_?token)\s*[:=]\s*['\"][^'\"\s]{8,}['\"]",
+}
+
+secret_engine = PatternEngine(SECRET_PATTERNS)
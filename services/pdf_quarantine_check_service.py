@@ -1,16 +1,15 @@
 from models.pdf_quarantine_check import PDFQuarantineCheck
 from typing import List, Optional
-from io import BytesIO
 from dataclasses import dataclass
 from exceptions import PDFFileCHeckException
 
-import os
-import fitz
-import tempfile
 import zipfile
 from pdfid import pdfid
 import pikepdf
 from services.quarantine_file_check_service import QuarantineFileCheckService
+from services.file_buffer import FileBuffer
+from services.invisible_text_detector import find_invisible_text
+from services.decompression_analyzer import analyze_pdf, analyze_zip
 from config.settings import settings
 from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import traceback
@@ -39,12 +38,17 @@ class PDFQuarantineCheckService(PDFQuarantineCheck, QuarantineFileCheckService):
         super().__init__(query, urls, filenames, userid, timeout)
         self.executor = ThreadPoolExecutor(max_workers=10)
         
-    def is_valid_signature(self, file_content: bytes) -> bool:
-        return file_content.startswith(b"%PDF-") and b"%%EOF" in file_content
+    @staticmethod
+    def _pdf_source(file_buffer: FileBuffer):
+        """Spilled buffers are opened by path so the native parsers read the file directly."""
+        return file_buffer.name or file_buffer.open()
+        
+    def is_valid_signature(self, file_buffer: FileBuffer) -> bool:
+        return file_buffer.view()[:5] == b"%PDF-" and file_buffer.find(b"%%EOF") != -1
     
-    def is_pdf_encrypted(self, file_content: bytes) -> bool:
+    def is_pdf_encrypted(self, file_buffer: FileBuffer) -> bool:
         try:
-            with pikepdf.open(BytesIO(file_content)) as pdf:
+            with pikepdf.open(self._pdf_source(file_buffer)) as pdf:
                 return pdf.is_encrypted
             
         except pikepdf._qpdf.PasswordError:
@@ -53,14 +57,10 @@ class PDFQuarantineCheckService(PDFQuarantineCheck, QuarantineFileCheckService):
         except Exception as e:
             raise PDFFileCHeckException("Failed to check if PDF is encrypted", e)
     
-    def has_javascript(self, file_content: bytes) -> bool:
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            tmp_file.write(file_content)
-            tmp_file.flush()
-            temp_path = tmp_file.name
-        
+    def has_javascript(self, file_buffer: FileBuffer) -> bool:
         try:
-            result = pdfid.PDFiD(temp_path)
+            with file_buffer.as_path() as temp_path:
+                result = pdfid.PDFiD(temp_path)
             return (
                 "/JavaScript" in result.keywords
                 or "/AA" in result.keywords
@@ -68,51 +68,43 @@ class PDFQuarantineCheckService(PDFQuarantineCheck, QuarantineFileCheckService):
             )
         except Exception as e:
             raise PDFFileCHeckException("Failed to check for JavaScript", e)
-        finally:
-            os.remove(temp_path)
             
-    def list_embedded_files(self, file_content: bytes) -> list:
+    def list_embedded_files(self, file_buffer: FileBuffer) -> list:
         try:
-            with pikepdf.open(BytesIO(file_content)) as pdf:
+            with pikepdf.open(self._pdf_source(file_buffer)) as pdf:
                 return list(pdf.attachments.keys())
         except Exception as e:
             raise PDFFileCHeckException("Failed to list embedded files", e)
     
-    def detect_zip_bomb(self, file_content: bytes) -> bool:
+    def detect_zip_bomb(self, file_buffer: FileBuffer) -> bool:
+        """Inflates the FlateDecode streams, and any zip appended to the PDF, within bounded limits."""
         try:
-            with zipfile.ZipFile(BytesIO(file_content)) as content:
-                total_size = sum([content.getinfo(f).file_size for f in content.namelist()])
-                if total_size > 10 * 1024 * 1024:
-                    return True
-        except zipfile.BadZipFile:
-            return False
+            report = analyze_pdf(file_buffer)
+            if report.exceeded is None and zipfile.is_zipfile(file_buffer.open()):
+                report = analyze_zip(file_buffer)
         except Exception as e:
             raise PDFFileCHeckException("Failed to detect zip bomb", e)
-        
+
+        if report.exceeded:
+            logger.warning(f"Decompression bomb detected - {report.exceeded}")
+            return True
         return False
     
-    def has_invisible_text(self, file_content: bytes) -> bool:
-        with fitz.open(stream= BytesIO(file_content), filetype="pdf") as document:
-            for page in document:
-                blocks = page.get_text("dict")["blocks"]
-                for block in blocks:
-                    for line in block.get("lines", []):
-                        for span in line.get("spans",  []):
-                            font_size = span.get("size", 0)
-                            color = span.get("color", 0)
-                            
-                            if font_size < 1 or color == 0xFFFFFF: # too small or white text
-                                return True
-        
-        return False
+    def has_invisible_text(self, file_buffer: FileBuffer) -> bool:
+        try:
+            reason = find_invisible_text(file_buffer)
+        except Exception as e:
+            raise PDFFileCHeckException("Failed to check for invisible text", e)
+        if reason:
+            logger.warning(f"Invisible text detected - {reason}")
+        return reason is not None
     
     
-    async def run_pdf_check_pipeline(self, file_content: bytes, filename: str) -> PDFCheckResult:
-        file_size = round(len(file_content) / (1024 * 1024), 2)
+    async def run_pdf_check_pipeline(self, file_buffer: FileBuffer, filename: str) -> PDFCheckResult:
+        file_size = round(len(file_buffer) / (1024 * 1024), 2)
         logger.info(f"Checking pdf {filename} for checks...")
-        loop = asyncio.get_running_loop()
         
-        valid_signature = await loop.run_in_executor(self.executor, self.is_valid_signature, file_content)
+        valid_signature = await self.run_check(self.is_valid_signature, file_buffer, executor=self.executor)
         if not valid_signature:
             return PDFCheckResult(
                 filename,
@@ -121,7 +113,7 @@ class PDFQuarantineCheckService(PDFQuarantineCheck, QuarantineFileCheckService):
                 reason = "Invalid signature"
             )
         
-        is_encrypted = await loop.run_in_executor(self.executor, self.is_pdf_encrypted, file_content)
+        is_encrypted = await self.run_check(self.is_pdf_encrypted, file_buffer, executor=self.executor)
         if is_encrypted:
             return PDFCheckResult(
                 filename,
@@ -130,7 +122,7 @@ class PDFQuarantineCheckService(PDFQuarantineCheck, QuarantineFileCheckService):
                 reason = "Encrypted"
             )
         
-        # has_js = await loop.run_in_executor(self.executor, self.has_javascript, file_content)
+        # has_js = await self.run_check(self.has_javascript, file_buffer, executor=self.executor)
         # if has_js:
         #     return PDFCheckResult(
             #     filename,
@@ -139,7 +131,7 @@ class PDFQuarantineCheckService(PDFQuarantineCheck, QuarantineFileCheckService):
             #     reason = "JavaScript detected"
             # )
     
-        embedded_files = await loop.run_in_executor(self.executor, self.list_embedded_files, file_content)
+        embedded_files = await self.run_check(self.list_embedded_files, file_buffer, executor=self.executor)
         if embedded_files:
             return PDFCheckResult(
                 filename,
@@ -148,7 +140,7 @@ class PDFQuarantineCheckService(PDFQuarantineCheck, QuarantineFileCheckService):
                 reason = f"Embedded files detected - {len(embedded_files)}",
             )
         
-        has_zip_bomb = await loop.run_in_executor(self.executor, self.detect_zip_bomb, file_content)
+        has_zip_bomb = await self.run_check(self.detect_zip_bomb, file_buffer, executor=self.executor)
         if has_zip_bomb:
             return PDFCheckResult(
                 filename,
@@ -157,14 +149,14 @@ class PDFQuarantineCheckService(PDFQuarantineCheck, QuarantineFileCheckService):
                 reason = "Zip bomb detected",
             )
         
-        # invisible_text = await loop.run_in_executor(self.executor, self.has_invisible_text, file_content)
-        # if invisible_text:
-        #     return PDFCheckResult(
-            #     filename,
-            #     file_size,
-            #     malicious = True,
-            #     reason = "Invisible text detected"
-            # )
+        invisible_text = await self.run_check(self.has_invisible_text, file_buffer, executor=self.executor)
+        if invisible_text:
+            return PDFCheckResult(
+                filename,
+                file_size,
+                malicious = True,
+                reason = "Invisible text detected"
+            )
     
         return PDFCheckResult(
             filename,
@@ -174,22 +166,27 @@ class PDFQuarantineCheckService(PDFQuarantineCheck, QuarantineFileCheckService):
         )
     
     async def scan_multiple_files(self) -> dict:
-        if not self._file_contents:
+        if not self._file_buffers:
             logger.warning(f"No file contents to process for user {self.userid}")
             raise PDFFileCHeckException(f"No file contents to process for user {self.userid}")
         
-        if self._file_contents:
-            if len(self._file_contents) == 1:
-                result = await self.run_pdf_check_pipeline(self._file_contents[0], self.filenames[0])
+        if self._file_buffers:
+            if len(self._file_buffers) == 1:
+                result = await self.run_pdf_check_pipeline(self._file_buffers[0], self.filenames[0])
                 return self.get_validation_summary([result])
             
             tasks = [
-                self.run_pdf_check_pipeline(file_content, filename)
-                for file_content, filename in zip(self._file_contents, self.filenames)
+                self.run_pdf_check_pipeline(file_buffer, filename)
+                for file_buffer, filename in zip(self._file_buffers, self.filenames)
             ]
             results = await asyncio.gather(*tasks, return_exceptions= True)
             return self.get_validation_summary(results)
                 
+    def release_file_buffers(self) -> None:
+        # Steps of a cancelled pipeline that have not started yet are dropped
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        super().release_file_buffers()
+
     def get_validation_summary(self, results: List[PDFCheckResult]) -> dict:
         """Get summary statistics from validation results."""
         if not results:
@@ -198,7 +195,7 @@ class PDFQuarantineCheckService(PDFQuarantineCheck, QuarantineFileCheckService):
         is_malicious = [r.reason for r in results if r.malicious]
         
         if is_malicious:
-            raise PDFFileCHeckException(f"PDF file check failed - {is_malicious}") from is_malicious
+            raise PDFFileCHeckException(f"PDF file check failed - {is_malicious}", malicious=True)
             # return {"malicious": True, "reason": is_malicious}
         
         return {
@@ -0,0 +1,119 @@
+import time
+import redis
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from config.settings import settings
+from config.redis_config import pool, get_redis_pool
+from services.metrics import registry
+from logs import get_error_logger
+
+error_logger = get_error_logger()
+
+url_cache_lookups = registry.gauge("files_backend_presigned_url_cache_lookups", "Presigned URL lookups by result (local, redis, miss)")
+
+
+class PresignedURLCache:
+    """
+    Signed GET URLs per object, reused until PRESIGNED_URL_REFRESH_MARGIN
+    seconds before they expire. Repeated gallery loads get byte-identical
+    URLs, so browser and CDN caches keyed on the URL keep working.
+
+    Lookups go to a bounded in-process LRU first, then to Redis (one MGET
+    for all misses) so every pod hands out the same URL. Redis errors only
+    cost a re-sign.
+    """
+
+    def __init__(self, max_local_entries: int):
+        self.max_local_entries = max_local_entries
+        self._local: "OrderedDict[str, Tuple[float, str]]" = OrderedDict() # key -> (valid until, url)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(bucket_name: str, object_name: str) -> str:
+        return f"presigned:{bucket_name}:{object_name}"
+
+    def _remember(self, key: str, valid_until: float, url: str) -> None:
+        with self._lock:
+            self._local[key] = (valid_until, url)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_local_entries:
+                self._local.popitem(last=False)
+
+    def get_many(self, bucket_name: str, object_names: List[str]) -> Dict[str, str]:
+        """Cached URLs that are still valid for at least the refresh margin; misses are left out."""
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for object_name in object_names:
+                entry = self._local.get(self._key(bucket_name, object_name))
+                if entry is not None and entry[0] > now:
+                    self._local.move_to_end(self._key(bucket_name, object_name))
+                    found[object_name] = entry[1]
+                else:
+                    missing.append(object_name)
+        url_cache_lookups.inc(len(found), result="local")
+        if not missing:
+            return found
+
+        redis_hits = 0
+        try:
+            values = get_redis_pool(pool).mget([self._key(bucket_name, object_name) for object_name in missing])
+        except redis.RedisError as e:
+            error_logger.error(f"Failed to read presigned URLs from Redis => {str(e)}")
+            values = [None] * len(missing)
+        for object_name, value in zip(missing, values):
+            if value is None:
+                continue
+            valid_until, url = value.decode("utf-8").split(" ", 1)
+            if float(valid_until) > now:
+                self._remember(self._key(bucket_name, object_name), float(valid_until), url)
+                found[object_name] = url
+                redis_hits += 1
+        url_cache_lookups.inc(redis_hits, result="redis")
+        url_cache_lookups.inc(len(missing) - redis_hits, result="miss")
+        return found
+
+    def put_many(self, bucket_name: str, urls: Dict[str, str], signed_at: float) -> Dict[str, str]:
+        """
+        Caches URLs signed at `signed_at` with an expiry of PRESIGNED_URL_EXPIRES
+        seconds and returns the URLs to hand out: where another pod cached a
+        URL first, its URL instead of ours.
+        """
+        valid_until = signed_at + settings.PRESIGNED_URL_EXPIRES - settings.PRESIGNED_URL_REFRESH_MARGIN
+        ttl_ms = int((valid_until - time.time()) * 1000)
+        if ttl_ms <= 0 or not urls:
+            return dict(urls)
+        winners = dict(urls)
+        try:
+            # NX then GET in one MULTI: a URL another pod cached first wins, so all pods hand out the same one
+            pipeline = get_redis_pool(pool).pipeline(transaction=True)
+            for object_name, url in urls.items():
+                pipeline.set(self._key(bucket_name, object_name), f"{valid_until} {url}", px=ttl_ms, nx=True)
+                pipeline.get(self._key(bucket_name, object_name))
+            replies = pipeline.execute()
+            for object_name, stored in zip(urls, replies[1::2]):
+                if stored is not None:
+                    stored_until, stored_url = stored.decode("utf-8").split(" ", 1)
+                    winners[object_name] = stored_url
+                    self._remember(self._key(bucket_name, object_name), float(stored_until), stored_url)
+        except redis.RedisError as e:
+            error_logger.error(f"Failed to cache presigned URLs in Redis => {str(e)}")
+            for object_name, url in urls.items():
+                self._remember(self._key(bucket_name, object_name), valid_until, url)
+        return winners
+
+    def invalidate(self, bucket_name: str, object_names: List[str]) -> None:
+        """Forgets the URLs of deleted objects, other pods only drop their local copy when it expires."""
+        keys = [self._key(bucket_name, object_name) for object_name in object_names]
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        try:
+            get_redis_pool(pool).delete(*keys)
+        except redis.RedisError as e:
+            error_logger.error(f"Failed to drop presigned URLs from Redis => {str(e)}")
+
+
+presigned_url_cache = PresignedURLCache(settings.PRESIGNED_URL_CACHE_MAX_ENTRIES)
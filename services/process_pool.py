@@ -0,0 +1,45 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextvars import ContextVar
+from typing import Optional, Set
+
+from config.settings import settings
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+# Futures of the checks of one request, so a cancelled request can drop its queued jobs
+_submitted_futures: ContextVar[Optional[Set[Future]]] = ContextVar("process_pool_submitted", default=None)
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Shared pool for CPU-bound per-page work, created on first use."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.PROCESS_POOL_WORKERS,
+                mp_context=multiprocessing.get_context(settings.PROCESS_POOL_START_METHOD),
+            )
+        return _process_pool
+
+
+def track_submissions(futures: Set[Future]) -> None:
+    """Records the futures of every `submit` in the current context (and the threads it is copied to) in `futures`."""
+    _submitted_futures.set(futures)
+
+
+def submit(fn, *args) -> Future:
+    future = get_process_pool().submit(fn, *args)
+    submitted = _submitted_futures.get()
+    if submitted is not None:
+        submitted.add(future)
+    return future
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
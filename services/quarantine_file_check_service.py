@@ -6,9 +6,24 @@ import aiohttp
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import asyncio
 import hashlib
+import threading
+import contextvars
 import os
-import magic
 from .redis_service import get_redis_hash_values
+from .file_buffer import FileBuffer
+from .process_pool import track_submissions
+from .mime_detector import detect_mime
+from .upload_stream import ChunkPipe
+from .deadline import hedged, remaining_timeout, stop_at_deadline, with_deadline
+from .adaptive_limiter import minio_limiter, virustotal_limiter
+from .circuit_breaker import minio_breaker, virustotal_breaker
+from .rescan_queue import RescanEntry, queue_rescan
+from .object_compression import compressed_bytes_total, compressing_reader, compression_metadata, download_url, should_compress
+from .sensitive_data_service import detect_sensitive_info
+from .metadata_sanitizer import SanitizeResult, sanitize_metadata as sanitize_file_metadata
+from .file_index import index_released_file, new_index_entry
+from .quarantine_janitor import quarantine_deletes
+from .fuzzy_hash_service import compute_fuzzy_hash, find_nearest, record_verdict, VERDICT_CLEAN, VERDICT_MALICIOUS
 import traceback
 import io
 from minio.commonconfig import REPLACE, CopySource
@@ -16,20 +31,28 @@ from minio.commonconfig import REPLACE, CopySource
 
 from PIL import Image
 import vt
-from typing import List, Dict, Union, Optional
+from typing import AsyncIterator, Callable, List, Dict, Tuple, Union, Optional, TypeVar
 from config.settings import settings
 from config.minio_config import minio_client
 
-from exceptions import QuarantineFileCheckException
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from exceptions import QuarantineFileCheckException, DeadlineExceededException, AdmissionControlException, DependencyUnavailableException
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 
 from logs import get_app_logger, get_error_logger
 
 app_logger = get_app_logger()
 error_logger = get_error_logger()
 
+T = TypeVar("T")
+
+# Blocking checks of every request; see QuarantineFileCheckService.run_check
+_check_threads = ThreadPoolExecutor(thread_name_prefix="file-checks")
+
 class QuarantineFileCheckService(QuarantineFileCheck):
     
+    # The type-specific scan produces what is released (e.g. a normalized file), so it can never be skipped
+    release_requires_scan = False
+    
     def __init__(self, query: str, urls: List[str], filenames: List[str], userid: str, timeout: int = 30):
         self.query = query
         self.urls = urls
@@ -43,13 +66,61 @@ class QuarantineFileCheckService(QuarantineFileCheck):
         
         
         self._file_sizes = None
-        self._file_contents = None
+        self._file_buffers = None
         self._hashed_filenames = None
+        self._fuzzy_hashes = None
+        self._fuzzy_matches = None
+        self._sanitized_buffers = {}
+        self._derivative_urls = {}
+        self._received_digests = {}
+        self._cancelled = threading.Event()
+        self._checks_lock = threading.Lock()
+        self._running_checks = set() # thread futures that may still read the buffers
+        self._pool_futures = set() # process pool jobs submitted by the checks
+        self._release_pending = False
         self._seen_status = None
         self._minio_status = None
         self._urls = None
         
     
+    def cancel_checks(self) -> None:
+        """Asks checks running in threads to stop, the pipeline no longer waits for them."""
+        self._cancelled.set()
+        # Jobs still queued in the process pool are dropped, running ones end with their page range
+        for future in list(self._pool_futures):
+            future.cancel()
+
+    async def run_check(self, fn: Callable[..., T], *args, executor: Optional[ThreadPoolExecutor] = None) -> T:
+        """
+        Runs a blocking check in a thread like asyncio.to_thread, but keeps
+        track of it: a cancelled await does not stop the thread, so
+        release_file_buffers leaves the buffers open until it returned.
+        """
+        context = contextvars.copy_context()
+        context.run(track_submissions, self._pool_futures)
+        future = self._track((executor or _check_threads).submit(context.run, fn, *args))
+        return await asyncio.wrap_future(future)
+
+    def _track(self, future):
+        """Keeps the buffers open until `future` is done, for work a check hands to its own threads."""
+        with self._checks_lock:
+            self._running_checks.add(future)
+        future.add_done_callback(self._check_finished)
+        return future
+
+    def _check_finished(self, future) -> None:
+        with self._checks_lock:
+            self._running_checks.discard(future)
+            release = self._release_pending and not self._running_checks
+        if release:
+            self._close_file_buffers()
+
+    def _as_completed(self, futures, timeout: Optional[float] = None):
+        for future in as_completed(futures, timeout=remaining_timeout(timeout)):
+            if self._cancelled.is_set():
+                raise QuarantineFileCheckException(f"Checks cancelled for user '{self.userid}'")
+            yield future
+
     def _log_info(self, message: str) -> None:
         """Log an info message if logger is available."""
         if app_logger:
@@ -65,7 +136,7 @@ class QuarantineFileCheckService(QuarantineFileCheck):
 
     
     @retry(
-        stop=stop_after_attempt(2),
+        stop=stop_after_attempt(2) | stop_at_deadline(),
         wait=wait_exponential(multiplier=1, min=1, max=10),
         retry=retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError, aiohttp.ClientConnectionError)),
         before= lambda retry_state: print(
@@ -73,26 +144,113 @@ class QuarantineFileCheckService(QuarantineFileCheck):
         ),
         after=lambda retry_state: print(f"Retry finished: attempt {retry_state.attempt_number}")
     )
-    async def download_file(self, session: aiohttp.ClientSession, url: str, filename: str):  
-        async with session.get(url) as response:
-            print(f"📡 HTTP status: {response.status}")
-            # await response.raise_for_status() 
-            file_content = await response.read()
+    async def download_file(self, session: aiohttp.ClientSession, url: str, filename: str) -> FileBuffer:
+        file_buffer = FileBuffer()
+        max_file_bytes = settings.MAX_FILE_SIZE * 1024 * 1024
+        try:
+            async with await self._open_download(session, url) as response:
+                print(f"📡 HTTP status: {response.status}")
+                # await response.raise_for_status() 
+                async for chunk in response.content.iter_chunked(settings.DOWNLOAD_CHUNK_SIZE):
+                    file_buffer.write(chunk)
+                    if len(file_buffer) > max_file_bytes:
+                        # Already over the limit, the size check rejects it without the rest of the body
+                        print(f"File '{filename}' exceeds {settings.MAX_FILE_SIZE} MB, download stopped")
+                        break
+        except BaseException:
+            file_buffer.close()
+            raise
         print(f"Downloaded the file uploaded by user: '{self.userid}' with filename: '{filename}'")
-        return file_content
+        return file_buffer.seal()
                 
-    def get_file_size(self, file_content: bytes) -> float:
-        return round(len(file_content) / (1024 * 1024), 2)
+    async def receive_file(self, stream: AsyncIterator[bytes], filename: str) -> FileBuffer:
+        """
+        Receives an uploaded body in a single pass: hashes it, checks its header
+        as soon as enough bytes arrived and streams it into the quarantine object
+        (multipart upload), keeping a copy in a FileBuffer for the checks.
+        """
+        file_buffer = FileBuffer()
+        hasher = hashlib.sha256()
+        head = bytearray()
+        header_checked = False
+        max_file_bytes = settings.MAX_FILE_SIZE * 1024 * 1024
+        pipe = ChunkPipe(settings.UPLOAD_PIPE_MAX_CHUNKS)
+        upload = asyncio.create_task(asyncio.to_thread(self._put_quarantine_object, filename, pipe))
+        try:
+            async for chunk in stream:
+                if upload.done():
+                    upload.result()
+                    raise QuarantineFileCheckException(f"Upload of '{filename}' ended before the request body")
+                file_buffer.write(chunk)
+                hasher.update(chunk)
+                if len(file_buffer) > max_file_bytes:
+                    # The size check rejects it, nothing is kept in quarantine
+                    print(f"File '{filename}' exceeds {settings.MAX_FILE_SIZE} MB, upload stopped")
+                    pipe.abort("File size limit exceeded")
+                    await asyncio.gather(upload, return_exceptions=True)
+                    return file_buffer.seal()
+                if not header_checked:
+                    head += chunk[:settings.UPLOAD_SNIFF_SIZE - len(head)]
+                    if len(head) >= settings.UPLOAD_SNIFF_SIZE:
+                        self.verify_stream_header(bytes(head), filename)
+                        header_checked = True
+                await pipe.feed(chunk)
+
+            if not header_checked:
+                self.verify_stream_header(bytes(head), filename)
+            await pipe.finish()
+            await upload
+        except BaseException as e:
+            pipe.abort(str(e))
+            await asyncio.gather(upload, return_exceptions=True)
+            file_buffer.close()
+            raise
+
+        self._received_digests[filename] = hasher.hexdigest()
+        print(f"Received the file uploaded by user: '{self.userid}' with filename: '{filename}'")
+        return file_buffer.seal()
+
+    def _put_quarantine_object(self, filename: str, pipe: ChunkPipe):
+        try:
+            return minio_client.put_object(
+                settings.MINIO_QUARANTINE_BUCKET.lower().replace("_", "-"),
+                f'{self.userid}/{filename}',
+                pipe,
+                length=-1,
+                part_size=settings.UPLOAD_PART_SIZE,
+                content_type=settings.ALLOWED_MIME_TYPES.get(self._file_type(filename), "application/octet-stream"),
+            )
+        finally:
+            pipe.close()
+
+    def verify_stream_header(self, head: bytes, filename: str) -> bool:
+        """Early checks on the first bytes of an upload, the full checks still run on the complete file."""
+        with FileBuffer.from_bytes(head) as head_buffer:
+            return self.verify_magic_number(head_buffer, filename)
+
+    async def _open_download(self, session: aiohttp.ClientSession, url: str) -> aiohttp.ClientResponse:
+        """Sends the GET with the remaining deadline as its timeout, hedged on time to first byte if enabled."""
+        timeout = aiohttp.ClientTimeout(total=remaining_timeout(self.timeout))
+        request = lambda: minio_limiter.run(lambda: session.get(url, timeout=timeout))
+        if settings.MINIO_HEDGED_READS:
+            return await minio_breaker.call(lambda: hedged(request, settings.MINIO_HEDGE_DELAY, discard=lambda response: response.release()))
+        return await minio_breaker.call(request)
+
+    def get_file_size(self, file_buffer: FileBuffer) -> float:
+        return round(len(file_buffer) / (1024 * 1024), 2)
     
             
-    def generate_unique_filename(self, file_content: bytes, filename: str) -> str:
+    def generate_unique_filename(self, file_buffer: FileBuffer, filename: str) -> str:
         try:
             file_extension = os.path.splitext(filename)[-1].lower()
-            hasher = hashlib.sha256()
-            hasher.update(file_content)
-            if file_extension in settings.TABULAR_EXTENSIONS:
+            digest = self._received_digests.get(filename)
+            if digest is None:
+                hasher = hashlib.sha256()
+                hasher.update(file_buffer.view())
+                digest = hasher.hexdigest()
+            if file_extension.lstrip('.') in settings.TABULAR_EXTENSIONS:
                 file_extension = ".parquet"
-            hashed_filename = hasher.hexdigest() + file_extension
+            hashed_filename = digest + file_extension
             return hashed_filename
         except Exception as e:
             self._log_error(f"Unexpected error hashing data with SHA-256 => {str(e)}\n\n{traceback.format_exc()}")
@@ -110,9 +268,9 @@ class QuarantineFileCheckService(QuarantineFileCheck):
             print(f"Error while checking seen status in redis")
             return False
 
-    def verify_magic_number(self, file_content: bytes, filename: str) -> bool:
+    def verify_magic_number(self, file_buffer: FileBuffer, filename: str) -> bool:
         try:
-            detected_mime = magic.from_buffer(file_content, mime=True)
+            detected_mime = detect_mime(file_buffer)
             file_extension = os.path.splitext(filename)[-1].lower().lstrip('.')
             expected_mime = settings.ALLOWED_MIME_TYPES.get(file_extension)
             
@@ -130,10 +288,14 @@ class QuarantineFileCheckService(QuarantineFileCheck):
             raise QuarantineFileCheckException("Error while verifying magic numbers", e)
     
     
-    async def scan_for_malware(self, hashed_filename: str) -> bool:
+    @staticmethod
+    async def scan_for_malware(hashed_filename: str) -> bool:
         try:
-            async with vt.Client(settings.VIRUSTOTAL_API_KEY) as client:
-                response = await client.get_object_async(f"/files/{hashed_filename.split('.')[0]}")
+            async with vt.Client(settings.VIRUSTOTAL_API_KEY, timeout=remaining_timeout(settings.VIRUSTOTAL_TIMEOUT)) as client:
+                response = await virustotal_breaker.call(lambda: with_deadline(
+                    virustotal_limiter.run(lambda: client.get_object_async(f"/files/{hashed_filename.split('.')[0]}")),
+                    settings.VIRUSTOTAL_TIMEOUT
+                ))
                 
             sandbox_verdicts = response.get("sandbox_verdicts", {})
             total_votes = response.get("total_votes", {})
@@ -141,12 +303,12 @@ class QuarantineFileCheckService(QuarantineFileCheck):
             
             if total_votes.get("malicious", 0) > 0 or reputation < 0:
                 app_logger.warning("VirusTotal flagged the file as malicious")
-                raise QuarantineFileCheckException(f"VirusTotal flagged the file as malicious")
+                raise QuarantineFileCheckException(f"VirusTotal flagged the file as malicious", malicious=True)
             
             for verdict in sandbox_verdicts.values():
                 if verdict.get("category") != "harmless":
                     app_logger.warning(f"Sandbox verdict not harmless: {verdict}")
-                    raise QuarantineFileCheckException(f"Sandbox verdict not harmless: {verdict}\nFile is malicious")
+                    raise QuarantineFileCheckException(f"Sandbox verdict not harmless: {verdict}\nFile is malicious", malicious=True)
             
             return True
         
@@ -154,11 +316,24 @@ class QuarantineFileCheckService(QuarantineFileCheck):
             if e.args[0] == "NotFoundError":
                 print(f"Unknown hash...Not Scanning")
                 return True
+        except (DeadlineExceededException, AdmissionControlException, DependencyUnavailableException):
+            raise
         except Exception as e:
             raise QuarantineFileCheckException("Error while scanning for malware using Virus Total", e)
     
     
+    def sanitize_metadata(self, file_buffer: FileBuffer, filename: str) -> SanitizeResult:
+        try:
+            return sanitize_file_metadata(file_buffer, filename)
+        except Exception as e:
+            raise QuarantineFileCheckException(f"Error while sanitizing metadata of '{filename}'", e)
+    
     def move_file_from_quarantine(self, filename: str, hashed_filename: str) -> bool:
+        file_buffer, content_type = self._released_content(filename)
+        # The sanitized copy differs from the quarantined object, upload it instead of a server-side copy;
+        # a server-side copy would also store it uncompressed, compress the local copy on its way up instead
+        if filename in self._sanitized_buffers or should_compress(content_type):
+            return self._put_object_from_buffer(hashed_filename, file_buffer, content_type)
 
         try:
             if not minio_client.bucket_exists(self.userid):
@@ -171,20 +346,73 @@ class QuarantineFileCheckService(QuarantineFileCheck):
             )
             
             url = minio_client.presigned_get_object(
-                bucket_name= userid, 
+                bucket_name= self.userid, 
                 object_name=hashed_filename, 
             ) 
             
             return url
         except Exception as e:
             raise QuarantineFileCheckException("Error while copying object to user bucket", e)
+    
+    def index_released_file(self, filename: str, hashed_filename: str) -> bool:
+        """Records a released file in the user's Redis index, which backs the file listing."""
+        index = self.filenames.index(filename)
+        file_buffer, content_type = self._released_content(filename)
+        collection = self._seen_status[index] if self._seen_status else None
+        return index_released_file(self.userid, new_index_entry(hashed_filename, filename, len(file_buffer), collection or None, content_type))
+    
+    def _released_content(self, filename: str) -> Tuple[FileBuffer, str]:
+        """What is stored in the user bucket for `filename`, and its content type."""
+        file_buffer = self._sanitized_buffers.get(filename)
+        if file_buffer is None:
+            file_buffer = self._file_buffers[self.filenames.index(filename)]
+        return file_buffer, settings.ALLOWED_MIME_TYPES.get(self._file_type(filename), "application/octet-stream")
+    
+    def _put_object_from_buffer(self, object_name: str, file_buffer: FileBuffer, content_type: str) -> str:
+        """
+        Uploads locally produced content (e.g. a normalized file) to the user
+        bucket, zstd-compressed while it is streamed if its type compresses.
+        """
+        try:
+            if not minio_client.bucket_exists(self.userid):
+                minio_client.make_bucket(self.userid)
+            if should_compress(content_type):
+                with compressing_reader(file_buffer.open(), len(file_buffer)) as compressed:
+                    minio_client.put_object(
+                        self.userid,
+                        object_name,
+                        compressed,
+                        length=-1,
+                        part_size=settings.COMPRESSION_PART_SIZE,
+                        content_type=content_type,
+                        metadata=compression_metadata(len(file_buffer)),
+                    )
+                    compressed_bytes_total.inc(len(file_buffer), size="original")
+                    compressed_bytes_total.inc(compressed.tell(), size="stored")
+                # Clients must not get the zstd bytes through a presigned URL
+                return download_url(self.userid, object_name)
+            
+            minio_client.put_object(
+                self.userid,
+                object_name,
+                file_buffer.open(),
+                length=len(file_buffer),
+                content_type=content_type,
+            )
+            
+            url = minio_client.presigned_get_object(
+                bucket_name= self.userid, 
+                object_name=object_name, 
+            ) 
+            
+            return url
+        except Exception as e:
+            raise QuarantineFileCheckException("Error while uploading object to user bucket", e)
         
     def delete_file_from_quarantine(self, filename: str) -> bool:
+        # Queued for the next batch delete, the janitor catches whatever a crash loses
         try: 
-            minio_client.remove_object(
-                settings.MINIO_QUARANTINE_BUCKET.lower().replace("_", "-"),
-                f'{self.userid}/{filename}'
-            )
+            quarantine_deletes.enqueue(f'{self.userid}/{filename}')
             return True
         except Exception as e:
             raise QuarantineFileCheckException("Error while deleting object from quarantine bucket", e)
@@ -203,34 +431,53 @@ class QuarantineFileCheckService(QuarantineFileCheck):
                     for url, filename in zip(self.urls, self.filenames)
                 ]
                 results = await asyncio.gather(*tasks, return_exceptions=True)
-            for result in results:
-                if isinstance(result, Exception) or not isinstance(result, bytes):
-                    print(f"{result=}")
-                    raise QuarantineFileCheckException(f"Error while Downloading the files for user - {self.userid}")
+            if any(isinstance(result, BaseException) or not isinstance(result, FileBuffer) for result in results):
+                print(f"{results=}")
+                for result in results:
+                    if isinstance(result, FileBuffer):
+                        result.close()
+                unavailable = next((result for result in results if isinstance(result, DependencyUnavailableException)), None)
+                if unavailable:
+                    raise unavailable
+                raise QuarantineFileCheckException(f"Error while Downloading the files for user - {self.userid}")
             
-            self._file_contents = results
+            self._file_buffers = results
             print("Downloading done")
             return True
         
+        except DependencyUnavailableException:
+            raise
         except Exception as e:
             raise QuarantineFileCheckException(f"Error while Downloading the files for user - {self.userid}", e)
         
+    async def process_receive_file(self, stream: AsyncIterator[bytes]) -> bool:
+        try:
+            self._file_buffers = [await self.receive_file(stream, self.filenames[0])]
+            return True
+        except QuarantineFileCheckException:
+            raise
+        except Exception as e:
+            raise QuarantineFileCheckException(f"Error while receiving the file for user - {self.userid}", e)
+
     def process_file_hashing(self) -> Optional[Dict]:
         futures = []
         executor = None
         results = []
-        if self._file_contents:
+        if self._file_buffers:
             try:
                 executor = ThreadPoolExecutor(max_workers=self.max_workers)
                 
-                for content, filename in zip(self._file_contents, self.filenames):
-                    future = executor.submit(self.generate_unique_filename, content, filename)
-                    futures.append((future, filename))
+                for file_buffer, filename in zip(self._file_buffers, self.filenames):
+                    future = executor.submit(self.generate_unique_filename, file_buffer, filename)
+                    fuzzy_future = executor.submit(compute_fuzzy_hash, file_buffer)
+                    futures.append((future, fuzzy_future, filename))
 
-                for future, filename in futures:
+                fuzzy_hashes = []
+                for future, fuzzy_future, filename in futures:
                     try:
-                        result = future.result(timeout = 10)
+                        result = future.result(timeout = remaining_timeout(10))
                         results.append(result)
+                        fuzzy_hashes.append(fuzzy_future.result(timeout = remaining_timeout(10)))
                     except FuturesTimeoutError as e:
                         self._log_error(message = f"Timeout while getting hashed file name for file'{filename}' of user '{self.userid}' => {str(e)}\n\n{traceback.format_exc()}", exc_info = True)
                         results.append(None)
@@ -242,6 +489,7 @@ class QuarantineFileCheckService(QuarantineFileCheck):
                     raise QuarantineFileCheckException(f"Error processing file for getting hashed file names of user '{self.userid}'")
                 
                 self._hashed_filenames = results
+                self._fuzzy_hashes = fuzzy_hashes
                 return None
             
             except Exception as e:
@@ -254,37 +502,56 @@ class QuarantineFileCheckService(QuarantineFileCheck):
         return None
     
     def process_get_file_size(self) -> Optional[List[float]]:
-        if self._file_contents:
+        if self._file_buffers:
             self._file_sizes = [
-                self.get_file_size(file_content)
-                for file_content in self._file_contents
+                self.get_file_size(file_buffer)
+                for file_buffer in self._file_buffers
             ]
             return True
         raise QuarantineFileCheckException("There might be some issue while downlaoding files, not able to access file contents to get file size")
     
     async def process_check_file_in_redis(self):
         check_file_in_redis_tasks = [ 
-            asyncio.to_thread(self.check_file_in_redis, self.userid, hashed_filename) 
+            asyncio.to_thread(self.check_file_in_redis, hashed_filename)
             for hashed_filename in self._hashed_filenames
         ]
         self._seen_status = await asyncio.gather(*check_file_in_redis_tasks)
         
+    async def process_fuzzy_hash_lookup(self):
+        fuzzy_hash_lookup_tasks = [
+            asyncio.to_thread(find_nearest, fuzzy_hash, self.userid, self._file_type(filename))
+            for fuzzy_hash, filename in zip(self._fuzzy_hashes or [None] * len(self.filenames), self.filenames)
+        ]
+        self._fuzzy_matches = await asyncio.gather(*fuzzy_hash_lookup_tasks)
+        return self._fuzzy_matches
+    
+    async def process_record_verdicts(self, verdict: str, reason: Optional[str] = None):
+        record_verdict_tasks = [
+            asyncio.to_thread(record_verdict, fuzzy_hash, self.userid, self._file_type(filename), hashed_filename.split('.')[0], verdict, reason)
+            for fuzzy_hash, filename, hashed_filename in zip(self._fuzzy_hashes or [], self.filenames, self._hashed_filenames or [])
+        ]
+        await asyncio.gather(*record_verdict_tasks)
+    
+    @staticmethod
+    def _file_type(filename: str) -> str:
+        return os.path.splitext(filename)[-1].lower().lstrip('.')
+        
     def process_verify_magic_number(self):
         futures = []
         executor = None
         results = []
-        if self._file_contents:
+        if self._file_buffers:
             try:
                 executor = ThreadPoolExecutor(max_workers=self.max_workers)
                 
-                for content, filename, seen in zip(self._file_contents, self.filenames, self._seen_status):
+                for file_buffer, filename, seen in zip(self._file_buffers, self.filenames, self._seen_status):
                     if not seen:
-                        future = executor.submit(self.verify_magic_number, content, filename)
+                        future = self._track(executor.submit(self.verify_magic_number, file_buffer, filename))
                         futures.append((future, filename))
 
                 for future, filename in futures:
                     try:
-                        result = future.result(timeout = 10)
+                        result = future.result(timeout = remaining_timeout(10))
                         results.append(result)
                     except FuturesTimeoutError as e:
                         self._log_error(message = f"Timeout while checking for magic numbers for '{filename}' of user '{self.userid}' => {str(e)}\n\n{traceback.format_exc()}", exc_info = True)
@@ -304,9 +571,33 @@ class QuarantineFileCheckService(QuarantineFileCheck):
             
             finally:
                 if executor:
-                    executor.shutdown(wait=True)
+                    # Queued checks are dropped once one failed
+                    executor.shutdown(wait=False, cancel_futures=True)
         return None
     
+    async def process_detect_sensitive_info(self) -> list:
+        if not settings.PII_DETECTION_ENABLED:
+            return []
+        detect_sensitive_info_tasks = [
+            self.run_check(detect_sensitive_info, file_buffer, filename)
+            for file_buffer, filename, seen in zip(self._file_buffers, self.filenames, self._seen_status)
+            if not seen
+        ]
+        results = await asyncio.gather(*detect_sensitive_info_tasks)
+        return [result for result in results if result is not None]
+    
+    async def process_sanitize_metadata(self) -> Dict[str, List[str]]:
+        sanitize_metadata_tasks = [
+            self.run_check(self.sanitize_metadata, file_buffer, filename)
+            for file_buffer, filename, seen in zip(self._file_buffers, self.filenames, self._seen_status)
+            if not seen
+        ]
+        results = await asyncio.gather(*sanitize_metadata_tasks)
+        for result in results:
+            if result.file_buffer is not None:
+                self._sanitized_buffers[result.filename] = result.file_buffer
+        return {result.filename: result.removed for result in results if result.removed}
+    
     async def process_scan_for_malware(self):
         scan_for_malware_tasks = [ 
             self.scan_for_malware(hashed_filename)
@@ -314,4 +605,35 @@ class QuarantineFileCheckService(QuarantineFileCheck):
             if not seen
         ]
         await asyncio.gather(*scan_for_malware_tasks)
-        return True
\ No newline at end of file
+        return True
+    
+    async def process_queue_rescan(self) -> bool:
+        entries = [
+            RescanEntry(self.userid, hashed_filename, fuzzy_hash, self._file_type(filename))
+            for hashed_filename, fuzzy_hash, filename, seen in zip(
+                self._hashed_filenames, self._fuzzy_hashes or [None] * len(self.filenames), self.filenames, self._seen_status
+            )
+            if not seen
+        ]
+        return await asyncio.to_thread(queue_rescan, entries)
+    
+    def release_file_buffers(self) -> None:
+        """
+        Closes the downloaded buffers, removing any spilled temp files. While
+        checks of a cancelled pipeline still run, the last one to finish
+        closes them instead.
+        """
+        with self._checks_lock:
+            if self._running_checks:
+                self._release_pending = True
+                app_logger.info(f"Deferring buffer release for user '{self.userid}' until {len(self._running_checks)} running checks finish")
+                return
+        self._close_file_buffers()
+
+    def _close_file_buffers(self) -> None:
+        for file_buffer in self._file_buffers or []:
+            file_buffer.close()
+        self._file_buffers = None
+        for sanitized_buffer in self._sanitized_buffers.values():
+            sanitized_buffer.close()
+        self._sanitized_buffers = {}
@@ -6,12 +6,17 @@ from datetime import timedelta
 from models.quarantine_file_store import QuarantineFileStore
 from config.settings import settings
 from config.minio_config import minio_client
-from exceptions import MinIOException, QuarantineFileStoreException
+from exceptions import MinIOException, QuarantineFileStoreException, DependencyUnavailableException
 
-from .minio_service import generate_presigned_upload_url_minio
+from .minio_service import generate_presigned_upload_url_minio, presign_get_objects, object_exists, call_minio
+from .presigned_url_cache import presigned_url_cache
+from .object_compression import ORIGINAL_SIZE_METADATA, ZSTD_ENCODING, accepts_encoding, decompressed_chunks, download_url, is_compressed_object, object_encoding
+from minio.error import S3Error
+from .image_derivatives import derivative_object_name
 from fastapi.concurrency import run_in_threadpool
-from typing import List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 import asyncio
+import time
 
 class QuarantineFileStoreService(QuarantineFileStore):
     
@@ -50,14 +55,91 @@ class QuarantineFileStoreService(QuarantineFileStore):
         except Exception as e:
             raise QuarantineFileStoreException("Failed to generate presigned **UPLOAD URL** for MinIO", e)
         
-    def generate_presigned_download_url_minio(self, expires: timedelta = timedelta(minutes = 10)):
-        object_name = f'{self.userid}/{self.filename}'
+    def generate_presigned_download_url_minio(self, filename: str) -> str:
+        bucket_name = settings.MINIO_QUARANTINE_BUCKET.lower().replace("_", "-")
+        object_name = f'{self.userid}/{filename}'
+        cached = presigned_url_cache.get_many(bucket_name, [object_name])
+        if object_name in cached:
+            return cached[object_name]
+        signed_at = time.time()
+        urls = presign_get_objects(bucket_name, [object_name], timedelta(seconds=settings.PRESIGNED_URL_EXPIRES))
+        return presigned_url_cache.put_many(bucket_name, urls, signed_at)[object_name]
+    
+    async def get_download_urls(self, size: Optional[str] = None) -> Dict[str, Optional[str]]:
+        """
+        GET URLs for released objects of the user, `self.filenames` being their
+        hashed filenames, or for their `size` derivatives. Cached URLs are
+        reused; a missing derivative maps to None.
+        """
+        if not self.filenames or not self.userid:
+            raise QuarantineFileStoreException("Filenames and User ID must be provided")
+        
+        if len(self.filenames) > settings.PRESIGNED_BULK_MAX_OBJECTS:
+            raise QuarantineFileStoreException(f"Maximum {settings.PRESIGNED_BULK_MAX_OBJECTS} files are allowed per request")
+        
+        if not all(isinstance(filename, str) for filename in self.filenames):
+            raise QuarantineFileStoreException("All filenames must be strings")
+        
+        object_names = {
+            filename: derivative_object_name(filename, size) if size else filename
+            for filename in self.filenames
+        }
+        # Compressed objects are served through /file/download, which negotiates the encoding
+        urls = {object_name: download_url(self.userid, object_name) for object_name in object_names.values() if is_compressed_object(object_name)}
         try:
-            url = minio_client.presigned_get_object(
-                bucket_name= settings.MINIO_QUARANTINE_BUCKET.lower().replace("_", "-"), 
-                object_name=object_name, 
-                expires=expires
-            ) 
-            return url 
-        except Exception as e: 
-           raise MinIOException("Failed to generate presigned **DOWNLOAD URL** for MinIO", e)
\ No newline at end of file
+            urls.update(await asyncio.to_thread(
+                presigned_url_cache.get_many, self.userid, [object_name for object_name in object_names.values() if object_name not in urls]
+            ))
+            missing = [object_name for object_name in object_names.values() if object_name not in urls]
+            if size and missing:
+                # Originals exist once released, derivatives only for images
+                exists = await asyncio.gather(*(call_minio(object_exists, self.userid, object_name) for object_name in missing))
+                missing = [object_name for object_name, found in zip(missing, exists) if found]
+            if missing:
+                signed_at = time.time()
+                signed = await asyncio.to_thread(presign_get_objects, self.userid, missing, timedelta(seconds=settings.PRESIGNED_URL_EXPIRES))
+                urls.update(await asyncio.to_thread(presigned_url_cache.put_many, self.userid, signed, signed_at))
+            return {filename: urls.get(object_name) for filename, object_name in object_names.items()}
+        except (MinIOException, DependencyUnavailableException) as e:
+            raise e
+        except Exception as e:
+            raise QuarantineFileStoreException("Failed to generate presigned **DOWNLOAD URL** for MinIO", e)
+    
+    async def open_download(self, filename: str, accept_encoding: Optional[str] = None) -> Optional[Tuple[Iterator[bytes], Dict[str, str]]]:
+        """
+        Opens a released object of the user, `filename` being its hashed
+        filename, as body chunks and response headers. A zstd-compressed
+        object is passed through with its Content-Encoding when the client
+        accepts zstd and decompressed while streamed otherwise. None if the
+        object does not exist.
+        """
+        try:
+            response = await call_minio(minio_client.get_object, self.userid, filename)
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchBucket"):
+                return None
+            raise MinIOException("Failed to download the object from MinIO", e)
+        
+        headers = {"Content-Type": response.headers.get("Content-Type", "application/octet-stream")}
+        encoding = object_encoding(response.headers)
+        # Raw bytes as stored, urllib3 would otherwise decode the Content-Encoding itself
+        raw_chunks = response.stream(settings.DOWNLOAD_CHUNK_SIZE, decode_content=False)
+        if encoding == ZSTD_ENCODING and not accepts_encoding(accept_encoding, ZSTD_ENCODING):
+            chunks = decompressed_chunks(raw_chunks)
+            original_size = response.headers.get(f"x-amz-meta-{ORIGINAL_SIZE_METADATA}")
+            if original_size:
+                headers["Content-Length"] = original_size
+        else:
+            chunks = raw_chunks
+            if encoding:
+                headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = response.headers.get("Content-Length")
+        headers["Vary"] = "Accept-Encoding"
+        
+        def body() -> Iterator[bytes]:
+            try:
+                yield from chunks
+            finally:
+                response.close()
+                response.release_conn()
+        return body(), {name: value for name, value in headers.items() if value is not None}
@@ -0,0 +1,171 @@
+import os
+import socket
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from minio.commonconfig import ENABLED, Filter
+from minio.deleteobjects import DeleteObject
+from minio.lifecycleconfig import AbortIncompleteMultipartUpload, Expiration, LifecycleConfig, Rule
+
+from config.settings import settings
+from config.minio_config import minio_client
+from config.redis_config import pool, get_redis_pool
+from services.metrics import registry
+from services.minio_service import buckets_ready
+from logs import get_app_logger, get_error_logger
+
+app_logger = get_app_logger()
+error_logger = get_error_logger()
+
+JANITOR_LOCK_KEY = "quarantine-janitor:lock"
+
+quarantine_deleted_total = registry.gauge("files_backend_quarantine_deleted_total", "Quarantine objects deleted, by reason (released, abandoned)")
+
+
+def _quarantine_bucket() -> str:
+    return settings.MINIO_QUARANTINE_BUCKET.lower().replace("_", "-")
+
+
+def remove_quarantine_objects(object_names: List[str]) -> int:
+    """
+    Deletes up to QUARANTINE_DELETE_BATCH_SIZE objects per multi-object
+    delete request. Returns how many were deleted; failures are logged and
+    left to the next sweep.
+    """
+    deleted = 0
+    batch_size = settings.QUARANTINE_DELETE_BATCH_SIZE
+    for offset in range(0, len(object_names), batch_size):
+        batch = object_names[offset:offset + batch_size]
+        # remove_objects is lazy, the request is only sent while its errors are iterated
+        errors = [
+            error for error in minio_client.remove_objects(_quarantine_bucket(), [DeleteObject(name) for name in batch])
+            if error.code != "NoSuchKey"
+        ]
+        for error in errors:
+            error_logger.error(f"Failed to delete quarantine object '{error.name}' => {error.code}: {error.message}")
+        deleted += len(batch) - len(errors)
+    return deleted
+
+
+class QuarantineDeleteBatcher:
+    """
+    Collects the quarantine objects released files leave behind and deletes
+    them every QUARANTINE_DELETE_FLUSH_INTERVAL seconds in one request,
+    instead of one `remove_object` per file. Objects still queued when a
+    pod dies are picked up by the janitor.
+    """
+
+    def __init__(self):
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        registry.gauge("files_backend_quarantine_pending_deletes", "Released quarantine objects waiting for the next batch delete", lambda: len(self._pending))
+
+    def enqueue(self, object_name: str) -> None:
+        with self._lock:
+            self._pending.append(object_name)
+
+    async def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            deleted = await asyncio.to_thread(remove_quarantine_objects, pending)
+            quarantine_deleted_total.inc(deleted, reason="released")
+        except Exception as e:
+            error_logger.error(f"Batch delete of {len(pending)} quarantine objects failed, the janitor will retry => {str(e)}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.QUARANTINE_DELETE_FLUSH_INTERVAL)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+class QuarantineJanitor:
+    """
+    Deletes quarantine objects that were uploaded but never checked.
+
+    Every QUARANTINE_JANITOR_INTERVAL seconds the pod that wins a Redis
+    lease lists the quarantine bucket and batch-deletes objects older than
+    QUARANTINE_TTL. The lease is never released, it expires with the
+    interval, so there is one sweep per interval across all pods. A bucket
+    lifecycle rule expires whatever the janitor misses and aborts
+    incomplete multipart uploads of streamed uploads.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def install_lifecycle(self) -> None:
+        minio_client.set_bucket_lifecycle(
+            _quarantine_bucket(),
+            LifecycleConfig([
+                Rule(
+                    ENABLED,
+                    rule_filter=Filter(prefix=""),
+                    rule_id="quarantine-expiry",
+                    expiration=Expiration(days=settings.QUARANTINE_LIFECYCLE_DAYS),
+                    abort_incomplete_multipart_upload=AbortIncompleteMultipartUpload(days_after_initiation=1),
+                ),
+            ]),
+        )
+        app_logger.info(f"Installed lifecycle rule on {_quarantine_bucket()}: expire after {settings.QUARANTINE_LIFECYCLE_DAYS} days")
+
+    def _acquire_lease(self) -> bool:
+        lease_ms = int(settings.QUARANTINE_JANITOR_INTERVAL * 1000)
+        return bool(get_redis_pool(pool).set(JANITOR_LOCK_KEY, self._owner, nx=True, px=lease_ms))
+
+    def sweep(self) -> int:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.QUARANTINE_TTL)
+        abandoned = [
+            obj.object_name
+            for obj in minio_client.list_objects(_quarantine_bucket(), recursive=True)
+            if obj.last_modified is not None and obj.last_modified < cutoff
+        ]
+        deleted = remove_quarantine_objects(abandoned) if abandoned else 0
+        quarantine_deleted_total.inc(deleted, reason="abandoned")
+        app_logger.info(f"Quarantine janitor deleted {deleted} of {len(abandoned)} objects older than {settings.QUARANTINE_TTL}s")
+        return deleted
+
+    async def _run(self) -> None:
+        await buckets_ready.wait()
+        try:
+            await asyncio.to_thread(self.install_lifecycle)
+        except Exception as e:
+            error_logger.error(f"Failed to install the quarantine lifecycle rule => {str(e)}")
+        while True:
+            try:
+                if await asyncio.to_thread(self._acquire_lease):
+                    await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                error_logger.error(f"Quarantine janitor sweep failed => {str(e)}")
+            await asyncio.sleep(settings.QUARANTINE_JANITOR_INTERVAL)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+quarantine_deletes = QuarantineDeleteBatcher()
+quarantine_janitor = QuarantineJanitor()
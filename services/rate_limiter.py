@@ -0,0 +1,100 @@
+import math
+import asyncio
+import redis
+from dataclasses import dataclass
+
+from config.settings import settings
+from config.redis_config import pool, get_redis_pool
+from exceptions import AdmissionControlException
+from services.metrics import registry
+from logs import get_app_logger, get_error_logger
+
+app_logger = get_app_logger()
+error_logger = get_error_logger()
+
+rate_limited_total = registry.gauge("files_backend_rate_limited_total", "Requests rejected by the per-user rate limit, per route")
+
+# Refills and takes `cost` tokens atomically, on Redis' clock so every pod agrees.
+# KEYS[1] bucket hash; ARGV rate (tokens/s), burst, cost.
+# Returns {allowed, tokens left (floored), milliseconds until `cost` tokens are available}.
+TOKEN_BUCKET_SCRIPT = """
+-- TIME needs effects replication: the default since Redis 5, opt-in before
+if redis.replicate_commands then redis.replicate_commands() end
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate / 1000)
+
+local allowed = 0
+local wait_ms = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait_ms = math.ceil((cost - tokens) * 1000 / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return {allowed, math.floor(tokens), wait_ms}
+"""
+
+
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    remaining: int
+    retry_after: int # in seconds
+
+
+class RateLimiter:
+    """
+    Per-user token buckets kept in Redis, so the limits hold across pods.
+
+    Each route in RATE_LIMITS has its own bucket per userid: `burst` tokens,
+    refilled at `rate` tokens per second. A decision is one EVALSHA round
+    trip. When Redis is unavailable requests are let through, the scheduler
+    and the memory budget still bound the load.
+    """
+
+    def __init__(self, limits: dict):
+        self.limits = limits
+        self._script = get_redis_pool(pool).register_script(TOKEN_BUCKET_SCRIPT)
+
+    def _take(self, route: str, userid: str, cost: int) -> RateLimitDecision:
+        limit = self.limits[route]
+        allowed, remaining, wait_ms = self._script(
+            keys=[f"ratelimit:{route}:{userid}"],
+            args=[limit["rate"], limit["burst"], cost],
+        )
+        return RateLimitDecision(bool(allowed), int(remaining), math.ceil(int(wait_ms) / 1000))
+
+    async def check(self, route: str, userid: str, cost: int = 1) -> RateLimitDecision:
+        """Takes `cost` tokens from the user's bucket, raising `AdmissionControlException` when there are not enough."""
+        if not settings.RATE_LIMIT_ENABLED or route not in self.limits:
+            return RateLimitDecision(True, -1, 0)
+        # A batch larger than the bucket would never fit, it takes the whole bucket instead
+        cost = min(cost, self.limits[route]["burst"])
+        try:
+            decision = await asyncio.to_thread(self._take, route, userid, cost)
+        except redis.RedisError as e:
+            error_logger.error(f"Rate limit check failed for user: {userid}, route: {route}, letting it through => {str(e)}")
+            return RateLimitDecision(True, -1, 0)
+
+        if not decision.allowed:
+            rate_limited_total.inc(route=route)
+            app_logger.warning(f"Rate limited user: {userid} on {route}, retry after {decision.retry_after}s")
+            raise AdmissionControlException(
+                f"Rate limit for {route} exceeded, retry after {decision.retry_after}s",
+                retry_after=min(max(decision.retry_after, 1), settings.RATE_LIMIT_MAX_RETRY_AFTER),
+            )
+        return decision
+
+
+rate_limiter = RateLimiter(settings.RATE_LIMITS)
@@ -0,0 +1,80 @@
+import json
+import time
+import redis
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+from config.settings import settings
+from config.redis_config import pool, get_redis_pool
+from logs import get_app_logger, get_error_logger
+
+app_logger = get_app_logger()
+error_logger = get_error_logger()
+
+
+@dataclass
+class RescanEntry:
+    userid: str
+    hashed_filename: str
+    # Needed to record the verdict in the fuzzy hash index once the lookup ran
+    fuzzy_hash: Optional[str] = None
+    file_type: str = ""
+
+    @property
+    def member(self) -> str:
+        return f"{self.userid}/{self.hashed_filename}"
+
+
+def _details_key() -> str:
+    return f"{settings.VIRUSTOTAL_RESCAN_KEY}:files"
+
+
+def queue_rescan(entries: List[RescanEntry]) -> bool:
+    """
+    Queues released files whose VirusTotal lookup was skipped while its
+    circuit was open, as `<userid>/<hashed filename>` members of a sorted
+    set scored by when they are due, plus a hash with their details.
+    Queuing a file again keeps its first score.
+    """
+    if not entries:
+        return True
+    try:
+        now = time.time()
+        pipeline = get_redis_pool(pool).pipeline(transaction=True)
+        pipeline.zadd(settings.VIRUSTOTAL_RESCAN_KEY, {entry.member: now for entry in entries}, nx=True)
+        pipeline.hset(_details_key(), mapping={entry.member: json.dumps(asdict(entry)) for entry in entries})
+        pipeline.execute()
+        app_logger.info(f"Queued {len(entries)} files for a VirusTotal rescan")
+        return True
+    except redis.RedisError as e:
+        error_logger.error(f"Failed to queue {[entry.member for entry in entries]} for a VirusTotal rescan => {str(e)}")
+        return False
+
+
+def due_rescans(limit: int) -> List[RescanEntry]:
+    """Up to `limit` queued files that are due, oldest first. They stay queued until `complete_rescan`."""
+    redis_client = get_redis_pool(pool)
+    members = redis_client.zrangebyscore(settings.VIRUSTOTAL_RESCAN_KEY, "-inf", time.time(), start=0, num=limit)
+    if not members:
+        return []
+    details = redis_client.hmget(_details_key(), members)
+    entries = []
+    for member, detail in zip(members, details):
+        if detail is not None:
+            entries.append(RescanEntry(**json.loads(detail)))
+        else:
+            # Queued without details, the verdict cannot go into the fuzzy hash index
+            userid, hashed_filename = member.decode("utf-8").split("/", 1)
+            entries.append(RescanEntry(userid, hashed_filename))
+    return entries
+
+
+def reschedule_rescan(entry: RescanEntry, delay: float) -> None:
+    get_redis_pool(pool).zadd(settings.VIRUSTOTAL_RESCAN_KEY, {entry.member: time.time() + delay}, xx=True)
+
+
+def complete_rescan(entry: RescanEntry) -> None:
+    pipeline = get_redis_pool(pool).pipeline(transaction=True)
+    pipeline.zrem(settings.VIRUSTOTAL_RESCAN_KEY, entry.member)
+    pipeline.hdel(_details_key(), entry.member)
+    pipeline.execute()
@@ -0,0 +1,192 @@
+import os
+from concurrent.futures import wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+from exceptions import QuarantineFileCheckException
+from services.deadline import remaining_timeout
+from services.file_buffer import FileBuffer
+from services.pattern_engine import PatternEngine
+from services.process_pool import submit
+from services.text_decoding import TextDecoder
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def luhn_valid(value: str) -> bool:
+    digits = [int(char) for char in value if char.isdigit()]
+    checksum = 0
+    for index, digit in enumerate(reversed(digits)):
+        if index % 2 == 1:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        checksum += digit
+    return len(digits) >= 13 and checksum % 10 == 0
+
+
+_VERHOEFF_D = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9], [1, 2, 3, 4, 0, 6, 7, 8, 9, 5], [2, 3, 4, 0, 1, 7, 8, 9, 5, 6],
+    [3, 4, 0, 1, 2, 8, 9, 5, 6, 7], [4, 0, 1, 2, 3, 9, 5, 6, 7, 8], [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
+    [6, 5, 9, 8, 7, 1, 0, 4, 3, 2], [7, 6, 5, 9, 8, 2, 1, 0, 4, 3], [8, 7, 6, 5, 9, 3, 2, 1, 0, 4],
+    [9, 8, 7, 6, 5, 4, 3, 2, 1, 0],
+]
+_VERHOEFF_P = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9], [1, 5, 7, 6, 2, 8, 3, 0, 9, 4], [5, 8, 0, 3, 7, 9, 6, 1, 4, 2],
+    [8, 9, 1, 6, 0, 4, 3, 5, 2, 7], [9, 4, 5, 3, 1, 2, 6, 8, 7, 0], [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
+    [2, 7, 9, 3, 8, 0, 6, 4, 1, 5], [7, 0, 4, 6, 9, 1, 3, 2, 5, 8],
+]
+
+
+def verhoeff_valid(value: str) -> bool:
+    """Checksum used by Aadhaar numbers."""
+    checksum = 0
+    for index, char in enumerate(reversed([char for char in value if char.isdigit()])):
+        checksum = _VERHOEFF_D[checksum][_VERHOEFF_P[index % 8][int(char)]]
+    return checksum == 0
+
+
+_VIN_TRANSLITERATION = {
+    **{str(digit): digit for digit in range(10)},
+    "A": 1, "B": 2, "C": 3, "D": 4, "E": 5, "F": 6, "G": 7, "H": 8,
+    "J": 1, "K": 2, "L": 3, "M": 4, "N": 5, "P": 7, "R": 9,
+    "S": 2, "T": 3, "U": 4, "V": 5, "W": 6, "X": 7, "Y": 8, "Z": 9,
+}
+_VIN_WEIGHTS = [8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2]
+
+
+def vin_valid(value: str) -> bool:
+    """ISO 3779 check digit (position 9), mandatory for North American VINs."""
+    if value.isdigit() or value.isalpha():
+        return False
+    total = sum(_VIN_TRANSLITERATION[char] * weight for char, weight in zip(value, _VIN_WEIGHTS))
+    check_digit = "X" if total % 11 == 10 else str(total % 11)
+    return value[8] == check_digit
+
+
+# Order matters: the first alternative that matches at a position wins
+PII_PATTERNS = {
+    "email": r"\b[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}\b",
+    "card_number": r"\b\d(?:[ \-]?\d){12,18}\b",
+    "us_ssn": r"\b(?!000|666|9\d\d)\d{3}-(?!00)\d{2}-(?!0000)\d{4}\b",
+    "aadhaar": r"\b[2-9]\d{3}[ \-]?\d{4}[ \-]?\d{4}\b",
+    "india_pan": r"\b[A-Z]{5}\d{4}[A-Z]\b",
+    "vin": r"\b[A-HJ-NPR-Z0-9]{17}\b",
+    # A country code, a parenthesised area code or separators between the groups: bare digit runs are ids and timestamps
+    "phone_number": (
+        r"(?<![\w+])(?:"
+        r"\+\d{1,3}[ .\-]?(?:\(\d{2,4}\)|\d{2,4})[ .\-]?\d{3,4}[ .\-]?\d{4}"
+        r"|\(\d{2,4}\)[ .\-]?\d{3,4}[ .\-]?\d{4}"
+        r"|\d{2,4}[ .\-]\d{3,4}[ .\-]\d{4}"
+        r")\b"
+    ),
+}
+
+pii_engine = PatternEngine(
+    PII_PATTERNS,
+    validators={"card_number": luhn_valid, "aadhaar": verhoeff_valid, "vin": vin_valid},
+)
+
+
+def redact(text: str) -> Tuple[str, Dict[str, int]]:
+    """Replaces every PII match with a typed placeholder in a single pass over the text."""
+    pieces: List[str] = []
+    counts: Dict[str, int] = {}
+    position = 0
+    for match in pii_engine.finditer(text):
+        pieces.append(text[position:match.start])
+        pieces.append(f"[REDACTED_{match.name.upper()}]")
+        counts[match.name] = counts.get(match.name, 0) + 1
+        position = match.end
+    pieces.append(text[position:])
+    return "".join(pieces), counts
+
+
+def _merge_counts(total: Dict[str, int], counts: Dict[str, int]) -> None:
+    for name, count in counts.items():
+        total[name] = total.get(name, 0) + count
+
+
+def scan_pdf_pages(source, first_page: int, last_page: int) -> Tuple[List[str], Dict[str, int]]:
+    """Worker entry point: extracts and redacts a batch of pages. `source` is a path or the PDF bytes."""
+    import fitz
+
+    document = fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")
+    redacted_pages, counts = [], {}
+    with document:
+        for page_number in range(first_page, min(last_page, document.page_count)):
+            redacted, page_counts = redact(document[page_number].get_text("text"))
+            redacted_pages.append(redacted)
+            _merge_counts(counts, page_counts)
+    return redacted_pages, counts
+
+
+@dataclass
+class SensitiveInfoResult:
+    filename: str
+    counts: Dict[str, int] = field(default_factory=dict)
+    anonymized_content: Optional[str] = None
+
+    @property
+    def has_sensitive_info(self) -> bool:
+        return bool(self.counts)
+
+
+def _detect_in_pdf(file_buffer: FileBuffer, result: SensitiveInfoResult) -> List[str]:
+    # PyMuPDF is only needed for PDFs, text files are scanned without it
+    import fitz
+
+    # Spilled files are opened by path in the workers, small ones are shipped as bytes
+    source = file_buffer.name if file_buffer.is_spilled else file_buffer.view().tobytes()
+    with (fitz.open(source) if isinstance(source, str) else fitz.open(stream=source, filetype="pdf")) as document:
+        page_count = document.page_count
+
+    batches = [
+        (first_page, first_page + settings.PII_PAGE_BATCH_SIZE)
+        for first_page in range(0, page_count, settings.PII_PAGE_BATCH_SIZE)
+    ]
+    if page_count < settings.PII_PARALLEL_MIN_PAGES:
+        batch_results = [scan_pdf_pages(source, first_page, last_page) for first_page, last_page in batches]
+    else:
+        futures = [submit(scan_pdf_pages, source, first_page, last_page) for first_page, last_page in batches]
+        _, pending = wait(futures, timeout=remaining_timeout(settings.PII_TIMEOUT))
+        if pending:
+            for future in pending:
+                future.cancel()
+            raise QuarantineFileCheckException(f"Timeout while detecting sensitive info in {result.filename}")
+        batch_results = [future.result() for future in futures]
+
+    pages = []
+    for redacted_pages, counts in batch_results:
+        pages.extend(redacted_pages)
+        _merge_counts(result.counts, counts)
+    return pages
+
+
+def _detect_in_text(file_buffer: FileBuffer, result: SensitiveInfoResult) -> List[str]:
+    # Decoded like the text check does, so UTF-16/32 and cp1252 files are matched too
+    text = "".join(TextDecoder(file_buffer, strict=False))
+    redacted, counts = redact(text)
+    _merge_counts(result.counts, counts)
+    return [redacted]
+
+
+def detect_sensitive_info(file_buffer: FileBuffer, filename: str) -> Optional[SensitiveInfoResult]:
+    """Finds PII in PDFs and text files and builds their anonymized text; None for other types."""
+    file_extension = os.path.splitext(filename)[-1].lower().lstrip('.')
+    result = SensitiveInfoResult(filename)
+
+    if file_extension in settings.PDF_EXTENSIONS:
+        pages = _detect_in_pdf(file_buffer, result)
+    elif file_extension in settings.SOURCE_CODE_EXTENSIONS:
+        pages = _detect_in_text(file_buffer, result)
+    else:
+        return None
+
+    result.anonymized_content = "\n\f".join(pages)[:settings.PII_MAX_ANONYMIZED_CHARS]
+    if result.has_sensitive_info:
+        logger.info(f"Sensitive info detected in {filename}: {result.counts}")
+    return result
@@ -1,13 +1,61 @@
-from services.image_quarantine_check_service import ImageQuarantineCheckService
-from services.pdf_quarantine_check_service import PDFQuarantineCheckService
+import time
+from importlib import import_module
 
 from fastapi import UploadFile
 from config.settings import settings
 from exceptions import QuarantineFileCheckException
-from typing import List
+from services.metrics import registry
+from services.type_scheduler import type_scheduler
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from logs import get_app_logger
+
+app_logger = get_app_logger()
+
+T = TypeVar("T")
+
+# Engines are imported on first use, so starting the app does not load fitz, pikepdf, pdfid, PIL, pyarrow, vt and libmagic
+# Keyed by file type, which is also the scheduler lane of the type
+ENGINES = {
+    "image": "services.image_quarantine_check_service:ImageQuarantineCheckService",
+    "pdf": "services.pdf_quarantine_check_service:PDFQuarantineCheckService",
+    "tabular": "services.tabular_quarantine_check_service:TabularQuarantineCheckService",
+    "source_code": "services.text_quarantine_check_service:TextQuarantineCheckService",
+}
+
+engine_load_seconds = registry.gauge("files_backend_engine_load_seconds", "Time it took to import each check engine")
+
+_engines: Dict[str, type] = {}
+
 
 class ServiceFactory:
     
+    @staticmethod
+    def load_engine(kind: str) -> type:
+        engine = _engines.get(kind)
+        if engine is None:
+            # import_module is thread-safe, a concurrent first use waits for the same import
+            module_name, class_name = ENGINES[kind].split(":")
+            started_at = time.perf_counter()
+            engine = _engines[kind] = getattr(import_module(module_name), class_name)
+            elapsed = time.perf_counter() - started_at
+            engine_load_seconds.set(elapsed, engine=class_name)
+            app_logger.info(f"Loaded {class_name} in {elapsed:.3f}s")
+        return engine
+    
+    @staticmethod
+    def warm_up() -> None:
+        """Loads every engine and the data its libraries read lazily, so no request pays for it."""
+        for kind in ENGINES:
+            ServiceFactory.load_engine(kind)
+        from PIL import Image
+        from services.mime_detector import detect_mime
+        from services.file_buffer import FileBuffer
+        # Pillow registers its format plugins on first use; the first libmagic handle loads the database into the pool
+        Image.init()
+        with FileBuffer.from_bytes(b"\x00") as file_buffer:
+            detect_mime(file_buffer)
+    
     @staticmethod
     def extract_attachments(filenames: List[str]) -> dict:
         image_types = settings.IMAGE_EXTENSIONS
@@ -50,20 +98,28 @@ class ServiceFactory:
 
     
     @classmethod
-    def create_service(cls,
-                        query: str, 
-                        urls: List[str], 
-                        filenames: List[str], 
-                        userid: str, 
-                        timeout: int = 30,):
-        
+    def route(cls, filenames: List[str]) -> str:
+        """File type of the files, which picks both the engine and the scheduler lane."""
         attachments_validation = ServiceFactory.extract_attachments(filenames)
         if attachments_validation["others"] or not attachments_validation["validate_lists"]:
             print("Invalid file type or multiple file types detected")
             raise QuarantineFileCheckException("Invalid file type or multiple file types detected")
         
-        if attachments_validation.get("is_image"):
-            return ImageQuarantineCheckService(query, urls, filenames, userid, timeout)
+        return next(kind for kind in ENGINES if attachments_validation.get(f"is_{kind}"))
+    
+    @classmethod
+    def create_service(cls,
+                        query: str, 
+                        urls: List[str], 
+                        filenames: List[str], 
+                        userid: str, 
+                        timeout: int = 30,
+                        kind: Optional[str] = None):
         
-        if attachments_validation.get("is_pdf"):
-            return PDFQuarantineCheckService(query, urls, filenames, userid, timeout)
\ No newline at end of file
+        kind = kind or ServiceFactory.route(filenames)
+        return ServiceFactory.load_engine(kind)(query, urls, filenames, userid, timeout)
+    
+    @staticmethod
+    async def schedule(kind: str, userid: str, work: Callable[[], Awaitable[T]]) -> T:
+        """Runs a check of the given file type in its lane of the type scheduler, queued fairly among users."""
+        return await type_scheduler.run(kind, work, userid)
@@ -0,0 +1,291 @@
+from models.tabular_quarantine_check import TabularQuarantineCheck
+from typing import Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, field
+
+import os
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+from exceptions import TabularFileCheckException
+from services.quarantine_file_check_service import QuarantineFileCheckService
+from services.file_buffer import FileBuffer
+from services.deadline import remaining_timeout
+from services.decompression_analyzer import analyze_zip
+from config.settings import settings
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import logging
+
+try:
+    import xlrd
+except ImportError:  # legacy .xls support is optional
+    xlrd = None
+
+logger = logging.getLogger(__name__)
+
+# Leading characters that make spreadsheet applications evaluate a cell (OWASP CSV injection)
+FORMULA_TRIGGER_PATTERN = r"^[=+\-@\t\r]"
+# Plain signed numbers also start with +/-, they are not formulas
+NUMERIC_PATTERN = r"^[+\-]?[0-9][0-9.,eE+\-]*$"
+PARQUET_CONTENT_TYPE = "application/vnd.apache.parquet"
+
+
+@dataclass
+class TabularCheckResult:
+    filename: str
+    file_size: Optional[float] = None
+    rows: int = 0
+    columns: int = 0
+    formula_injection_cells: Dict[str, int] = field(default_factory=dict)
+
+
+class TabularQuarantineCheckService(TabularQuarantineCheck, QuarantineFileCheckService):
+
+    release_requires_scan = True
+
+    def __init__(self,
+                 query: str,
+                 urls: List[str],
+                 filenames: List[str],
+                 userid: str,
+                 timeout: int = 30,
+                 max_workers: int = 4,
+            ):
+
+        super().__init__(query, urls, filenames, userid, timeout)
+        self.max_workers = max_workers
+        self._parquet_buffers: Dict[str, FileBuffer] = {}
+
+    #-------------------------------------------------------------------------------------------------
+    #                                       Parsing
+    #-------------------------------------------------------------------------------------------------
+
+    def _iter_csv(self, file_buffer: FileBuffer, as_strings: bool = False) -> Iterator[pa.RecordBatch]:
+        read_options = pa_csv.ReadOptions(block_size=settings.TABULAR_BLOCK_SIZE)
+        convert_options = None
+        if as_strings:
+            names = pa_csv.open_csv(file_buffer.open(), read_options=read_options).schema.names
+            convert_options = pa_csv.ConvertOptions(column_types={name: pa.string() for name in names})
+        yield from pa_csv.open_csv(file_buffer.open(), read_options=read_options, convert_options=convert_options)
+
+    def _iter_rows_as_batches(self, rows: Iterator[tuple]) -> Iterator[pa.RecordBatch]:
+        """Groups spreadsheet rows (first row is the header) into string-typed record batches."""
+        header = next(rows, None)
+        if header is None:
+            return
+        names = [str(name) if name is not None else f"column_{index}" for index, name in enumerate(header)]
+        schema = pa.schema([(name, pa.string()) for name in names])
+
+        batch = []
+        for row in rows:
+            batch.append([None if value is None else str(value) for value in row[:len(names)]])
+            if len(batch) >= settings.TABULAR_BATCH_ROWS:
+                yield pa.RecordBatch.from_pylist([dict(zip(names, values)) for values in batch], schema=schema)
+                batch = []
+        if batch:
+            yield pa.RecordBatch.from_pylist([dict(zip(names, values)) for values in batch], schema=schema)
+
+    def _iter_xlsx(self, file_buffer: FileBuffer) -> Iterator[pa.RecordBatch]:
+        # Sheet XML compresses extremely well, bound the inflated size before openpyxl expands it
+        report = analyze_zip(file_buffer)
+        if report.exceeded:
+            raise TabularFileCheckException(f"Decompression bomb detected - {report.exceeded}", malicious=True)
+        # read_only streams the sheet XML; data_only=False keeps formulas as "=..." strings
+        workbook = load_workbook(file_buffer.open(), read_only=True, data_only=False)
+        try:
+            for worksheet in workbook.worksheets[1:]:
+                # Only the first sheet is normalized, the others are still scanned
+                for batch in self._iter_rows_as_batches(worksheet.iter_rows(values_only=True)):
+                    self._raise_on_injection(batch, f"sheet '{worksheet.title}'")
+            yield from self._iter_rows_as_batches(workbook.worksheets[0].iter_rows(values_only=True))
+        finally:
+            workbook.close()
+
+    def _iter_xls(self, file_buffer: FileBuffer) -> Iterator[pa.RecordBatch]:
+        if xlrd is None:
+            raise TabularFileCheckException("Legacy .xls files are not supported, install the 'xls' extra (xlrd)")
+        if file_buffer.is_spilled:
+            # xlrd maps the file itself, the workbook is never copied into memory
+            workbook = xlrd.open_workbook(filename=file_buffer.name, on_demand=True)
+        else:
+            # xlrd needs bytes, not a memoryview; in-memory buffers are at most FILE_BUFFER_SPOOL_SIZE
+            workbook = xlrd.open_workbook(file_contents=file_buffer.view().tobytes(), on_demand=True)
+        try:
+            sheet = workbook.sheet_by_index(0)
+            yield from self._iter_rows_as_batches(iter(sheet.row_values(index) for index in range(sheet.nrows)))
+        finally:
+            workbook.release_resources()
+
+    def iter_record_batches(self, file_buffer: FileBuffer, filename: str) -> Iterator[pa.RecordBatch]:
+        file_extension = os.path.splitext(filename)[-1].lower().lstrip('.')
+        if file_extension == "csv":
+            return self._iter_csv(file_buffer)
+        if file_extension == "xlsx":
+            return self._iter_xlsx(file_buffer)
+        if file_extension == "xls":
+            return self._iter_xls(file_buffer)
+        if file_extension == "parquet":
+            return pq.ParquetFile(file_buffer.open()).iter_batches(batch_size=settings.TABULAR_BATCH_ROWS)
+        raise TabularFileCheckException(f"Unsupported tabular file type: {file_extension}")
+
+    #-------------------------------------------------------------------------------------------------
+    #                                       Checks
+    #-------------------------------------------------------------------------------------------------
+
+    def detect_formula_injection(self, record_batch: pa.RecordBatch) -> Dict[str, pa.Array]:
+        """Boolean mask per string column, computed with vectorized Arrow kernels."""
+        masks = {}
+        for name, column in zip(record_batch.schema.names, record_batch.columns):
+            if not (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+                continue
+            mask = pc.and_(
+                pc.match_substring_regex(column, FORMULA_TRIGGER_PATTERN),
+                pc.invert(pc.match_substring_regex(column, NUMERIC_PATTERN)),
+            )
+            mask = pc.fill_null(mask, False)
+            if pc.any(mask).as_py():
+                masks[name] = mask
+        return masks
+
+    def _raise_on_injection(self, record_batch: pa.RecordBatch, location: str) -> None:
+        masks = self.detect_formula_injection(record_batch)
+        if masks and settings.TABULAR_FORMULA_INJECTION_ACTION == "reject":
+            raise TabularFileCheckException(f"Formula injection detected in {location}, columns: {list(masks)}", malicious=True)
+
+    def _neutralize(self, record_batch: pa.RecordBatch, masks: Dict[str, pa.Array]) -> pa.RecordBatch:
+        """Prefixes flagged cells with a quote so spreadsheet apps treat them as text."""
+        columns = []
+        for name, column in zip(record_batch.schema.names, record_batch.columns):
+            if name in masks:
+                column = pc.if_else(masks[name], pc.binary_join_element_wise("'", column, ""), column)
+            columns.append(column)
+        return pa.RecordBatch.from_arrays(columns, schema=record_batch.schema)
+
+    def _normalize(self, record_batches: Iterator[pa.RecordBatch], filename: str, result: TabularCheckResult) -> FileBuffer:
+        """Scans each batch and streams it into a Parquet file, holding one batch in memory at a time."""
+        parquet_buffer = FileBuffer()
+        writer = None
+        try:
+            for record_batch in record_batches:
+                if record_batch.num_columns > settings.TABULAR_MAX_COLUMNS:
+                    raise TabularFileCheckException(
+                        f"{filename} has {record_batch.num_columns} columns, maximum is {settings.TABULAR_MAX_COLUMNS}"
+                    )
+                result.rows += record_batch.num_rows
+                result.columns = record_batch.num_columns
+                if result.rows > settings.TABULAR_MAX_ROWS:
+                    raise TabularFileCheckException(f"{filename} exceeds {settings.TABULAR_MAX_ROWS} rows")
+
+                masks = self.detect_formula_injection(record_batch)
+                if masks:
+                    for name, mask in masks.items():
+                        result.formula_injection_cells[name] = result.formula_injection_cells.get(name, 0) + pc.sum(mask).as_py()
+                    if settings.TABULAR_FORMULA_INJECTION_ACTION == "reject":
+                        raise TabularFileCheckException(f"Formula injection detected in {filename}, columns: {list(masks)}", malicious=True)
+                    record_batch = self._neutralize(record_batch, masks)
+
+                if writer is None:
+                    writer = pq.ParquetWriter(parquet_buffer.writer(), record_batch.schema, compression="zstd")
+                writer.write_batch(record_batch)
+
+            if writer is None:
+                raise TabularFileCheckException(f"{filename} has no rows")
+            writer.close()
+            writer = None
+            return parquet_buffer.seal()
+        except BaseException:
+            if writer is not None:
+                writer.close()
+            parquet_buffer.close()
+            raise
+
+    def run_tabular_check_pipeline(self, file_buffer: FileBuffer, filename: str) -> TabularCheckResult:
+        file_size_mb = round(len(file_buffer) / (1024 * 1024), 2)
+        logger.info(f"Checking tabular file {filename} for formula injection...")
+        try:
+            try:
+                result = TabularCheckResult(filename, file_size_mb)
+                parquet_buffer = self._normalize(self.iter_record_batches(file_buffer, filename), filename, result)
+            except pa.ArrowInvalid:
+                if not filename.lower().endswith(".csv"):
+                    raise
+                # A later block did not fit the types inferred from the first one, re-read every column as text
+                logger.info(f"Type inference failed for {filename}, normalizing all columns as strings")
+                result = TabularCheckResult(filename, file_size_mb)
+                parquet_buffer = self._normalize(self._iter_csv(file_buffer, as_strings=True), filename, result)
+
+            self._parquet_buffers[filename] = parquet_buffer
+            logger.info(
+                f"Tabular validation passed for {filename}: {result.rows} rows x {result.columns} columns, "
+                f"{sum(result.formula_injection_cells.values())} cells neutralized"
+            )
+            return result
+
+        except TabularFileCheckException:
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error processing {filename}: {e}", exc_info=True)
+            raise TabularFileCheckException(f"Failed to process tabular file {filename}", e)
+
+    def scan_multiple_files(self) -> dict:
+        if not self._file_buffers:
+            logger.warning(f"No file contents to process for user {self.userid}")
+            raise TabularFileCheckException(f"No file contents to process for user {self.userid}")
+
+        results = []
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            future_to_filename = {
+                self._track(executor.submit(self.run_tabular_check_pipeline, file_buffer, filename)): filename
+                for file_buffer, filename, seen in zip(self._file_buffers, self.filenames, self._seen_status)
+                if not seen
+            }
+            for future in self._as_completed(future_to_filename, timeout=self.timeout):
+                filename = future_to_filename[future]
+                try:
+                    results.append(future.result(timeout=remaining_timeout(10)))
+                except TimeoutError:
+                    logger.error(f"Timeout checking {filename} for user {self.userid}")
+                    raise TabularFileCheckException(f"Timeout while checking tabular file {filename}")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return self.get_validation_summary(results)
+
+    def get_validation_summary(self, results: List[TabularCheckResult]) -> dict:
+        """Get summary statistics from validation results."""
+        if not results:
+            return {}
+
+        return {
+            "total_files": len(results),
+            "total_rows": sum(r.rows for r in results),
+            "total_mb": sum(r.file_size for r in results if r.file_size),
+            "formula_injection_cells": {
+                r.filename: r.formula_injection_cells for r in results if r.formula_injection_cells
+            },
+            "is_tabular": True
+        }
+
+    #-------------------------------------------------------------------------------------------------
+    #                                       Release
+    #-------------------------------------------------------------------------------------------------
+
+    def _released_content(self, filename: str) -> Tuple[FileBuffer, str]:
+        """The normalized Parquet file, the raw upload is never released."""
+        parquet_buffer = self._parquet_buffers.get(filename)
+        if parquet_buffer is None:
+            raise TabularFileCheckException(f"{filename} was not normalized, refusing to release the raw upload")
+        return parquet_buffer, PARQUET_CONTENT_TYPE
+
+    def move_file_from_quarantine(self, filename: str, hashed_filename: str) -> str:
+        parquet_buffer, content_type = self._released_content(filename)
+        return self._put_object_from_buffer(hashed_filename, parquet_buffer, content_type)
+
+    def release_file_buffers(self) -> None:
+        super().release_file_buffers()
+        for parquet_buffer in self._parquet_buffers.values():
+            parquet_buffer.close()
+        self._parquet_buffers = {}
@@ -0,0 +1,59 @@
+import codecs
+from itertools import chain
+from typing import Iterator
+
+from config.settings import settings
+from services.file_buffer import FileBuffer
+
+# Longest BOMs first, the UTF-32-LE BOM starts with the UTF-16-LE one
+BYTE_ORDER_MARKS = [
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+FALLBACK_ENCODING = "cp1252"
+
+
+def detect_encoding(file_buffer: FileBuffer) -> str:
+    """The encoding its byte order mark declares, UTF-8 without one."""
+    head = file_buffer.head(4)
+    for bom, encoding in BYTE_ORDER_MARKS:
+        if head.startswith(bom):
+            return encoding
+    return "utf-8"
+
+
+class TextDecoder:
+    """
+    Decodes a buffer chunk by chunk in the encoding its BOM declares.
+    Without a BOM it switches to the fallback encoding at the first invalid
+    UTF-8 sequence; `encoding` is the one in use. Invalid text in a
+    BOM-declared encoding raises UnicodeDecodeError, or is replaced when
+    `strict` is False.
+    """
+
+    def __init__(self, file_buffer: FileBuffer, strict: bool = True):
+        self.file_buffer = file_buffer
+        self.strict = strict
+        self.encoding = detect_encoding(file_buffer)
+
+    def __iter__(self) -> Iterator[str]:
+        view = self.file_buffer.view()
+        bom_size = next((len(bom) for bom, encoding in BYTE_ORDER_MARKS if encoding == self.encoding and view[:len(bom)] == bom), 0)
+        declared = bom_size > 0 and self.encoding != "utf-8"
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="strict" if self.strict or not declared else "replace")
+
+        chunks = (view[offset:offset + settings.TEXT_READ_CHUNK_SIZE] for offset in range(bom_size, len(view), settings.TEXT_READ_CHUNK_SIZE))
+        # The final empty chunk flushes the decoder, a truncated sequence at the end fails there
+        for chunk, final in chain(((chunk, False) for chunk in chunks), [(memoryview(b""), True)]):
+            try:
+                yield decoder.decode(chunk, final)
+            except UnicodeDecodeError:
+                if self.encoding != "utf-8":
+                    raise
+                pending_bytes, _ = decoder.getstate()
+                self.encoding = FALLBACK_ENCODING
+                decoder = codecs.getincrementaldecoder(FALLBACK_ENCODING)(errors="replace")
+                yield decoder.decode(pending_bytes + chunk.tobytes(), final)
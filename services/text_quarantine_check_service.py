@@ -0,0 +1,178 @@
+from models.text_quarantine_check import TextQuarantineCheck
+from typing import Dict, Iterator, List, Optional
+from dataclasses import dataclass, field
+
+import os
+
+from exceptions import TextFileCheckException, QuarantineFileCheckException
+from services.quarantine_file_check_service import QuarantineFileCheckService
+from services.file_buffer import FileBuffer
+from services.mime_detector import detect_mime
+from services.deadline import remaining_timeout
+from services.pattern_engine import secret_engine
+from services.text_decoding import TextDecoder, detect_encoding
+from config.settings import settings
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import logging
+
+logger = logging.getLogger(__name__)
+
+# C0 controls and DEL, minus the whitespace controls that legitimately appear in text
+CONTROL_CHARS_TABLE = {
+    code: None for code in [*range(0x00, 0x20), 0x7F] if chr(code) not in "\t\n\r\f\v\x1b"
+}
+EMPTY_FILE_MIME_TYPES = ("application/x-empty", "inode/x-empty")
+
+
+@dataclass
+class TextCheckResult:
+    filename: str
+    file_size: Optional[float] = None
+    encoding: Optional[str] = None
+    lines: int = 0
+    max_line_length: int = 0
+    secrets: Dict[str, int] = field(default_factory=dict)
+
+
+class TextQuarantineCheckService(TextQuarantineCheck, QuarantineFileCheckService):
+
+    def __init__(self,
+                 query: str,
+                 urls: List[str],
+                 filenames: List[str],
+                 userid: str,
+                 timeout: int = 30,
+                 max_workers: int = 4,
+            ):
+
+        super().__init__(query, urls, filenames, userid, timeout)
+        self.max_workers = max_workers
+
+    def verify_magic_number(self, file_buffer: FileBuffer, filename: str) -> bool:
+        """libmagic labels most source code as some text/* type, binary content never is."""
+        try:
+            detected_mime = detect_mime(file_buffer)
+            file_extension = os.path.splitext(filename)[-1].lower().lstrip('.')
+            expected_mime = settings.ALLOWED_MIME_TYPES.get(file_extension)
+
+            if expected_mime is None:
+                raise QuarantineFileCheckException(f"Unsupported file type: {detected_mime} with extension: {file_extension}")
+
+            if detected_mime != expected_mime and not detected_mime.startswith("text/") and detected_mime not in EMPTY_FILE_MIME_TYPES:
+                raise QuarantineFileCheckException(f"Mismatch: filename suggests {expected_mime}, but file is {detected_mime}")
+
+            return True
+        except Exception as e:
+            raise QuarantineFileCheckException("Error while verifying magic numbers", e)
+
+    def detect_encoding(self, file_buffer: FileBuffer) -> str:
+        return detect_encoding(file_buffer)
+
+    def _iter_decoded(self, file_buffer: FileBuffer, result: TextCheckResult) -> Iterator[str]:
+        """Decodes chunk by chunk, switching to the fallback encoding at the first invalid UTF-8 sequence."""
+        decoder = TextDecoder(file_buffer)
+        result.encoding = decoder.encoding
+        try:
+            for text in decoder:
+                result.encoding = decoder.encoding
+                yield text
+        except UnicodeDecodeError:
+            raise TextFileCheckException(f"{result.filename} is not valid {result.encoding} text")
+
+    def _check_lines(self, text: str, result: TextCheckResult) -> None:
+        result.lines += text.count("\n") + 1
+        result.max_line_length = max(result.max_line_length, max(map(len, text.split("\n"))))
+        if result.max_line_length > settings.TEXT_MAX_LINE_LENGTH:
+            raise TextFileCheckException(
+                f"{result.filename} has a line longer than {settings.TEXT_MAX_LINE_LENGTH} characters"
+            )
+        if result.lines > settings.TEXT_MAX_LINES:
+            raise TextFileCheckException(f"{result.filename} has more than {settings.TEXT_MAX_LINES} lines")
+
+        for name, count in secret_engine.count(text).items():
+            result.secrets[name] = result.secrets.get(name, 0) + count
+
+    def run_text_check_pipeline(self, file_buffer: FileBuffer, filename: str) -> TextCheckResult:
+        file_size_mb = round(len(file_buffer) / (1024 * 1024), 2)
+        logger.info(f"Checking text file {filename} for binary content, line limits and secrets...")
+        result = TextCheckResult(filename, file_size_mb)
+        pending = ""
+
+        try:
+            for text in self._iter_decoded(file_buffer, result):
+                if "\x00" in text:
+                    raise TextFileCheckException(f"{filename} contains NUL bytes, binary content disguised as text", malicious=True)
+                control_chars = len(text) - len(text.translate(CONTROL_CHARS_TABLE))
+                if text and control_chars / len(text) > settings.TEXT_MAX_CONTROL_CHAR_RATIO:
+                    raise TextFileCheckException(f"{filename} has too many control characters, binary content disguised as text", malicious=True)
+
+                block = pending + text
+                last_newline = block.rfind("\n")
+                if last_newline == -1:
+                    pending = block
+                else:
+                    self._check_lines(block[:last_newline], result)
+                    pending = block[last_newline + 1:]
+                if len(pending) > settings.TEXT_MAX_LINE_LENGTH:
+                    raise TextFileCheckException(
+                        f"{filename} has a line longer than {settings.TEXT_MAX_LINE_LENGTH} characters"
+                    )
+
+            if pending:
+                self._check_lines(pending, result)
+
+            if result.secrets:
+                logger.warning(f"Secrets detected in {filename}: {result.secrets}")
+                if settings.TEXT_REJECT_SECRETS:
+                    raise TextFileCheckException(f"Secrets detected in {filename}: {list(result.secrets)}")
+
+            logger.info(
+                f"Text validation passed for {filename}: {result.encoding}, {result.lines} lines, "
+                f"longest line {result.max_line_length}"
+            )
+            return result
+
+        except TextFileCheckException:
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error processing {filename}: {e}", exc_info=True)
+            raise TextFileCheckException(f"Failed to process text file {filename}", e)
+
+    def scan_multiple_files(self) -> dict:
+        if not self._file_buffers:
+            logger.warning(f"No file contents to process for user {self.userid}")
+            raise TextFileCheckException(f"No file contents to process for user {self.userid}")
+
+        results = []
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            future_to_filename = {
+                self._track(executor.submit(self.run_text_check_pipeline, file_buffer, filename)): filename
+                for file_buffer, filename, seen in zip(self._file_buffers, self.filenames, self._seen_status)
+                if not seen
+            }
+            for future in self._as_completed(future_to_filename, timeout=self.timeout):
+                filename = future_to_filename[future]
+                try:
+                    results.append(future.result(timeout=remaining_timeout(10)))
+                except TimeoutError:
+                    logger.error(f"Timeout checking {filename} for user {self.userid}")
+                    raise TextFileCheckException(f"Timeout while checking text file {filename}")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return self.get_validation_summary(results)
+
+    def get_validation_summary(self, results: List[TextCheckResult]) -> dict:
+        """Get summary statistics from validation results."""
+        if not results:
+            return {}
+
+        return {
+            "total_files": len(results),
+            "total_lines": sum(r.lines for r in results),
+            "total_mb": sum(r.file_size for r in results if r.file_size),
+            "encodings": {r.filename: r.encoding for r in results},
+            "secrets_detected": {r.filename: r.secrets for r in results if r.secrets},
+            "is_source_code": True
+        }
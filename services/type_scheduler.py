@@ -0,0 +1,165 @@
+import time
+import heapq
+import asyncio
+import itertools
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from config.settings import settings
+from exceptions import AdmissionControlException, QuarantineFileCheckException
+from services.deadline import with_deadline
+from services.metrics import registry
+from logs import get_app_logger
+
+app_logger = get_app_logger()
+
+T = TypeVar("T")
+
+queue_depth = registry.gauge("files_backend_scheduler_queue_depth", "Checks waiting for a slot, per file type")
+active_checks = registry.gauge("files_backend_scheduler_active", "Checks running, per file type")
+admitted_total = registry.gauge("files_backend_scheduler_admitted_total", "Checks given a slot, per file type")
+rejected_total = registry.gauge("files_backend_scheduler_rejected_total", "Checks rejected by the scheduler, per file type")
+wait_seconds_total = registry.gauge("files_backend_scheduler_wait_seconds_total", "Time admitted checks spent waiting, per file type")
+
+
+@dataclass
+class Lane:
+    name: str
+    concurrency: int
+    priority: int # lower runs first when lanes compete for the shared slots
+    time_budget: float # in seconds, from admission until the check finished
+    # Heap of (start tag, enqueued at, sequence, waiter)
+    waiters: List[Tuple[float, float, int, asyncio.Future]] = field(default_factory=list)
+    active: int = 0
+    # Start-time fair queuing: the lane's virtual time and each user's last finish tag
+    virtual_time: float = 0.0
+    finish_tags: Dict[str, float] = field(default_factory=dict)
+
+    def tag(self, userid: Optional[str], weight: float) -> float:
+        """Start tag of a new check; a user's checks are spaced 1/weight apart in virtual time."""
+        start = max(self.virtual_time, self.finish_tags.get(userid, 0.0))
+        self.finish_tags[userid] = start + 1 / weight
+        return start
+
+    def advance(self, start: float) -> None:
+        self.virtual_time = max(self.virtual_time, start)
+        if len(self.finish_tags) > 1000:
+            # Users whose tags fell behind the virtual time start over from it anyway
+            self.finish_tags = {userid: tag for userid, tag in self.finish_tags.items() if tag > self.virtual_time}
+
+
+class TypeScheduler:
+    """
+    One queue per file type in front of the checks.
+
+    Each lane runs at most `concurrency` checks, and all lanes together at
+    most `max_concurrency`. A freed slot goes to the highest-priority lane
+    that has waiters and room, so a burst of PDFs can fill its own lane but
+    never the image lane. Within a lane waiters are ordered by weighted fair
+    queuing on the userid: a user with a backlog of hundreds of files gets
+    their share, a user sending one file goes ahead of that backlog. Waiting
+    is bounded like the memory budget: past `max_wait` or `max_queue` the
+    check is rejected with an `AdmissionControlException`.
+    """
+
+    def __init__(self, lanes: Dict[str, dict], max_concurrency: int, max_wait: float, max_queue: int, retry_after: int):
+        self.lanes = {name: Lane(name, **config) for name, config in lanes.items()}
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.active = 0
+        self._sequence = itertools.count()
+
+    def _reject(self, lane: Lane, reason: str) -> AdmissionControlException:
+        rejected_total.inc(lane=lane.name)
+        app_logger.warning(f"Scheduler rejected a {lane.name} check: {reason}")
+        return AdmissionControlException(
+            f"Too many {lane.name} checks in progress ({reason}), retry after {self.retry_after}s",
+            retry_after=self.retry_after,
+        )
+
+    def _grant(self, lane: Lane) -> None:
+        lane.active += 1
+        self.active += 1
+        active_checks.set(lane.active, lane=lane.name)
+
+    def _dispatch(self) -> None:
+        while self.active < self.max_concurrency:
+            candidates = []
+            for lane in self.lanes.values():
+                while lane.waiters and lane.waiters[0][3].done():
+                    # Gave up waiting
+                    heapq.heappop(lane.waiters)
+                if lane.waiters and lane.active < lane.concurrency:
+                    candidates.append(lane)
+            if not candidates:
+                return
+            lane = min(candidates, key=lambda candidate: (candidate.priority, candidate.waiters[0][1]))
+            start, _, _, waiter = heapq.heappop(lane.waiters)
+            lane.advance(start)
+            self._grant(lane)
+            waiter.set_result(None)
+            queue_depth.set(len(lane.waiters), lane=lane.name)
+
+    def _release(self, lane: Lane) -> None:
+        lane.active -= 1
+        self.active -= 1
+        active_checks.set(lane.active, lane=lane.name)
+        self._dispatch()
+
+    async def _acquire(self, lane: Lane, userid: Optional[str]) -> None:
+        started_at = time.monotonic()
+        if not lane.waiters and lane.active < lane.concurrency and self.active < self.max_concurrency:
+            # Still tagged, so a user who got many slots while the lane was idle queues behind others later
+            lane.advance(lane.tag(userid, self._weight(userid)))
+            self._grant(lane)
+        else:
+            if self.max_wait <= 0 or len(lane.waiters) >= self.max_queue:
+                raise self._reject(lane, "queue full" if self.max_wait > 0 else "no free slot")
+            waiter = asyncio.get_running_loop().create_future()
+            entry = (lane.tag(userid, self._weight(userid)), started_at, next(self._sequence), waiter)
+            heapq.heappush(lane.waiters, entry)
+            queue_depth.set(len(lane.waiters), lane=lane.name)
+            try:
+                await asyncio.wait_for(waiter, self.max_wait)
+            except BaseException as e:
+                if waiter.done() and not waiter.cancelled():
+                    # Granted just as the wait ended, hand the slot on
+                    self._release(lane)
+                elif entry in lane.waiters:
+                    lane.waiters.remove(entry)
+                    heapq.heapify(lane.waiters)
+                queue_depth.set(len(lane.waiters), lane=lane.name)
+                if isinstance(e, asyncio.TimeoutError):
+                    raise self._reject(lane, f"waited {self.max_wait}s")
+                raise
+        admitted_total.inc(lane=lane.name)
+        wait_seconds_total.inc(time.monotonic() - started_at, lane=lane.name)
+
+    @staticmethod
+    def _weight(userid: Optional[str]) -> float:
+        return settings.FAIR_QUEUE_USER_WEIGHTS.get(userid, settings.FAIR_QUEUE_DEFAULT_WEIGHT)
+
+    async def run(self, lane_name: str, work: Callable[[], Awaitable[T]], userid: Optional[str] = None) -> T:
+        """Runs `work()` in a slot of the lane, cancelling it once the lane's time budget is spent."""
+        lane = self.lanes[lane_name]
+        await self._acquire(lane, userid)
+        started_at = time.monotonic()
+        try:
+            return await with_deadline(work(), lane.time_budget)
+        except asyncio.TimeoutError:
+            if time.monotonic() - started_at < lane.time_budget:
+                raise
+            raise QuarantineFileCheckException(f"The {lane.name} check exceeded its time budget of {lane.time_budget}s")
+        finally:
+            self._release(lane)
+
+
+type_scheduler = TypeScheduler(
+    lanes=settings.SCHEDULER_LANES,
+    max_concurrency=settings.SCHEDULER_MAX_CONCURRENCY,
+    max_wait=settings.SCHEDULER_MAX_WAIT,
+    max_queue=settings.SCHEDULER_MAX_QUEUE,
+    retry_after=settings.SCHEDULER_RETRY_AFTER,
+)
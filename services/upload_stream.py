@@ -0,0 +1,79 @@
+import io
+import queue
+import asyncio
+from typing import Optional
+
+_END_OF_STREAM = object()
+
+
+class UploadAborted(Exception):
+    """Raised inside the upload thread so MinIO aborts the multipart upload."""
+
+
+class ChunkPipe(io.RawIOBase):
+    """
+    Bounded hand-off between the event loop, which receives the request body,
+    and a thread running a blocking `put_object` that reads from this pipe.
+    A full pipe makes the receiver wait, so a slow MinIO slows the client down
+    instead of growing memory.
+    """
+
+    def __init__(self, max_chunks: int):
+        self._queue = queue.Queue(max_chunks)
+        self._pending = b""
+        self._error: Optional[BaseException] = None
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        parts = [self._pending]
+        available = len(self._pending)
+        while (size < 0 or available < size) and not self._eof:
+            item = self._queue.get()
+            if self._error is not None:
+                raise self._error
+            if item is _END_OF_STREAM:
+                self._eof = True
+                break
+            parts.append(item)
+            available += len(item)
+        data = b"".join(parts)
+        if size < 0:
+            self._pending = b""
+            return data
+        self._pending = data[size:]
+        return data[:size]
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def _put(self, item) -> None:
+        while True:
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if self.closed:
+                    raise UploadAborted("The upload stopped reading from the pipe")
+
+    async def feed(self, chunk: bytes) -> None:
+        try:
+            self._queue.put_nowait(bytes(chunk))
+        except queue.Full:
+            await asyncio.to_thread(self._put, bytes(chunk))
+
+    async def finish(self) -> None:
+        await asyncio.to_thread(self._put, _END_OF_STREAM)
+
+    def abort(self, reason: str) -> None:
+        """Makes the reader fail on its next read; never blocks."""
+        self._error = UploadAborted(reason)
+        try:
+            self._queue.put_nowait(_END_OF_STREAM)
+        except queue.Full:
+            # The reader is not waiting, it sees the error when it takes the next chunk
+            pass
@@ -0,0 +1,123 @@
+import os
+import socket
+import asyncio
+from typing import Optional
+
+from minio.deleteobjects import DeleteObject
+
+from config.settings import settings
+from config.minio_config import minio_client
+from config.redis_config import pool, get_redis_pool
+from exceptions import AdmissionControlException, DependencyUnavailableException, QuarantineFileCheckException
+from services.metrics import registry
+from services.file_index import remove_indexed_file
+from services.fuzzy_hash_service import VERDICT_CLEAN, VERDICT_MALICIOUS, record_verdict
+from services.image_derivatives import derivative_object_name
+from services.presigned_url_cache import presigned_url_cache
+from services.quarantine_file_check_service import QuarantineFileCheckService
+from services.rescan_queue import RescanEntry, complete_rescan, due_rescans, reschedule_rescan
+from logs import get_app_logger, get_error_logger
+
+app_logger = get_app_logger()
+error_logger = get_error_logger()
+
+RESCANNER_LOCK_KEY = "virustotal-rescanner:lock"
+
+rescanned_total = registry.gauge("files_backend_virustotal_rescanned_total", "Queued files looked up again on VirusTotal, by verdict (clean, malicious)")
+
+
+def withdraw_released_file(entry: RescanEntry) -> None:
+    """Deletes a released file found malicious afterwards, with its derivatives, index entry and cached URLs."""
+    object_names = [entry.hashed_filename]
+    if entry.file_type in settings.IMAGE_EXTENSIONS:
+        object_names += [derivative_object_name(entry.hashed_filename, size_name) for size_name in settings.IMAGE_DERIVATIVE_SIZES]
+    # remove_objects is lazy, the request is only sent while its errors are iterated
+    errors = [
+        error for error in minio_client.remove_objects(entry.userid, [DeleteObject(name) for name in object_names])
+        if error.code != "NoSuchKey"
+    ]
+    if errors:
+        raise QuarantineFileCheckException(f"Failed to withdraw {entry.member}: {[(error.name, error.code) for error in errors]}")
+    remove_indexed_file(entry.userid, entry.hashed_filename)
+    presigned_url_cache.invalidate(entry.userid, object_names)
+    app_logger.warning(f"Withdrew released file {entry.member}, VirusTotal flagged it on rescan")
+
+
+class VirusTotalRescanner:
+    """
+    Looks up files again that were released while the VirusTotal circuit
+    was open (see rescan_queue).
+
+    Every VIRUSTOTAL_RESCAN_INTERVAL seconds the pod that wins a Redis
+    lease takes up to VIRUSTOTAL_RESCAN_BATCH_SIZE due files. A clean
+    lookup records the verdict and dequeues the file; a malicious one also
+    withdraws the released object. A failed lookup is retried after
+    VIRUSTOTAL_RESCAN_RETRY_DELAY seconds, and the round stops as soon as
+    the circuit opens or the limiter sheds, leaving the rest due.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def _acquire_lease(self) -> bool:
+        lease_ms = int(settings.VIRUSTOTAL_RESCAN_INTERVAL * 1000)
+        return bool(get_redis_pool(pool).set(RESCANNER_LOCK_KEY, self._owner, nx=True, px=lease_ms))
+
+    async def _rescan(self, entry: RescanEntry) -> None:
+        sha256 = entry.hashed_filename.split(".")[0]
+        try:
+            clean = await QuarantineFileCheckService.scan_for_malware(entry.hashed_filename)
+        except QuarantineFileCheckException as e:
+            if not e.malicious:
+                raise
+            await asyncio.to_thread(withdraw_released_file, entry)
+            await asyncio.to_thread(record_verdict, entry.fuzzy_hash, entry.userid, entry.file_type, sha256, VERDICT_MALICIOUS, e.message)
+            rescanned_total.inc(verdict=VERDICT_MALICIOUS)
+        else:
+            # Other VirusTotal errors (e.g. quota) return nothing, that is no verdict
+            if not clean:
+                raise QuarantineFileCheckException(f"VirusTotal gave no verdict for {entry.member}")
+            await asyncio.to_thread(record_verdict, entry.fuzzy_hash, entry.userid, entry.file_type, sha256, VERDICT_CLEAN)
+            rescanned_total.inc(verdict=VERDICT_CLEAN)
+        await asyncio.to_thread(complete_rescan, entry)
+
+    async def rescan_due(self) -> int:
+        """One round over the due files; returns how many got a verdict."""
+        entries = await asyncio.to_thread(due_rescans, settings.VIRUSTOTAL_RESCAN_BATCH_SIZE)
+        rescanned = 0
+        for entry in entries:
+            try:
+                await self._rescan(entry)
+                rescanned += 1
+            except (DependencyUnavailableException, AdmissionControlException) as e:
+                app_logger.warning(f"VirusTotal rescan paused with {len(entries) - rescanned} files due => {e.message}")
+                break
+            except Exception as e:
+                error_logger.error(f"VirusTotal rescan of {entry.member} failed, retrying in {settings.VIRUSTOTAL_RESCAN_RETRY_DELAY}s => {str(e)}")
+                await asyncio.to_thread(reschedule_rescan, entry, settings.VIRUSTOTAL_RESCAN_RETRY_DELAY)
+        if entries:
+            app_logger.info(f"VirusTotal rescan gave a verdict for {rescanned} of {len(entries)} due files")
+        return rescanned
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await asyncio.to_thread(self._acquire_lease):
+                    await self.rescan_due()
+            except Exception as e:
+                error_logger.error(f"VirusTotal rescan round failed => {str(e)}")
+            await asyncio.sleep(settings.VIRUSTOTAL_RESCAN_INTERVAL)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+virustotal_rescanner = VirusTotalRescanner()
@@ -0,0 +1,10 @@
+import os
+
+# Settings are read at import; the tests never reach MinIO or a real Redis
+for name, value in {
+    "MINIO_ENDPOINT": "localhost:9000",
+    "MINIO_ACCESS_KEY": "test",
+    "MINIO_SECRET_KEY": "test",
+    "REDIS_HOST": "localhost",
+}.items():
+    os.environ.setdefault(name, value)
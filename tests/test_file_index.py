@@ -0,0 +1,72 @@
+import fakeredis
+import pytest
+
+from services import file_index
+from services.file_index import index_released_file, list_released_files, new_index_entry, remove_indexed_file
+
+
+@pytest.fixture(autouse=True)
+def redis_client(monkeypatch):
+    redis_client = fakeredis.FakeRedis()
+    monkeypatch.setattr(file_index, "get_redis_pool", lambda _: redis_client)
+    return redis_client
+
+
+def _index(hashed_filename: str, released_at: float) -> None:
+    entry = new_index_entry(hashed_filename, f"{hashed_filename}.pdf", 10)
+    entry.released_at = released_at
+    assert index_released_file("alice", entry)
+
+
+def _all_pages(limit: int):
+    pages, cursor = [], None
+    while True:
+        files, cursor = list_released_files("alice", limit, cursor)
+        pages.append([file.hashed_filename for file in files])
+        if cursor is None:
+            return pages
+
+
+def test_pages_are_newest_first():
+    for second in range(5):
+        _index(f"file{second}", 1000 + second)
+    assert _all_pages(2) == [["file4", "file3"], ["file2", "file1"], ["file0"]]
+
+
+def test_cursor_walks_files_released_in_the_same_millisecond():
+    _index("newest", 1001)
+    for name in ("a", "b", "c", "d", "e"):
+        _index(name, 1000)
+    _index("oldest", 999)
+
+    pages = _all_pages(2)
+    listed = [name for page in pages for name in page]
+    assert listed[0] == "newest" and listed[-1] == "oldest"
+    assert sorted(listed[1:-1]) == ["a", "b", "c", "d", "e"]
+    assert len(listed) == len(set(listed)) == 7
+    assert all(len(page) == 2 for page in pages[:-1])
+
+
+def test_cursor_within_a_tie_spanning_several_pages():
+    for name in ("a", "b", "c", "d", "e", "f", "g"):
+        _index(name, 1000)
+    files, cursor = list_released_files("alice", 3)
+    assert cursor == "1000000:3"
+    files, cursor = list_released_files("alice", 3, cursor)
+    # Skips add up while the page stays on the same score
+    assert cursor == "1000000:6"
+    files, cursor = list_released_files("alice", 3, cursor)
+    assert len(files) == 1 and cursor is None
+
+
+def test_removed_files_are_not_listed():
+    _index("kept", 1000)
+    _index("withdrawn", 1001)
+    assert remove_indexed_file("alice", "withdrawn")
+    assert _all_pages(10) == [["kept"]]
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "1:2:3", "abc:1"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        list_released_files("alice", 10, cursor)
@@ -0,0 +1,145 @@
+import io
+import struct
+
+import pytest
+from PIL import Image, PngImagePlugin
+
+from services.file_buffer import FileBuffer
+from services.metadata_sanitizer import sanitize_metadata
+
+XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+XMP_PACKET = b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:Description GPSLatitude="52.1"/></x:xmpmeta>'
+
+
+def _jpeg(orientation=None, xmp=False, comment=False) -> bytes:
+    exif = Image.Exif()
+    exif[0x010F] = "SecretCam" # Make
+    exif[0x0131] = "Editor 1.0" # Software
+    if orientation is not None:
+        exif[0x0112] = orientation
+    output = io.BytesIO()
+    Image.new("RGB", (16, 8), "red").save(output, "JPEG", exif=exif.tobytes(), comment=b"by alice" if comment else None)
+    data = output.getvalue()
+    if xmp:
+        payload = XMP_HEADER + XMP_PACKET
+        data = data[:2] + struct.pack(">BBH", 0xFF, 0xE1, len(payload) + 2) + payload + data[2:]
+    return data
+
+
+def _png() -> bytes:
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Author", "alice")
+    info.add_itxt("Description", "GPS 52.1, 4.3", lang="en")
+    output = io.BytesIO()
+    Image.new("RGB", (16, 8), "blue").save(output, "PNG", pnginfo=info)
+    return output.getvalue()
+
+
+def _sanitize(data: bytes, filename: str):
+    return sanitize_metadata(FileBuffer.from_bytes(data), filename)
+
+
+def _content(result) -> bytes:
+    return result.file_buffer.view().tobytes()
+
+
+def test_jpeg_exif_xmp_and_comment_are_removed():
+    result = _sanitize(_jpeg(xmp=True, comment=True), "photo.jpg")
+    assert sorted(result.removed) == ["APP1", "APP1", "COM"]
+    sanitized = _content(result)
+    assert b"SecretCam" not in sanitized and b"Editor 1.0" not in sanitized
+    assert XMP_HEADER not in sanitized and b"by alice" not in sanitized
+    with Image.open(io.BytesIO(sanitized)) as image:
+        assert image.size == (16, 8)
+        assert not image.getexif()
+
+
+@pytest.mark.parametrize("orientation", [3, 6, 8])
+def test_jpeg_orientation_is_kept(orientation):
+    sanitized = _content(_sanitize(_jpeg(orientation=orientation), "photo.jpeg"))
+    assert b"SecretCam" not in sanitized
+    with Image.open(io.BytesIO(sanitized)) as image:
+        assert dict(image.getexif()) == {0x0112: orientation}
+
+
+def test_jpeg_default_orientation_is_not_rewritten():
+    sanitized = _content(_sanitize(_jpeg(orientation=1), "photo.jpg"))
+    with Image.open(io.BytesIO(sanitized)) as image:
+        assert not image.getexif()
+
+
+def test_jpeg_scan_data_is_copied_verbatim():
+    original = _jpeg(xmp=True)
+    sanitized = _content(_sanitize(original, "photo.jpg"))
+    scan = original.index(b"\xff\xda")
+    assert sanitized.endswith(original[scan:])
+
+
+def test_png_text_chunks_are_removed():
+    result = _sanitize(_png(), "image.png")
+    assert sorted(result.removed) == ["iTXt", "tEXt"]
+    sanitized = _content(result)
+    assert b"alice" not in sanitized and b"GPS" not in sanitized
+    with Image.open(io.BytesIO(sanitized)) as image:
+        image.load()
+        assert image.size == (16, 8)
+        assert not image.text
+
+
+def test_files_without_metadata_are_passed_through():
+    output = io.BytesIO()
+    Image.new("RGB", (4, 4)).save(output, "PNG")
+    result = _sanitize(output.getvalue(), "plain.png")
+    assert result.removed == [] and result.file_buffer is None
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"\xff",
+    b"\xff\xd8",
+    b"\xff\xd8\xff",
+    b"\xff\xd8\xff\xe1",
+    b"\xff\xd8\xff\xe1\x00",
+    b"\xff\xd8\xff\xe1\x00\x01",
+    b"\xff\xd8\xff\xe1\xff\xf0Exif\x00\x00",
+    b"\xff\xd8\x00\x00",
+])
+def test_malformed_jpeg_is_rejected_or_passed_through(data):
+    try:
+        result = _sanitize(data, "broken.jpg")
+    except ValueError:
+        return
+    assert result.file_buffer is None or _content(result).startswith(b"\xff\xd8")
+
+
+def test_truncated_jpeg_keeps_its_scan_data():
+    original = _jpeg(xmp=True)
+    truncated = original[:len(original) - 5]
+    sanitized = _content(_sanitize(truncated, "photo.jpg"))
+    assert sanitized.endswith(truncated[truncated.index(b"\xff\xda"):])
+
+
+def test_exif_with_a_bad_ifd_offset_drops_the_orientation():
+    tiff = b"MM\x00\x2a" + struct.pack(">I", 0xFFFF)
+    payload = b"Exif\x00\x00" + tiff
+    data = _jpeg()[:2] + struct.pack(">BBH", 0xFF, 0xE1, len(payload) + 2) + payload + _jpeg()[2:]
+    sanitized = _content(_sanitize(data, "photo.jpg"))
+    assert tiff not in sanitized
+
+
+@pytest.mark.parametrize("cut", [8, 12, 20, 40])
+def test_truncated_png_is_rejected_or_passed_through(cut):
+    try:
+        result = _sanitize(_png()[:cut], "image.png")
+    except ValueError:
+        return
+    assert result.file_buffer is None or _content(result).startswith(b"\x89PNG")
+
+
+@pytest.mark.parametrize("data", [b"", b"GIF89a", b"\x89PNG\r\n\x1a\n\x00\x00"])
+def test_not_a_png_is_rejected_or_passed_through(data):
+    try:
+        result = _sanitize(data, "image.png")
+    except ValueError:
+        return
+    assert result.file_buffer is None
@@ -0,0 +1,43 @@
+import time
+
+import fakeredis
+import pytest
+import redis
+
+from services import presigned_url_cache as cache_module
+from services.presigned_url_cache import PresignedURLCache
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    redis_client = fakeredis.FakeRedis()
+    monkeypatch.setattr(cache_module, "get_redis_pool", lambda _: redis_client)
+    return redis_client
+
+
+def test_first_pod_to_cache_a_url_wins(redis_client):
+    pod_a, pod_b = PresignedURLCache(10), PresignedURLCache(10)
+    assert pod_a.put_many("alice", {"file.pdf": "https://a"}, time.time()) == {"file.pdf": "https://a"}
+    # Pod B signed concurrently, it hands out pod A's URL and remembers it
+    assert pod_b.put_many("alice", {"file.pdf": "https://b", "other.pdf": "https://b2"}, time.time()) == {
+        "file.pdf": "https://a",
+        "other.pdf": "https://b2",
+    }
+    assert pod_b.get_many("alice", ["file.pdf"]) == {"file.pdf": "https://a"}
+
+
+def test_urls_are_handed_out_when_redis_is_down(monkeypatch):
+    def unavailable(_):
+        raise redis.ConnectionError("down")
+    monkeypatch.setattr(cache_module, "get_redis_pool", unavailable)
+    cache = PresignedURLCache(10)
+    assert cache.put_many("alice", {"file.pdf": "https://a"}, time.time()) == {"file.pdf": "https://a"}
+    assert cache.get_many("alice", ["file.pdf"]) == {"file.pdf": "https://a"}
+
+
+def test_invalidated_urls_are_signed_again(redis_client):
+    cache = PresignedURLCache(10)
+    cache.put_many("alice", {"file.pdf": "https://a"}, time.time())
+    cache.invalidate("alice", ["file.pdf"])
+    assert cache.get_many("alice", ["file.pdf"]) == {}
+    assert cache.put_many("alice", {"file.pdf": "https://new"}, time.time()) == {"file.pdf": "https://new"}
@@ -0,0 +1,75 @@
+import time
+import asyncio
+
+import fakeredis
+import pytest
+
+from exceptions import AdmissionControlException
+from services.rate_limiter import RateLimiter, TOKEN_BUCKET_SCRIPT
+
+ROUTE = "upload"
+
+
+@pytest.fixture
+def redis_client():
+    # fakeredis runs the script with Lua (lupa), TIME follows the wall clock
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture
+def limiter(redis_client, monkeypatch):
+    monkeypatch.setattr("services.rate_limiter.settings.RATE_LIMIT_ENABLED", True)
+    limiter = RateLimiter({ROUTE: {"rate": 20, "burst": 3}})
+    limiter._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+    return limiter
+
+
+def test_takes_tokens_up_to_the_burst(limiter):
+    remaining = [asyncio.run(limiter.check(ROUTE, "alice")).remaining for _ in range(3)]
+    assert remaining == [2, 1, 0]
+
+
+def test_rejects_an_empty_bucket_with_retry_after(limiter):
+    for _ in range(3):
+        asyncio.run(limiter.check(ROUTE, "alice"))
+    with pytest.raises(AdmissionControlException) as rejected:
+        asyncio.run(limiter.check(ROUTE, "alice"))
+    # One token takes 50 ms at 20 tokens/s, rounded up to a whole second
+    assert rejected.value.retry_after == 1
+
+    decision = limiter._take(ROUTE, "alice", 3)
+    assert not decision.allowed
+    assert decision.remaining == 0
+
+
+def test_refills_over_time(limiter):
+    for _ in range(3):
+        asyncio.run(limiter.check(ROUTE, "alice"))
+    time.sleep(0.11) # two tokens at 20 tokens/s
+    assert asyncio.run(limiter.check(ROUTE, "alice")).allowed
+    assert asyncio.run(limiter.check(ROUTE, "alice")).allowed
+    with pytest.raises(AdmissionControlException):
+        asyncio.run(limiter.check(ROUTE, "alice"))
+
+
+def test_refill_is_capped_at_the_burst(limiter):
+    asyncio.run(limiter.check(ROUTE, "alice"))
+    time.sleep(0.2)
+    assert limiter._take(ROUTE, "alice", 1).remaining == 2
+
+
+def test_buckets_are_per_user(limiter):
+    for _ in range(3):
+        asyncio.run(limiter.check(ROUTE, "alice"))
+    assert asyncio.run(limiter.check(ROUTE, "bob")).remaining == 2
+
+
+def test_bucket_expires_once_it_would_be_full(limiter, redis_client):
+    asyncio.run(limiter.check(ROUTE, "alice"))
+    ttl = redis_client.pttl(f"ratelimit:{ROUTE}:alice")
+    # burst / rate seconds to refill completely, plus one second of slack
+    assert 1000 < ttl <= 3 * 1000 // 20 + 1000
+
+
+def test_cost_larger_than_the_burst_takes_the_whole_bucket(limiter):
+    assert asyncio.run(limiter.check(ROUTE, "alice", cost=10)).remaining == 0
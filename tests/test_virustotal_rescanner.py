@@ -0,0 +1,83 @@
+import time
+import asyncio
+
+import fakeredis
+import pytest
+
+from config.settings import settings
+from exceptions import DependencyUnavailableException, QuarantineFileCheckException
+from services import rescan_queue, virustotal_rescanner
+from services.rescan_queue import RescanEntry, due_rescans, queue_rescan
+from services.virustotal_rescanner import VirusTotalRescanner
+
+ENTRY = RescanEntry("alice", "abc123.pdf", "T1FUZZY", "pdf")
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    redis_client = fakeredis.FakeRedis()
+    monkeypatch.setattr(rescan_queue, "get_redis_pool", lambda _: redis_client)
+    return redis_client
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    verdicts = []
+    monkeypatch.setattr(virustotal_rescanner, "record_verdict", lambda *args: verdicts.append(args))
+    return verdicts
+
+
+@pytest.fixture
+def withdrawn(monkeypatch):
+    entries = []
+    monkeypatch.setattr(virustotal_rescanner, "withdraw_released_file", entries.append)
+    return entries
+
+
+def lookup(monkeypatch, outcome):
+    async def scan_for_malware(hashed_filename):
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    monkeypatch.setattr(virustotal_rescanner.QuarantineFileCheckService, "scan_for_malware", staticmethod(scan_for_malware))
+
+
+def test_queued_files_are_due_with_their_details(redis_client):
+    assert queue_rescan([ENTRY])
+    assert due_rescans(10) == [ENTRY]
+
+
+def test_clean_lookup_records_the_verdict_and_dequeues(redis_client, recorded, withdrawn, monkeypatch):
+    queue_rescan([ENTRY])
+    lookup(monkeypatch, True)
+    assert asyncio.run(VirusTotalRescanner().rescan_due()) == 1
+    assert recorded == [("T1FUZZY", "alice", "pdf", "abc123", "clean")]
+    assert withdrawn == []
+    assert due_rescans(10) == []
+
+
+def test_malicious_lookup_withdraws_the_released_file(redis_client, recorded, withdrawn, monkeypatch):
+    queue_rescan([ENTRY])
+    lookup(monkeypatch, QuarantineFileCheckException("VirusTotal flagged the file as malicious", malicious=True))
+    assert asyncio.run(VirusTotalRescanner().rescan_due()) == 1
+    assert withdrawn == [ENTRY]
+    assert recorded[0][4] == "malicious"
+    assert due_rescans(10) == []
+
+
+def test_open_circuit_leaves_the_files_due(redis_client, recorded, monkeypatch):
+    queue_rescan([ENTRY])
+    lookup(monkeypatch, DependencyUnavailableException("virustotal is unavailable", "virustotal", 30))
+    assert asyncio.run(VirusTotalRescanner().rescan_due()) == 0
+    assert due_rescans(10) == [ENTRY]
+
+
+@pytest.mark.parametrize("outcome", [None, QuarantineFileCheckException("Error while scanning for malware using Virus Total")])
+def test_failed_lookup_is_retried_later(redis_client, recorded, withdrawn, monkeypatch, outcome):
+    queue_rescan([ENTRY])
+    lookup(monkeypatch, outcome)
+    assert asyncio.run(VirusTotalRescanner().rescan_due()) == 0
+    assert recorded == [] and withdrawn == []
+    assert due_rescans(10) == []
+    retry_at = redis_client.zscore(settings.VIRUSTOTAL_RESCAN_KEY, ENTRY.member)
+    assert retry_at > time.time() + settings.VIRUSTOTAL_RESCAN_RETRY_DELAY - 5